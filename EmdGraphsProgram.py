@@ -1,50 +1,6 @@
-import math
-import numpy as np
-import matplotlib.pyplot as plt
-import networkx as nx
-from scipy.stats import norm
-
-def calculate_direct_visibility(h1, h2):
-    """
-    Рассчитывает расстояние прямой радиовидимости между двумя антеннами.
-    :param h1: Высота первой антенны (м)
-    :param h2: Высота второй антенны (м)
-    :return: Расстояние прямой радиовидимости (км)
-    """
-    a_e = 8500  # Эквивалентный радиус Земли (км)
-    return math.sqrt(2 * a_e * h1) + math.sqrt(2 * a_e * h2)
-
-def calculate_path_loss(frequency, distance):
-    """
-    Рассчитывает затухание сигнала в свободном пространстве.
-    :param frequency: Частота сигнала (МГц)
-    :param distance: Расстояние (км)
-    :return: Затухание (дБ)
-    """
-    wavelength = 300 / frequency  # Длина волны (м)
-    return 20 * math.log10(distance * 1000) + 20 * math.log10(frequency) - 147.55
-
-def calculate_signal_to_noise(p1, g1, g2, loss):
-    """
-    Рассчитывает отношение сигнал/шум (SNR).
-    :param p1: Мощность передатчика (дБм)
-    :param g1: Коэффициент усиления передающей антенны (дБ)
-    :param g2: Коэффициент усиления приемной антенны (дБ)
-    :param loss: Затухание сигнала (дБ)
-    :return: SNR (дБ)
-    """
-    return p1 + g1 + g2 - loss
-
-def calculate_emd(snr, required_snr):
-    """
-    Рассчитывает вероятность электромагнитной доступности (ЭМД).
-    :param snr: Отношение сигнал/шум (дБ)
-    :param required_snr: Требуемый SNR (дБ)
-    :return: Вероятность ЭМД (от 0 до 1)
-    """
-    sigma = 3  # Среднеквадратичное отклонение
-    u = (snr - required_snr) / sigma
-    return norm.cdf(u)
+# Расчет модели ЭМД - в общем ядре emd_engine (зависит только от numpy); прежние имена функций сохранены
+from emd_engine import (graph_edges, direct_visibility as calculate_direct_visibility, path_loss as calculate_path_loss,
+                        signal_to_noise as calculate_signal_to_noise, emd_probability as calculate_emd)
 
 def build_graph(objects, frequency, required_snr):
     """
@@ -54,20 +10,10 @@ def build_graph(objects, frequency, required_snr):
     :param required_snr: Требуемый SNR (дБ)
     :return: Граф (NetworkX)
     """
+    import networkx as nx  # Загружается при первом построении графа, а не при запуске
     G = nx.Graph()
-    for i, obj1 in enumerate(objects):
-        for j, obj2 in enumerate(objects):
-            if i >= j:
-                continue
-            distance = math.sqrt((obj1['x'] - obj2['x'])**2 + (obj1['y'] - obj2['y'])**2) / 1000  # в км
-            visibility = calculate_direct_visibility(obj1['height'], obj2['height'])
-            if distance > visibility:
-                continue
-            loss = calculate_path_loss(frequency, distance)
-            snr = calculate_signal_to_noise(obj1['power'], obj1['gain'], obj2['gain'], loss)
-            emd = calculate_emd(snr, required_snr)
-            if emd > 0.1:  # Порог для добавления ребра
-                G.add_edge(i, j, weight=1 - emd)
+    i, j, emd = graph_edges(objects, frequency, required_snr, with_noise=False)
+    G.add_weighted_edges_from(zip(i.tolist(), j.tolist(), (1 - emd).tolist()))
     return G
 
 def visualize_graph(G, objects):
@@ -76,6 +22,8 @@ def visualize_graph(G, objects):
     :param G: Граф (NetworkX)
     :param objects: Список объектов с их параметрами
     """
+    import matplotlib.pyplot as plt
+    import networkx as nx
     pos = {i: (obj['x'], obj['y']) for i, obj in enumerate(objects)}
     nx.draw(G, pos, with_labels=True, node_size=500, node_color='skyblue')
     labels = nx.get_edge_attributes(G, 'weight')
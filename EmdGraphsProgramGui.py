@@ -1,83 +1,126 @@
-import math
+import multiprocessing
 import numpy as np
-import matplotlib.pyplot as plt
-import networkx as nx
-from scipy.stats import norm
+from emd_engine import graph_edges, EDGE_THRESHOLD
+# Расчет одной связи - в общем ядре emd_engine (зависит только от numpy); прежние имена функций сохранены
+from emd_engine import (direct_visibility as calculate_direct_visibility, path_loss as calculate_path_loss,
+                        signal_to_noise as calculate_signal_to_noise, emd_probability as calculate_emd)
+from parallel_engine import parallel_graph_edges
+from incremental import LinkCache
+from result_cache import ResultCache, objects_digest, edges_key
+from object_store import ObjectStore
+from object_io import load_objects
+from virtual_table import VirtualTable
 import tkinter as tk
-from tkinter import messagebox, simpledialog, ttk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-
-def calculate_direct_visibility(h1, h2):
-    a_e = 8500  # Эквивалентный радиус Земли (км)
-    return math.sqrt(2 * a_e * h1) + math.sqrt(2 * a_e * h2)
-
-
-def calculate_path_loss(frequency, distance):
-    wavelength = 300 / frequency  # Длина волны (м)
-    return 20 * math.log10(distance * 1000) + 20 * math.log10(frequency) - 147.55
-
-
-def calculate_signal_to_noise(p1, g1, g2, loss, noise_power):
-    """Расчет отношения сигнал/шум с учетом мощности помехи."""
-    signal_power = p1 + g1 + g2 - loss  # Мощность сигнала
-    return signal_power - noise_power  # SNR = сигнал минус шум
-
-
-def calculate_emd(snr, required_snr):
-    sigma = 3  # Среднеквадратичное отклонение
-    u = (snr - required_snr) / sigma
-    return norm.cdf(u)
-
-
-def build_graph(objects, frequency, required_snr):
+from tkinter import messagebox, filedialog
+from job_runner import JobRunner
+import instrumentation
+from instrumentation import stage, count
+
+link_cache = LinkCache()  # Геометрия пар и последний граф для инкрементного пересчета
+result_cache = ResultCache()  # Рёбра прошлых расчетов на диске (по хэшу объектов и параметров)
+STATUS_INTERVAL = 1000  # Период обновления строки состояния с замерами (мс)
+TOP_RELAYS = 5  # Сколько вершин с наибольшим посредничеством показывать при анализе сети
+
+
+def build_graph(objects, frequency, required_snr, workers=1, cache=None, progress=None, sparse=False,
+                result_cache=None):
+    # progress(done, total) сообщает о ходе расчета; исключение из него прерывает расчет
+    # sparse=True - граф EmdGraph (scipy) без построения объекта NetworkX, заметно быстрее на больших сетях
+    # result_cache (ResultCache) - рёбра для тех же объектов и параметров читаются с диска
+    if sparse:
+        from graph_analytics import EmdGraph  # scipy.sparse загружается только для разреженного графа
+    edges = None
+    if result_cache is not None:
+        key = edges_key(objects_digest(objects), frequency, required_snr, threshold=EDGE_THRESHOLD)
+        edges = result_cache.get_edges(key)
+    if edges is None and cache is not None:
+        # Пересчитываются только рёбра добавленных или измененных объектов, граф обновляется на месте
+        cache.sync(objects)
+        if result_cache is not None:
+            result_cache.put_edges(key, *cache.edges(frequency, required_snr, progress=progress))
+        if sparse:
+            return EmdGraph(len(cache), *cache.edges(frequency, required_snr, progress=progress))
+        return cache.graph(frequency, required_snr, progress=progress)
+    if edges is None:
+        if workers != 1:
+            edges = parallel_graph_edges(objects, frequency, required_snr, workers=workers, progress=progress)
+        else:
+            edges = graph_edges(objects, frequency, required_snr, progress=progress)
+        if result_cache is not None:
+            result_cache.put_edges(key, *edges)
+    if sparse:
+        return EmdGraph(len(objects), *edges)
+    import networkx as nx  # Загружается при первом построении графа, а не при запуске программы
     G = nx.Graph()
-    for i, obj1 in enumerate(objects):
-        for j, obj2 in enumerate(objects):
-            if i >= j:
-                continue
-            distance = math.sqrt((obj1['x'] - obj2['x']) ** 2 + (obj1['y'] - obj2['y']) ** 2) / 1000
-            visibility = calculate_direct_visibility(obj1['height'], obj2['height'])
-            if distance > visibility:
-                continue
-            loss = calculate_path_loss(frequency, distance)
-            snr = calculate_signal_to_noise(obj1['power'], obj1['gain'], obj2['gain'], loss, obj1['noise_power'])
-            emd = calculate_emd(snr, required_snr)
-            if emd > 0.1:
-                G.add_edge(i, j, weight=1 - emd)
+    i, j, emd = edges
+    with stage('networkx_edges'):
+        G.add_weighted_edges_from(zip(i.tolist(), j.tolist(), (1 - emd).tolist()))
+    count('edges_added', i.size)
     return G
 
 
-def visualize_graph(G, objects, frame):
-    fig, ax = plt.subplots()
-    pos = {i: (obj['x'], obj['y']) for i, obj in enumerate(objects)}
-    nx.draw(G, pos, with_labels=True, node_size=500, node_color='skyblue', ax=ax)
-
-    # Получаем веса рёбер (ЭМД)
-    labels = nx.get_edge_attributes(G, 'weight')
-
-    # Создаем метки с конкретным значением для каждого ребра
-    edge_labels = {k: f"ЭМД: {1 - v:.2f}" for k, v in labels.items()}
-
-    # Позиции рёбер для отображения меток
-    edge_positions = {}
-    for (start, end) in G.edges():
-        x0, y0 = pos[start]
-        x1, y1 = pos[end]
-        edge_positions[(start, end)] = ((x0 + x1) / 2, (y0 + y1) / 2)
+def build_graph_from_matrix(matrix):
+    """Построение графа по готовой разреженной матрице ЭМД (LinkMatrix): обходятся только существующие связи."""
+    import networkx as nx
+    G = nx.Graph()
+    i, j, emd = matrix.edges(EDGE_THRESHOLD)
+    G.add_weighted_edges_from(zip(i.tolist(), j.tolist(), (1 - emd).tolist()))
+    return G
 
-    # Рисуем текст с белым фоном
-    for (start, end), label in edge_labels.items():
-        x, y = edge_positions[(start, end)]
-        ax.text(x + 0.05, y + 0.05, label, horizontalalignment='center', verticalalignment='center', fontsize=8,
-                bbox=dict(facecolor='white', edgecolor='none', boxstyle="round,pad=0.3"))
 
-    canvas = FigureCanvasTkAgg(fig, master=frame)
-    canvas.draw()
-    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+def analyze_graph(graph, source=None, target=None, progress=None):
+    """
+    Сводка анализа сети ретрансляции.
+    :param graph: Граф EmdGraph
+    :param source: Начальная вершина для поиска самого надежного пути (None - без поиска)
+    :param target: Конечная вершина
+    :param progress: Функция progress(done, total) для отчета о ходе оценки надежности методом Монте-Карло
+    :return: Текст сводки
+    """
+    from reliability import network_reliability
+    count_components, labels = graph.components()
+    nodes = graph.nodes()
+    lines = [f"Вершин со связями: {nodes.size}, рёбер: {graph.number_of_edges()}",
+             f"Компонент связности: {np.unique(labels[nodes]).size}" if nodes.size else "Компонент связности: 0"]
+    points = graph.articulation_points()
+    lines.append(f"Точек сочленения: {points.size}" + (f" ({', '.join(map(str, points[:20].tolist()))}"
+                                                       f"{', ...' if points.size > 20 else ''})" if points.size else ""))
+    betweenness = graph.betweenness(seed=0)
+    top = np.argsort(betweenness)[::-1][:TOP_RELAYS]
+    lines.append("Главные ретрансляторы: " + ", ".join(f"{k} ({betweenness[k]:.3f})" for k in top.tolist()
+                                                        if betweenness[k] > 0))
+    if source is not None:
+        path, reliability = graph.most_reliable_path(source, target)
+        if path:
+            lines.append(f"Самый надежный путь {source} -> {target}: {' -> '.join(map(str, path))}, "
+                         f"надежность {reliability:.3f}")
+            lines.append(f"Путей без общих ретрансляторов: {graph.node_connectivity(source, target)}")
+        else:
+            lines.append(f"Пути {source} -> {target} нет")
+    # Вероятность того, что при случайных замираниях на связях сеть (и пара вершин) останется связной
+    reliability = network_reliability(graph, [(source, target)] if source is not None else [], seed=0,
+                                      progress=progress)
+    lines.append(f"Надежность (Монте-Карло, {reliability.trials} испытаний, "
+                 f"интервал {reliability.network.confidence:.0%}):")
+    lines.append(f"  связность сети: {reliability.network}")
+    for (s, t), estimate in reliability.pairs.items():
+        lines.append(f"  связь {s} - {t}: {estimate}")
+    return "\n".join(lines)
+
+
+def visualize_graph(G, objects, plot):
+    # Фигура и коллекции создаются один раз в run_gui и обновляются на месте
+    with stage('graph_update'):
+        plot.update(G, objects)
+    plot.ax.figure.canvas.draw_idle()
 
 
 def run_gui():
+    # matplotlib нужен только окну программы: импорт модуля (например, ради build_graph) его не загружает
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+    from matplotlib.figure import Figure
+    from graph_plot import GraphPlot
+
     def add_object():
         try:
             x = float(entry_x.get())
@@ -88,28 +131,88 @@ def run_gui():
             noise_power = float(entry_noise_power.get())  # Мощность помехи
             objects.append({'x': x, 'y': y, 'height': height, 'power': power, 'gain': gain, 'noise_power': noise_power})
             messagebox.showinfo("Успех", f"Объект добавлен: x={x}, y={y}, height={height}, power={power}, gain={gain}, noise_power={noise_power}")
-            update_table()
+            table.show_last()  # Новая строка в конце таблицы
         except ValueError:
             messagebox.showerror("Ошибка", "Пожалуйста, введите корректные числовые значения")
 
+    def load_objects_from_file():
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+        if not file_path:
+            return
+        try:
+            # Файл разбирается целиком по столбцам; повторная загрузка идет из бинарного кэша
+            objects.extend_columns(load_objects(file_path))
+            messagebox.showinfo("Успех", "Объекты успешно загружены из файла")
+            update_table()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить файл: {e}")
+
     def update_table():
-        for i in tree.get_children():
-            tree.delete(i)
-        for idx, obj in enumerate(objects):
-            tree.insert("", "end", values=(idx, obj['x'], obj['y'], obj['height'], obj['power'], obj['gain'], obj['noise_power']))
+        table.refresh()  # Перерисовываются только видимые строки
 
     def build_and_show_graph():
         try:
             freq = float(entry_freq.get())
             required_snr = float(entry_snr.get())
-            G = build_graph(objects, freq, required_snr)
-            visualize_graph(G, objects, frame_graph)
+            workers = int(entry_workers.get() or 1)  # 0 - по числу ядер
         except ValueError:
             messagebox.showerror("Ошибка", "Пожалуйста, введите корректные параметры частоты и SNR")
+            return
+
+        # Расчет идет в фоновом потоке по копии объектов, поэтому их можно менять во время расчета
+        snapshot = objects.copy()
+        sparse = sparse_graph.get()
+
+        def work(progress):
+            instrumentation.reset()  # В строке состояния - замеры только последнего расчета
+            with stage('build_graph'):
+                return build_graph(snapshot, freq, required_snr, workers=workers,
+                                   cache=link_cache if workers == 1 else None, progress=progress, sparse=sparse,
+                                   result_cache=result_cache)
+
+        def show_graph(G):
+            last_graph['graph'], last_graph['size'] = G, len(snapshot)
+            visualize_graph(G, snapshot, graph_plot)
+
+        jobs.submit("Построение графа", work, show_graph,
+                    lambda error: messagebox.showerror("Ошибка", f"Не удалось построить граф: {error}"))
+
+    def analyze_and_show():
+        G = last_graph.get('graph')
+        if G is None:
+            messagebox.showerror("Ошибка", "Сначала постройте граф")
+            return
+        try:
+            source = int(entry_source.get()) if entry_source.get() else None
+            target = int(entry_target.get()) if source is not None else None
+        except ValueError:
+            messagebox.showerror("Ошибка", "Номера вершин должны быть целыми числами")
+            return
+        size = last_graph['size']
+        if source is not None and not (0 <= source < size and 0 <= target < size and source != target):
+            messagebox.showerror("Ошибка", f"Укажите две разные вершины от 0 до {size - 1}")
+            return
+
+        def work(progress):
+            from graph_analytics import EmdGraph
+            graph = G if isinstance(G, EmdGraph) else EmdGraph.from_networkx(G, size)
+            return analyze_graph(graph, source, target, progress)
+
+        jobs.submit("Анализ сети", work, lambda text: messagebox.showinfo("Анализ сети", text),
+                    lambda error: messagebox.showerror("Ошибка", f"Не удалось выполнить анализ: {error}"))
+
+    def refresh_status():
+        status_bar.config(text=instrumentation.summary())
+        root.after(STATUS_INTERVAL, refresh_status)
 
     root = tk.Tk()
     root.title("Построение графа ЭМД")
 
+    # Строка состояния: самые долгие этапы последнего расчета и счетчики
+    status_bar = tk.Label(root, anchor="w", relief=tk.SUNKEN)
+    status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+    refresh_status()
+
     frame_inputs = tk.Frame(root)
     frame_inputs.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=10)
 
@@ -133,6 +236,7 @@ def run_gui():
     entry_noise_power = tk.Entry(frame_inputs)
     entry_noise_power.pack()
     tk.Button(frame_inputs, text="Добавить объект", command=add_object).pack(pady=5)
+    tk.Button(frame_inputs, text="Загрузить из файла", command=load_objects_from_file).pack(pady=5)
 
     tk.Label(frame_inputs, text="Параметры связи").pack()
     tk.Label(frame_inputs, text="Частота (МГц)").pack()
@@ -141,29 +245,57 @@ def run_gui():
     tk.Label(frame_inputs, text="Требуемый SNR (дБ)").pack()
     entry_snr = tk.Entry(frame_inputs)
     entry_snr.pack()
+    tk.Label(frame_inputs, text="Число процессов (0 - все ядра)").pack()
+    entry_workers = tk.Entry(frame_inputs)
+    entry_workers.insert(0, "1")
+    entry_workers.pack()
+
+    sparse_graph = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame_inputs, text="Без NetworkX (большие сети)", variable=sparse_graph).pack()
 
     tk.Button(frame_inputs, text="Построить граф", command=build_and_show_graph).pack(pady=10)
 
+    # Анализ последнего построенного графа: компоненты, точки сочленения, надежный путь
+    last_graph = {}
+    tk.Label(frame_inputs, text="Путь между вершинами (необязательно)").pack()
+    frame_path = tk.Frame(frame_inputs)
+    frame_path.pack()
+    entry_source = tk.Entry(frame_path, width=8)
+    entry_source.pack(side=tk.LEFT)
+    tk.Label(frame_path, text="->").pack(side=tk.LEFT)
+    entry_target = tk.Entry(frame_path, width=8)
+    entry_target.pack(side=tk.LEFT)
+    tk.Button(frame_inputs, text="Анализ сети", command=analyze_and_show).pack(pady=5)
+
+    # Ход расчета и отмена; новые расчеты во время текущего ставятся в очередь
+    jobs = JobRunner(frame_inputs)
+    jobs.pack(fill=tk.X, pady=5)
+
     # Таблица для отображения объектов
     frame_table = tk.Frame(root)
     frame_table.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
 
-    tree = ttk.Treeview(frame_table, columns=("ID", "x", "y", "Height", "Power", "Gain", "Noise Power"), show="headings")
-    tree.heading("ID", text="ID")
-    tree.heading("x", text="x")
-    tree.heading("y", text="y")
-    tree.heading("Height", text="Height")
-    tree.heading("Power", text="Power")
-    tree.heading("Gain", text="Gain")
-    tree.heading("Noise Power", text="Noise Power")
-    tree.pack(fill=tk.BOTH, expand=True)
+    # Строки создаются только для видимой области, значения подставляются из хранилища при прокрутке
+    table = VirtualTable(frame_table, objects)
+    table.pack(fill=tk.BOTH, expand=True)
 
     frame_graph = tk.Frame(root)
     frame_graph.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
+    # Одна постоянная фигура: при каждом построении обновляются только данные
+    figure = Figure()
+    ax = figure.add_subplot()
+    graph_plot = GraphPlot(ax)
+    figure.colorbar(graph_plot.edges, ax=ax, label="ЭМД")
+    canvas = FigureCanvasTkAgg(figure, master=frame_graph)
+    NavigationToolbar2Tk(canvas, frame_graph)  # Масштаб и перемещение; подписи появляются при приближении
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
     root.mainloop()
 
 
 if __name__ == "__main__":
-    objects = []  # Список объектов
+    multiprocessing.freeze_support()  # Нужно для пула процессов в собранном PyInstaller .exe
+    objects = ObjectStore()  # Хранилище объектов (столбцы numpy)
+    instrumentation.enable()  # Замеры этапов для строки состояния
     run_gui()
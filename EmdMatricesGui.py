@@ -1,117 +1,135 @@
-import math
 import numpy as np
-from scipy.stats import norm
 import tkinter as tk
-from tkinter import messagebox, simpledialog, ttk, filedialog
-import csv
+from tkinter import messagebox, ttk, filedialog
+import multiprocessing
+from emd_engine import (emd_links, emd_sweep, emd_matrix_tiled, directed_pairs, objects_to_arrays, scenario_links,
+                        sweep_scenarios, DEFAULT_TILE_SIZE)
+# Расчет одной связи - в общем ядре emd_engine (зависит только от numpy); прежние имена функций сохранены
+from emd_engine import (direct_visibility as calculate_direct_visibility, path_loss as calculate_path_loss,
+                        signal_to_noise as calculate_signal_to_noise, emd_probability as calculate_emd)
+from parallel_engine import parallel_emd_links, parallel_emd_matrix_tiled
+from incremental import LinkCache
+from result_io import export_matrix, import_matrix
+from link_matrix import LinkMatrix
+from result_cache import ResultCache, objects_digest, links_key, iter_cached_links
+from object_store import ObjectStore
+from object_io import load_objects
+from virtual_table import VirtualTable
+from matrix_view import MatrixView
+from job_runner import JobRunner
+import instrumentation
+from instrumentation import stage
 
 matrices = []  # Список для хранения матриц
+link_cache = LinkCache()  # Геометрия пар и последний результат для инкрементного пересчета
+result_cache = ResultCache()  # Результаты прошлых расчетов на диске (по хэшу объектов и параметров)
+STATUS_INTERVAL = 1000  # Период обновления строки состояния с замерами (мс)
 
-def calculate_direct_visibility(h1, h2):
-    a_e = 8500  # Эквивалентный радиус Земли (км)
-    return math.sqrt(2 * a_e * h1) + math.sqrt(2 * a_e * h2)
-
-def calculate_path_loss(frequency, distance):
-    wavelength = 300 / frequency  # Длина волны (м)
-    return 20 * math.log10(distance * 1000) + 20 * math.log10(frequency) - 147.55
-
-def calculate_signal_to_noise(p1, g1, g2, loss, noise_power, weather_loss):
-    """Расчет отношения сигнал/шум с учетом мощности помехи и потерь из-за погоды."""
-    loss_with_weather = loss + (loss * weather_loss / 100)  # Учитываем потери из-за погоды
-    signal_power = p1 + g1 + g2 - loss_with_weather  # Мощность сигнала
-    return signal_power - noise_power  # SNR = сигнал минус шум
-
-def calculate_emd(snr, required_snr):
-    sigma = 3  # Среднеквадратичное отклонение
-    u = (snr - required_snr) / sigma
-    return norm.cdf(u)
-
-def build_matrix(objects, frequency, required_snr, weather_loss):
-    n = len(objects)
-    matrix = np.zeros((n, n))
-    for i, obj1 in enumerate(objects):
-        for j, obj2 in enumerate(objects):
-            if i == j:
-                continue
-            distance = math.sqrt((obj1['x'] - obj2['x']) ** 2 + (obj1['y'] - obj2['y']) ** 2) / 1000
-            visibility = calculate_direct_visibility(obj1['height'], obj2['height'])
-            if distance > visibility:
-                matrix[i][j] = 0
-                continue
-            loss = calculate_path_loss(frequency, distance)
-            snr = calculate_signal_to_noise(obj1['power'], obj1['gain'], obj2['gain'], loss, obj1['noise_power'], weather_loss)
-            emd = calculate_emd(snr, required_snr)
-            matrix[i][j] = round(emd, 2)  # Округляем значение до сотых
-    return matrix
+def round_matrix(matrix, storage=None):
+    """
+    Округляет значения ЭМД до сотых.
+    :param storage: None - float64; np.uint8 или np.float16 - компактное хранение (QuantizedLinkMatrix)
+    """
+    return matrix.quantized(storage) if storage is not None else matrix.rounded(2)
 
-def display_matrix(matrices, frame):
-    # Очищаем только область для матриц, чтобы не перерисовывать все элементы
-    for widget in frame.winfo_children():
-        widget.destroy()
+def build_matrix(objects, frequency, required_snr, weather_loss, out_path=None, tile_size=DEFAULT_TILE_SIZE,
+                 workers=1, cache=None, progress=None, result_cache=None, storage=None):
+    # progress(done, total) сообщает о ходе расчета; исключение из него прерывает расчет
+    # result_cache (ResultCache) - готовая матрица для тех же объектов и параметров читается с диска
+    # storage - тип хранения значений (см. round_matrix)
+    if out_path:
+        # Режим для больших сетей: матрица считается по тайлам прямо в файл .npy на диске
+        if workers != 1:
+            return parallel_emd_matrix_tiled(objects, out_path, frequency, required_snr, weather_loss,
+                                             tile_size=tile_size, decimals=2, workers=workers, progress=progress)
+        return emd_matrix_tiled(objects, out_path, frequency, required_snr, weather_loss,
+                                tile_size=tile_size, decimals=2, progress=progress)
+    if result_cache is not None:
+        key = links_key(objects_digest(objects), frequency, required_snr, weather_loss)
+        matrix = result_cache.get_links(key)
+        if matrix is not None:
+            return round_matrix(matrix, storage)
+    if cache is not None:
+        # Пересчитываются только строки и столбцы добавленных или измененных объектов
+        cache.sync(objects)
+        matrix = cache.links(frequency, required_snr, weather_loss, progress=progress)
+    # Расчет выполняется векторно только для пар в зоне видимости, результат - разреженная матрица
+    elif workers != 1:
+        matrix = parallel_emd_links(objects, frequency, required_snr, weather_loss, workers=workers,
+                                    progress=progress)
+    else:
+        matrix = emd_links(objects, frequency, required_snr, weather_loss, progress=progress)
+    # Записи для этого ключа в кэше нет (иначе она прочитана выше); инкрементный результат
+    # совпадает с полным расчетом, поэтому тоже сохраняется - его прочитают другие окна и emd_cli
+    if result_cache is not None:
+        result_cache.put_links(key, matrix)
+    return round_matrix(matrix, storage)  # Округляем значения до сотых
 
-    # Начальный столбец для отображения матриц
-    column_offset = 0
+def build_sweep(objects, frequencies, required_snrs, weather_losses, progress=None, result_cache=None,
+                storage=None):
+    """
+    Серия матриц для всех сочетаний параметров: геометрия считается один раз для всех сценариев.
+    С result_cache рассчитываются только сценарии, которых нет в кэше.
+    """
+    if result_cache is None:
+        scenarios, sweep = emd_sweep(objects, frequencies, required_snrs, weather_losses, progress=progress)
+        return scenarios, [round_matrix(matrix, storage) for matrix in sweep]  # Округляем значения до сотых
+    scenarios = sweep_scenarios(frequencies, required_snrs, weather_losses)
+    arrays = objects_to_arrays(objects)
 
-    # Отображаем все матрицы подряд по горизонтали
-    for matrix_idx, matrix in enumerate(matrices):
-        # Добавляем заголовок для каждой матрицы
-        header = tk.Label(frame, text=f"Расчет ЭМД для случая №{matrix_idx + 1}", font=("Arial", 14, "bold"))
-        header.grid(row=0, column=column_offset, columnspan=len(matrix) + 1, pady=10)
+    def compute(missing):
+        src, dst, distance = directed_pairs(arrays)
+        return zip(missing, scenario_links(arrays, src, dst, distance, missing, progress=progress))
 
-        # Добавляем заголовки столбцов
-        for j in range(len(matrix)):
-            header = tk.Label(frame, text=f"{j}", borderwidth=1, relief="solid", width=4, height=2, bg="lightgray")
-            header.grid(row=1, column=column_offset + j + 1, padx=1, pady=1)
+    sweep = iter_cached_links(result_cache, objects_digest(arrays), scenarios, compute)
+    return scenarios, [round_matrix(matrix, storage) for _, matrix in sweep]
 
-        # Добавляем заголовки строк и содержимое матрицы
-        for i, row in enumerate(matrix):
-            row_header = tk.Label(frame, text=f"{i}", borderwidth=1, relief="solid", width=4, height=2, bg="lightgray")
-            row_header.grid(row=i + 2, column=column_offset, padx=1, pady=1)
-            for j, value in enumerate(row):
-                color = "lightgreen" if value > 0.5 else "yellow" if value > 0.1 else "lightcoral"
-                label = tk.Label(frame, text=f"{value:.2f}", borderwidth=1, relief="solid", width=4, height=2, bg=color)
-                label.grid(row=i + 2, column=column_offset + j + 1, padx=1, pady=1)
+def parse_values(text):
+    """Разбирает список чисел, разделенных ';' или пробелами."""
+    return [float(value) for value in text.replace(';', ' ').split()]
+
+def display_matrix(matrices, frame):
+    # Очищаем только область для матриц, чтобы не перерисовывать все элементы
+    for widget in frame.winfo_children():
+        widget.destroy()
 
-        # Обновляем offset для следующей матрицы, чтобы она была в следующем столбце
-        column_offset += len(matrix) + 2
+    # Каждая матрица - отдельная вкладка; матрица рисуется одним изображением на Canvas,
+    # поэтому число виджетов не зависит от числа ячеек
+    with stage('tk_display'):
+        notebook = ttk.Notebook(frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+        for matrix_idx, matrix in enumerate(matrices):
+            tab = tk.Frame(notebook)
+            notebook.add(tab, text=f"Расчет ЭМД для случая №{matrix_idx + 1}")
+            MatrixView(tab, matrix).pack(fill=tk.BOTH, expand=True)
+    if matrices:
+        notebook.select(len(matrices) - 1)  # Показываем последнюю построенную матрицу
 
 def save_matrix_to_file(matrix):
-    file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+    # CSV пишется блоками строк; .npz - сжатая разреженная матрица, .edges.npz - список связей (i, j, ЭМД)
+    file_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                             filetypes=[("CSV files", "*.csv"), ("NumPy (сжатый)", "*.npz"),
+                                                        ("Список связей", "*.edges.npz")])
     if file_path:
         try:
-            with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-                writer = csv.writer(file)
-                writer.writerow([f"Column {i}" for i in range(len(matrix))])
-                writer.writerows(matrix)
+            export_matrix(file_path, matrix)
             messagebox.showinfo("Успех", "Матрица успешно сохранена в файл")
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {e}")
 
-def update_table(tree):
-    for i in tree.get_children():
-        tree.delete(i)
-    for idx, obj in enumerate(objects):
-        tree.insert("", "end", values=(idx, obj['x'], obj['y'], obj['height'], obj['power'], obj['gain'], obj['noise_power']))
+def update_table(table):
+    table.refresh()  # Перерисовываются только видимые строки
 
-def load_objects_from_file(tree):
+def load_objects_from_file(table):
     file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
     if not file_path:
         return
     try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                objects.append({
-                    'x': float(row['x']),
-                    'y': float(row['y']),
-                    'height': float(row['height']),
-                    'power': float(row['power']),
-                    'gain': float(row['gain']),
-                    'noise_power': float(row['noise_power'])
-                })
-            messagebox.showinfo("Успех", "Объекты успешно загружены из файла")
-            update_table(tree)
-    except (ValueError, KeyError, FileNotFoundError) as e:
+        # Файл разбирается целиком по столбцам; повторная загрузка идет из бинарного кэша
+        objects.extend_columns(load_objects(file_path))
+        messagebox.showinfo("Успех", "Объекты успешно загружены из файла")
+        update_table(table)
+    except (ValueError, OSError) as e:
         messagebox.showerror("Ошибка", f"Не удалось загрузить файл: {e}")
 
 def run_gui():
@@ -125,30 +143,97 @@ def run_gui():
             noise_power = float(entry_noise_power.get())  # Мощность помехи
             objects.append({'x': x, 'y': y, 'height': height, 'power': power, 'gain': gain, 'noise_power': noise_power})
             messagebox.showinfo("Успех", f"Объект добавлен: x={x}, y={y}, height={height}, power={power}, gain={gain}, noise_power={noise_power}")
-            update_table(tree)
+            update_table(table)
         except ValueError:
             messagebox.showerror("Ошибка", "Пожалуйста, введите корректные числовые значения")
 
-    def build_and_show_matrix():
-        if len(matrices) >= 3:
-            messagebox.showwarning("Ограничение", "Можно создать не более 3 матриц.")
-            return  # Прерываем выполнение функции, если уже 3 матрицы
+    def show_error(error):
+        messagebox.showerror("Ошибка", f"Не удалось выполнить расчет: {error}")
 
+    def build_and_show_matrix():
         try:
             freq = float(entry_freq.get())
             required_snr = float(entry_snr.get())
             weather_loss = float(entry_weather_loss.get())  # Получаем коэффициент потерь из-за погоды
-            matrix = build_matrix(objects, freq, required_snr, weather_loss)
-            matrices.append(matrix)  # Добавляем матрицу в список
-            display_matrix(matrices, frame_matrix)  # Отображаем все матрицы
-            if messagebox.askyesno("Сохранение", "Сохранить полученную матрицу в файл?"):
-                save_matrix_to_file(matrix)
+            workers = int(entry_workers.get() or 1)  # 0 - по числу ядер
         except ValueError:
             messagebox.showerror("Ошибка", "Пожалуйста, введите корректные параметры частоты, SNR и потерь из-за погоды")
+            return
+
+        # Расчет идет в фоновом потоке по копии объектов, поэтому их можно менять во время расчета
+        snapshot = objects.copy()
+        storage = np.uint8 if compact_storage.get() else None
+
+        def work(progress):
+            instrumentation.reset()  # В строке состояния - замеры только последнего расчета
+            with stage('build_matrix'):
+                return build_matrix(snapshot, freq, required_snr, weather_loss, workers=workers,
+                                    cache=link_cache if workers == 1 else None, progress=progress,
+                                    result_cache=result_cache, storage=storage)
+
+        jobs.submit("Расчет матрицы", work, show_matrix, show_error)
+
+    def show_matrix(matrix):
+        matrices.append(matrix)  # Добавляем матрицу в список
+        display_matrix(matrices, frame_matrix)  # Отображаем все матрицы
+        if messagebox.askyesno("Сохранение", "Сохранить полученную матрицу в файл?"):
+            save_matrix_to_file(matrix)
+
+    def open_matrix_file():
+        file_path = filedialog.askopenfilename(filetypes=[("Матрицы", "*.npz *.csv")])
+        if not file_path:
+            return
+        try:
+            # Архив .npz читается без разбора текста; CSV (заголовок Column i) - как плотная матрица
+            matrix = import_matrix(file_path)
+            if not isinstance(matrix, LinkMatrix):
+                matrix = LinkMatrix.from_dense(matrix)
+        except (ValueError, KeyError, OSError) as e:
+            messagebox.showerror("Ошибка", f"Не удалось открыть файл: {e}")
+            return
+        matrices.append(matrix)
+        display_matrix(matrices, frame_matrix)
+
+    def build_and_show_sweep():
+        try:
+            freqs = parse_values(entry_freq.get())
+            required_snrs = parse_values(entry_snr.get())
+            weather_losses = parse_values(entry_weather_loss.get())
+            if not (freqs and required_snrs and weather_losses):
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Ошибка", "Введите списки частот, SNR и потерь из-за погоды через ';' или пробел")
+            return
+
+        snapshot = objects.copy()
+        storage = np.uint8 if compact_storage.get() else None
+
+        def work(progress):
+            instrumentation.reset()
+            with stage('build_sweep'):
+                return build_sweep(snapshot, freqs, required_snrs, weather_losses, progress=progress,
+                                   result_cache=result_cache, storage=storage)
+
+        jobs.submit("Расчет серии матриц", work, show_sweep, show_error)
+
+    def show_sweep(result):
+        scenarios, sweep = result
+        matrices[:] = sweep  # Серия заменяет матрицы текущего сеанса
+        display_matrix(matrices, frame_matrix)
+        messagebox.showinfo("Успех", f"Рассчитано сценариев: {len(scenarios)}")
+
+    def refresh_status():
+        status_bar.config(text=instrumentation.summary())
+        root.after(STATUS_INTERVAL, refresh_status)
 
     root = tk.Tk()
     root.title("Матрица связи ЭМД")
 
+    # Строка состояния: самые долгие этапы последнего расчета и счетчики
+    status_bar = tk.Label(root, anchor="w", relief=tk.SUNKEN)
+    status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+    refresh_status()
+
     frame_inputs = tk.Frame(root)
     frame_inputs.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=10)
 
@@ -172,7 +257,7 @@ def run_gui():
     entry_noise_power = tk.Entry(frame_inputs)
     entry_noise_power.pack()
     tk.Button(frame_inputs, text="Добавить объект", command=add_object).pack(pady=5)
-    tk.Button(frame_inputs, text="Загрузить из файла", command=lambda: load_objects_from_file(tree)).pack(pady=5)
+    tk.Button(frame_inputs, text="Загрузить из файла", command=lambda: load_objects_from_file(table)).pack(pady=5)
 
     tk.Label(frame_inputs, text="Параметры связи").pack()
     tk.Label(frame_inputs, text="Частота (МГц)").pack()
@@ -184,22 +269,29 @@ def run_gui():
     tk.Label(frame_inputs, text="Потери из-за погоды (%)").pack()  # Новый ввод для коэффициента потерь
     entry_weather_loss = tk.Entry(frame_inputs)
     entry_weather_loss.pack()
+    tk.Label(frame_inputs, text="Число процессов (0 - все ядра)").pack()
+    entry_workers = tk.Entry(frame_inputs)
+    entry_workers.insert(0, "1")
+    entry_workers.pack()
+    # ЭМД хранится в 1 байте (сотые доли) вместо 8: меньше памяти для серий и истории матриц сеанса
+    compact_storage = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame_inputs, text="Компактное хранение", variable=compact_storage).pack()
 
     tk.Button(frame_inputs, text="Построить матрицу", command=build_and_show_matrix).pack(pady=10)
+    tk.Button(frame_inputs, text="Построить серию матриц", command=build_and_show_sweep).pack(pady=5)
+    tk.Button(frame_inputs, text="Открыть матрицу", command=open_matrix_file).pack(pady=5)
+
+    # Ход расчета и отмена; новые расчеты во время текущего ставятся в очередь
+    jobs = JobRunner(frame_inputs)
+    jobs.pack(fill=tk.X, pady=5)
 
     # Таблица для отображения объектов
     frame_table = tk.Frame(root)
     frame_table.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
 
-    tree = ttk.Treeview(frame_table, columns=("ID", "x", "y", "Height", "Power", "Gain", "Noise Power"), show="headings")
-    tree.heading("ID", text="ID")
-    tree.heading("x", text="x")
-    tree.heading("y", text="y")
-    tree.heading("Height", text="Height")
-    tree.heading("Power", text="Power")
-    tree.heading("Gain", text="Gain")
-    tree.heading("Noise Power", text="Noise Power")
-    tree.pack(fill=tk.BOTH, expand=True)
+    # Строки создаются только для видимой области, значения подставляются из хранилища при прокрутке
+    table = VirtualTable(frame_table, objects)
+    table.pack(fill=tk.BOTH, expand=True)
 
     frame_matrix = tk.Frame(root)
     frame_matrix.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
@@ -207,5 +299,7 @@ def run_gui():
     root.mainloop()
 
 if __name__ == "__main__":
-    objects = []  # Список объектов
+    multiprocessing.freeze_support()  # Нужно для пула процессов в собранном PyInstaller .exe
+    objects = ObjectStore()  # Хранилище объектов (столбцы numpy)
+    instrumentation.enable()  # Замеры этапов для строки состояния
     run_gui()
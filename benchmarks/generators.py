@@ -0,0 +1,50 @@
+import numpy as np
+from object_store import OBJECT_FIELDS
+
+DENSE_SIDE = 50_000  # Сторона области плотной расстановки (м): все объекты в прямой видимости друг друга
+SPARSE_DEGREE = 10  # Среднее число соседей в прямой видимости при разреженной расстановке
+LAYOUTS = ('dense', 'sparse')
+
+
+def make_objects(n, layout='sparse', seed=0):
+    """
+    Синтетический набор объектов для измерений.
+    dense - все объекты в квадрате DENSE_SIDE, число связей растет как n^2;
+    sparse - площадь растет вместе с n, у объекта в среднем SPARSE_DEGREE соседей.
+    :param n: Число объектов
+    :param layout: Вид расстановки ('dense' или 'sparse')
+    :param seed: Начальное значение генератора случайных чисел (наборы воспроизводимы)
+    :return: Словарь {поле: np.ndarray}
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"неизвестная расстановка: {layout}")
+    rng = np.random.default_rng(seed)
+    height = rng.uniform(10, 50, n)
+    if layout == 'dense':
+        side = DENSE_SIDE
+    else:
+        # Средняя дальность видимости пары (км) и площадь, при которой в круге этого радиуса
+        # в среднем SPARSE_DEGREE объектов
+        reach = 2 * np.sqrt(2 * 8500 * height).mean()
+        side = np.sqrt(n * np.pi * reach ** 2 / SPARSE_DEGREE) * 1000
+    return {
+        'x': rng.uniform(0, side, n),
+        'y': rng.uniform(0, side, n),
+        'height': height,
+        'power': rng.uniform(20, 40, n),
+        'gain': rng.uniform(0, 15, n),
+        'noise_power': rng.uniform(-100, -80, n),
+    }
+
+
+def expected_links(n, layout):
+    """
+    :return: Ориентировочное число направленных связей для набора make_objects
+    """
+    return n * (n - 1) if layout == 'dense' else n * SPARSE_DEGREE
+
+
+def write_objects_csv(path, columns):
+    """Записывает объекты в CSV в формате test.csv (заголовок x,y,height,power,gain,noise_power)."""
+    data = np.column_stack([columns[field] for field in OBJECT_FIELDS])
+    np.savetxt(path, data, fmt='%.6f', delimiter=',', header=','.join(OBJECT_FIELDS), comments='')
@@ -0,0 +1,242 @@
+"""
+Измерение времени и пиковой памяти основных операций на синтетических наборах объектов.
+
+    python benchmarks/run_benchmarks.py                      # малые размеры, сравнение с базовой линией
+    python benchmarks/run_benchmarks.py --scale large --save-baseline
+    python benchmarks/run_benchmarks.py --only build_matrix build_graph --layout sparse
+
+Отрисовка выполняется без дисплея: граф - на холсте Agg, матрица - подготовкой данных
+тайлов изображения (как в MatrixView, но без Tk). Код выхода 1 означает регрессию.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import matplotlib  # noqa: E402
+
+matplotlib.use('Agg')  # До импорта модулей программы: отрисовка без дисплея
+
+from benchmarks.generators import LAYOUTS, make_objects, expected_links, write_objects_csv  # noqa: E402
+from object_store import ObjectStore  # noqa: E402
+
+SCALES = {
+    'small': (10, 100, 1000),
+    'medium': (10, 100, 1000, 10_000),
+    'large': (10, 100, 1000, 10_000, 100_000),
+}
+MAX_LINKS = 10_000_000  # Наборы с большим ожидаемым числом связей пропускаются (память)
+MIN_TIME = 0.5  # Операция повторяется, пока суммарное время меньше (с)
+MAX_REPEATS = 5
+TOLERANCE = 0.2  # Допустимое ухудшение относительно базовой линии (доля)
+MIN_TIME_DELTA = 0.005  # Разница времени (с), которую можно считать шумом
+MIN_MEMORY_DELTA = 1.0  # Разница памяти (МБ), которую можно считать шумом
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+FREQUENCY, REQUIRED_SNR, WEATHER_LOSS = 400, 10, 5
+TIME_STEPS = 100
+VIEWPORT = 640  # Размер видимой области матрицы (пиксели)
+
+
+def bench_build_matrix(objects, workdir):
+    from EmdMatricesGui import build_matrix
+    return lambda: build_matrix(objects, FREQUENCY, REQUIRED_SNR, WEATHER_LOSS)
+
+
+def bench_build_graph(objects, workdir):
+    from EmdGraphsProgramGui import build_graph
+    return lambda: build_graph(objects, FREQUENCY, REQUIRED_SNR)
+
+
+def bench_load_objects(objects, workdir):
+    from object_io import load_objects
+    path = os.path.join(workdir, 'objects.csv')
+    write_objects_csv(path, objects.arrays())
+    return lambda: load_objects(path, use_cache=False)
+
+
+def bench_load_objects_cached(objects, workdir):
+    from object_io import load_objects
+    path = os.path.join(workdir, 'objects_cached.csv')
+    write_objects_csv(path, objects.arrays())
+    load_objects(path)  # Создается бинарный кэш
+    return lambda: load_objects(path)
+
+
+def bench_display_matrix(objects, workdir):
+    from EmdMatricesGui import build_matrix
+    from matrix_view import tile_image_data, TILE, MAX_ZOOM
+    matrix = build_matrix(objects, FREQUENCY, REQUIRED_SNR, WEATHER_LOSS)
+    size = len(matrix)
+    zoom = min(MAX_ZOOM, max(600 / max(size, 1), 1 / TILE))  # Начальный масштаб MatrixView
+    tiles = math.ceil(min(size * zoom, VIEWPORT) / TILE)
+
+    def render():
+        for tx in range(tiles):
+            for ty in range(tiles):
+                tile_image_data(matrix, size, zoom, tx, ty)
+    return render
+
+
+def bench_visualize_graph(objects, workdir):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from EmdGraphsProgramGui import build_graph
+    from graph_plot import GraphPlot
+    G = build_graph(objects, FREQUENCY, REQUIRED_SNR)
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    plot = GraphPlot(figure.add_subplot())
+
+    def render():
+        plot.update(G, objects)
+        figure.canvas.draw()
+    return render
+
+
+def bench_time_series(objects, workdir):
+    import numpy as np
+    from markovitz_with_file_io import create_time_series_matrix, emd_time_steps
+    weather = np.linspace(0, 50, TIME_STEPS).tolist()
+    return lambda: create_time_series_matrix(
+        emd_time_steps(objects, ((FREQUENCY, REQUIRED_SNR, w) for w in weather)), TIME_STEPS)
+
+
+BENCHMARKS = {
+    'build_matrix': bench_build_matrix,
+    'build_graph': bench_build_graph,
+    'load_objects': bench_load_objects,
+    'load_objects_cached': bench_load_objects_cached,
+    'display_matrix': bench_display_matrix,
+    'visualize_graph': bench_visualize_graph,
+    'create_time_series_matrix': bench_time_series,
+}
+
+
+def measure(func):
+    """
+    Измеряет время (несколько повторов) и пиковую память (отдельный запуск под tracemalloc,
+    так как трассировка замедляет выполнение).
+    :return: Словарь с результатами
+    """
+    times = []
+    while len(times) < MAX_REPEATS and (not times or sum(times) < MIN_TIME):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'time_min': min(times), 'time_median': statistics.median(times), 'repeats': len(times),
+            'peak_mb': peak / 2 ** 20}
+
+
+def run(names, layouts, sizes, workdir):
+    """
+    Выполняет измерения для всех сочетаний операций, расстановок и размеров.
+    :return: Словарь {ключ 'операция/расстановка/n': результат}
+    """
+    results = {}
+    for layout in layouts:
+        for n in sizes:
+            key_prefix = f"{layout}/{n}"
+            if expected_links(n, layout) > MAX_LINKS:
+                print(f"{key_prefix}: пропуск (ожидается больше {MAX_LINKS} связей)")
+                continue
+            objects = ObjectStore.from_columns(make_objects(n, layout))
+            for name in names:
+                key = f"{name}/{key_prefix}"
+                try:
+                    func = BENCHMARKS[name](objects, workdir)
+                except ImportError as e:
+                    print(f"{key}: пропуск ({e})")
+                    continue
+                results[key] = measure(func)
+                result = results[key]
+                print(f"{key}: {result['time_median'] * 1000:.1f} мс (мин. {result['time_min'] * 1000:.1f}, "
+                      f"повторов {result['repeats']}), пик памяти {result['peak_mb']:.1f} МБ")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Сравнивает результаты с базовой линией.
+    :return: Список описаний регрессий
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if (result['time_median'] > base['time_median'] * (1 + tolerance)
+                and result['time_median'] - base['time_median'] > MIN_TIME_DELTA):
+            regressions.append(f"{key}: время {base['time_median'] * 1000:.1f} -> "
+                               f"{result['time_median'] * 1000:.1f} мс")
+        if (result['peak_mb'] > base['peak_mb'] * (1 + tolerance)
+                and result['peak_mb'] - base['peak_mb'] > MIN_MEMORY_DELTA):
+            regressions.append(f"{key}: память {base['peak_mb']:.1f} -> {result['peak_mb']:.1f} МБ")
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Измерения производительности расчета и отрисовки ЭМД")
+    parser.add_argument('--scale', choices=SCALES, default='small', help="Набор размеров (число объектов)")
+    parser.add_argument('--sizes', type=int, nargs='+', help="Размеры вместо набора --scale")
+    parser.add_argument('--layout', choices=LAYOUTS, nargs='+', default=list(LAYOUTS), help="Расстановки объектов")
+    parser.add_argument('--only', choices=BENCHMARKS, nargs='+', default=list(BENCHMARKS), help="Операции")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Файл базовой линии (JSON)")
+    parser.add_argument('--save-baseline', action='store_true', help="Сохранить результаты как базовую линию")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Допустимое ухудшение (доля)")
+    parser.add_argument('--json', help="Сохранить результаты в файл JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.only, args.layout, args.sizes or SCALES[args.scale], workdir)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    baseline = load_baseline(args.baseline)
+    if args.save_baseline:
+        # Базовая линия дополняется: измерения других размеров и операций сохраняются
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Базовая линия сохранена: {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("Базовая линия не найдена; сохраните ее с --save-baseline")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ {regression}")
+    if not regressions:
+        print("Регрессий нет")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Расчет матриц и рёбер графа ЭМД из командной строки, без графического интерфейса.
+Не импортирует tkinter и matplotlib, поэтому работает на серверах без дисплея (cron, конвейеры).
+
+Примеры:
+    python emd_cli.py matrix test.csv -f 400 -s 10 -w 5 -o matrix.csv
+    python emd_cli.py edges test.csv -f 400 800 -s 10 15 --no-noise > edges.csv
+    python emd_cli.py links objects.csv --scenarios scenarios.csv -o links.csv
+    python emd_cli.py edges test.csv -f 400 800 -s 10 -o edges.npz   # сжатый двоичный архив (result_io)
+    python emd_cli.py edges test.csv -f 400 -s 10 --dem relief.bil      # с учетом рельефа (terrain)
+"""
+import argparse
+import os
+import sys
+import numpy as np
+from emd_engine import directed_pairs, iter_scenario_links, sweep_scenarios, EDGE_THRESHOLD
+from object_io import load_objects
+from object_store import ObjectStore
+from result_cache import ResultCache, objects_digest, iter_cached_links
+from result_io import write_matrix_csv, write_results_npz, SCENARIO_FIELDS
+from terrain import Terrain
+import instrumentation
+from instrumentation import stage
+
+
+def read_scenarios(path):
+    """
+    Читает список сценариев из CSV с заголовком frequency,required_snr[,weather_loss].
+    :param path: Путь к файлу сценариев
+    :return: Список кортежей (частота, требуемый SNR, потери из-за погоды)
+    """
+    with open(path, mode='r', newline='', encoding='utf-8-sig') as file:
+        header = [name.strip() for name in file.readline().rstrip('\r\n').split(',')]
+    missing = [field for field in SCENARIO_FIELDS[:2] if field not in header]
+    if missing:
+        raise ValueError(f"{path}: нет столбцов: {', '.join(missing)}")
+    data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2, encoding='utf-8-sig')
+    columns = [data[:, header.index(field)] if field in header else np.zeros(len(data))
+               for field in SCENARIO_FIELDS]
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def write_pairs(out, scenario, i, j, emd, fmt):
+    """Записывает связи в виде строк frequency,required_snr,weather_loss,i,j,emd."""
+    prefix = ",".join(f"{value:g}" for value in scenario)
+    lines = (f"{prefix},{a},{b},{value}" for a, b, value in
+             zip(i.tolist(), j.tolist(), np.char.mod(fmt, emd).tolist()))
+    out.writelines(line + "\n" for line in lines)
+
+
+def run(args, out):
+    """
+    Выполняет расчет для всех сценариев и пишет результат в out по мере готовности.
+    :param args: Разобранные аргументы командной строки
+    :param out: Текстовый поток для результата; None - двоичный архив .npz в файл args.output
+    :return: Кортеж (число объектов, число сценариев)
+    """
+    objects = ObjectStore.from_columns(load_objects(args.objects, use_cache=not args.no_cache))
+    if args.scenarios:
+        scenarios = read_scenarios(args.scenarios)
+    else:
+        scenarios = sweep_scenarios(args.frequency, args.snr, args.weather)
+    if not scenarios:
+        raise ValueError("не заданы сценарии: укажите --frequency и --snr или --scenarios")
+
+    if args.quantize and (args.command == 'edges' or not (args.output or '').endswith('.npz')):
+        raise ValueError("--quantize применяется только к matrix и links с выводом в файл .npz")
+    fmt = f"%.{args.decimals}f"
+    arrays = objects.arrays()
+    with_noise = not args.no_noise
+    terrain = Terrain.open(args.dem) if args.dem else None
+
+    def compute(batch):
+        # Геометрия (пары в зоне видимости, расстояния и профили рельефа) считается один раз для всех сценариев
+        with stage('geometry'):
+            src, dst, distance = directed_pairs(arrays)
+            obstruction = terrain.directed_obstruction(arrays, src, dst, distance) if terrain else None
+        # Сценарии считаются векторно группами ограниченного объема (см. emd_engine.SCENARIO_ELEMENTS)
+        return iter_scenario_links(arrays, src, dst, distance, batch, with_noise=with_noise, obstruction=obstruction)
+
+    if args.no_result_cache:
+        results = compute(scenarios)
+    else:
+        # Сценарии, уже рассчитанные для тех же объектов (в том числе в окнах программы), читаются с диска
+        results = iter_cached_links(ResultCache(args.cache_dir), objects_digest(arrays, terrain), scenarios, compute,
+                                    with_noise)
+
+    if out is None:
+        # Архив пишется по одному сценарию (см. result_io.write_results_npz), значения не округляются,
+        # кроме матрицы, которая сохраняется так же, как в CSV
+        if args.command == 'edges':
+            payloads = ((scenario, matrix.edges(args.threshold)) for scenario, matrix in results)
+        elif args.quantize:
+            # Значения округляются до сотых и хранятся в 1 (uint8) или 2 (float16) байтах
+            dtype = np.dtype(args.quantize).type
+            payloads = ((scenario, matrix.quantized(dtype)) for scenario, matrix in results)
+        elif args.command == 'matrix':
+            payloads = ((scenario, matrix.rounded(args.decimals)) for scenario, matrix in results)
+        else:
+            payloads = results
+        with stage('write_output'):
+            write_results_npz(args.output, 'edges' if args.command == 'edges' else 'links', len(objects), payloads)
+        return len(objects), len(scenarios)
+
+    if args.command != 'matrix':
+        out.write(",".join(SCENARIO_FIELDS + (('i', 'j') if args.command == 'edges' else ('src', 'dst'))
+                           + ('emd',)) + "\n")
+    for scenario, matrix in results:
+        with stage('write_output'):
+            if args.command == 'matrix':
+                if len(scenarios) > 1:
+                    # Строки-комментарии пропускаются np.loadtxt и разделяют матрицы сценариев
+                    out.write("# " + "; ".join(f"{name}={value:g}"
+                                               for name, value in zip(SCENARIO_FIELDS, scenario)) + "\n")
+                write_matrix_csv(out, matrix.rounded(args.decimals), fmt)
+            elif args.command == 'edges':
+                write_pairs(out, scenario, *matrix.edges(args.threshold), fmt)
+            else:
+                write_pairs(out, scenario, *matrix.to_coo(), fmt)
+    return len(objects), len(scenarios)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчет ЭМД без графического интерфейса")
+    parser.add_argument('command', choices=('matrix', 'edges', 'links'),
+                        help="matrix - плотная матрица ЭМД (как в EmdMatricesGui); "
+                             "edges - рёбра графа i < j с ЭМД выше порога; "
+                             "links - все направленные связи в зоне видимости")
+    parser.add_argument('objects', help="CSV-файл объектов (x,y,height,power,gain,noise_power)")
+    parser.add_argument('-f', '--frequency', type=float, nargs='+', default=[], help="Частоты (МГц)")
+    parser.add_argument('-s', '--snr', type=float, nargs='+', default=[], help="Требуемые SNR (дБ)")
+    parser.add_argument('-w', '--weather', type=float, nargs='+', default=[0.0],
+                        help="Потери из-за погоды (%%), по умолчанию 0")
+    parser.add_argument('--scenarios', help="CSV со сценариями (frequency,required_snr[,weather_loss]) "
+                                            "вместо всех сочетаний -f, -s и -w")
+    parser.add_argument('-o', '--output', help="Файл результата (по умолчанию - стандартный вывод); "
+                                               "для .npz - сжатый двоичный архив")
+    parser.add_argument('--threshold', type=float, default=EDGE_THRESHOLD, help="Порог ЭМД для рёбер графа")
+    parser.add_argument('--decimals', type=int, default=2, help="Число знаков после запятой")
+    parser.add_argument('--quantize', choices=('uint8', 'float16'),
+                        help="Компактное хранение ЭМД (сотые доли) в архиве .npz для matrix и links")
+    parser.add_argument('--dem', metavar='PATH',
+                        help="Растр высот ESRI BIL (.bil с заголовком .hdr) в координатах объектов: "
+                             "к затуханию добавляются потери дифракции на рельефе")
+    parser.add_argument('--no-noise', action='store_true', help="Не учитывать мощность помехи (как EmdGraphsProgram)")
+    parser.add_argument('--no-cache', action='store_true', help="Не использовать бинарный кэш CSV-файла объектов")
+    parser.add_argument('--cache-dir', help="Каталог кэша результатов (по умолчанию EMD_CACHE_DIR "
+                                            "или ~/.cache/emd_results)")
+    parser.add_argument('--no-result-cache', action='store_true', help="Не читать и не сохранять кэш результатов")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Дописать время этапов и счетчики строкой JSON в файл (формат JSON Lines)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        instrumentation.enable()
+    try:
+        with stage('total'):
+            if args.output and args.output.endswith('.npz'):
+                n_objects, n_scenarios = run(args, None)
+            elif args.output:
+                with open(args.output, mode='w', newline='', encoding='utf-8') as out:
+                    n_objects, n_scenarios = run(args, out)
+            else:
+                n_objects, n_scenarios = run(args, sys.stdout)
+        if args.profile:
+            with open(args.profile, mode='a', encoding='utf-8') as file:
+                instrumentation.write_json_line(file, f"{args.command} {args.objects}",
+                                                objects=n_objects, scenarios=n_scenarios)
+    except BrokenPipeError:
+        # Читатель закрыл канал (например, head); остаток вывода отбрасывается без ошибки
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (ValueError, OSError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+import itertools
+import numpy as np
+from spatial_index import candidate_pairs
+from link_matrix import LinkMatrix, csr_indptr
+from object_store import ObjectStore, OBJECT_FIELDS
+from instrumentation import stage, count
+
+EARTH_RADIUS = 8500  # Эквивалентный радиус Земли (км)
+EMD_SIGMA = 3  # Среднеквадратичное отклонение (дБ)
+EDGE_THRESHOLD = 0.1  # Порог ЭМД для добавления ребра в граф
+DEFAULT_TILE_SIZE = 1024  # Размер тайла для расчета матрицы по частям
+PAIRS_BLOCK = 1 << 20  # Сколько значений ЭМД считать за один шаг (между отчетами о ходе расчета)
+SCENARIO_ELEMENTS = 1 << 24  # Сколько значений ЭМД (сценарии x связи) держать в памяти одновременно
+
+
+def objects_to_arrays(objects):
+    """
+    Переводит набор объектов в массивы по полям.
+    :param objects: Хранилище ObjectStore или список объектов (словарей)
+    :return: Словарь {поле: np.ndarray}; отсутствующее поле (например, noise_power) заполняется нулями.
+             Для ObjectStore возвращаются представления его столбцов без копирования.
+    """
+    if isinstance(objects, ObjectStore):
+        return objects.arrays()
+    n = len(objects)
+    return {
+        field: np.fromiter((obj.get(field, 0.0) for obj in objects), dtype=float, count=n)
+        for field in OBJECT_FIELDS
+    }
+
+
+def horizon_radius(height):
+    """
+    Рассчитывает вклад одной антенны в расстояние прямой радиовидимости.
+    :param height: Высота антенны (м), скаляр или массив
+    :return: Радиус радиогоризонта (км)
+    """
+    return np.sqrt(2 * EARTH_RADIUS * np.asarray(height, dtype=float))
+
+
+def direct_visibility(h1, h2):
+    """
+    Рассчитывает расстояние прямой радиовидимости между двумя антеннами.
+    :param h1: Высота первой антенны (м), скаляр или массив
+    :param h2: Высота второй антенны (м), скаляр или массив
+    :return: Расстояние прямой радиовидимости (км)
+    """
+    return horizon_radius(h1) + horizon_radius(h2)
+
+
+def path_loss(frequency, distance):
+    """
+    Векторный расчет затухания сигнала в свободном пространстве.
+    :param frequency: Частота сигнала (МГц)
+    :param distance: Расстояние (км), массив
+    :return: Затухание (дБ)
+    """
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(distance * 1000) + 20 * np.log10(frequency) - 147.55
+
+
+def diffraction_loss(obstruction, frequency):
+    """
+    Потери дифракции на препятствии рельефа (модель одиночного клина, ITU-R P.526).
+    :param obstruction: Параметры препятствия трасс (см. terrain.Terrain.obstruction), массив
+    :param frequency: Частота сигнала (МГц); скаляр или столбец (S, 1)
+    :return: Дополнительное затухание (дБ); 0 для трасс с открытой зоной Френеля
+    """
+    v = obstruction / np.sqrt(300 / np.asarray(frequency, dtype=float))  # Длина волны в метрах
+    with np.errstate(invalid='ignore'):
+        loss = 6.9 + 20 * np.log10(np.sqrt((v - 0.1) ** 2 + 1) + v - 0.1)
+    return np.where(v > -0.78, loss, 0.0)
+
+
+def signal_to_noise(p1, g1, g2, loss, noise_power=0.0, weather_loss=0.0):
+    """
+    Векторный расчет отношения сигнал/шум с учетом мощности помехи и потерь из-за погоды.
+    :param p1: Мощность передатчика (дБм)
+    :param g1: Коэффициент усиления передающей антенны (дБ)
+    :param g2: Коэффициент усиления приемной антенны (дБ)
+    :param loss: Затухание сигнала (дБ)
+    :param noise_power: Мощность помехи (дБм)
+    :param weather_loss: Потери из-за погоды (%)
+    :return: SNR (дБ)
+    """
+    loss_with_weather = loss + (loss * weather_loss / 100)
+    return p1 + g1 + g2 - loss_with_weather - noise_power
+
+
+def emd_probability(snr, required_snr):
+    """
+    Векторный расчет вероятности ЭМД.
+    :param snr: Отношение сигнал/шум (дБ)
+    :param required_snr: Требуемый SNR (дБ)
+    :return: Вероятность ЭМД (от 0 до 1)
+    """
+    return normal_cdf((snr - required_snr) / EMD_SIGMA)
+
+
+# Коэффициенты рациональных приближений erf и erfc (W. J. Cody, 1969), относительная точность ~1e-16
+_ERF_A = (3.16112374387056560e00, 1.13864154151050156e02, 3.77485237685302021e02, 3.20937758913846947e03,
+          1.85777706184603153e-1)
+_ERF_B = (2.36012909523441209e01, 2.44024637934444173e02, 1.28261652607737228e03, 2.84423683343917062e03)
+_ERFC_C = (5.64188496988670089e-1, 8.88314979438837594e00, 6.61191906371416295e01, 2.98635138197400131e02,
+           8.81952221241769090e02, 1.71204761263407058e03, 2.05107837782607147e03, 1.23033935479799725e03,
+           2.15311535474403846e-8)
+_ERFC_D = (1.57449261107098347e01, 1.17693950891312499e02, 5.37181101862009858e02, 1.62138957456669019e03,
+           3.29079923573345963e03, 4.36261909014324716e03, 3.43936767414372164e03, 1.23033935480374942e03)
+_ERFC_P = (3.05326634961232344e-1, 3.60344899949804439e-1, 1.25781726111229246e-1, 1.60837851487422766e-2,
+           6.58749161529837803e-4, 1.63153871373020978e-2)
+_ERFC_Q = (2.56852019228982242e00, 1.87295284992346725e00, 5.27905102951428412e-1, 6.05183413124413191e-2,
+           2.33520497626869185e-3)
+
+
+def _rational(t, numerator, denominator, leading):
+    """
+    Отношение многочленов по схеме Горнера с вычислениями на месте (без временных массивов).
+    :param t: Аргумент (одномерный массив)
+    :param numerator: Коэффициенты числителя, последний - свободный член
+    :param denominator: Коэффициенты знаменателя (старший равен 1), последний - свободный член
+    :param leading: Старший коэффициент числителя
+    """
+    num = t * leading
+    den = t.copy()
+    for a, b in zip(numerator[:-1], denominator[:-1]):
+        num += a
+        num *= t
+        den += b
+        den *= t
+    num += numerator[-1]
+    den += denominator[-1]
+    num /= den
+    return num
+
+
+def _normal_cdf_unsaturated(x):
+    """
+    Ф(x) для одномерного массива x. Все ветви приближения считаются для всего массива и выбираются np.where:
+    это быстрее выборки элементов по маскам.
+    """
+    # При y > 27 erfc(y) меньше наименьшего числа float64; ограничение убирает inf из вычислений
+    y = np.minimum(np.abs(x) / np.sqrt(2), 27.0)
+    # В окрестности нуля Ф(x) = (1 + erf(x / sqrt(2))) / 2
+    t = np.minimum(y, 0.5)
+    erf = t * _rational(t * t, _ERF_A[:4], _ERF_B, _ERF_A[4])
+    central = 0.5 + 0.5 * np.copysign(erf, x)
+    # На хвостах erfc(y) = R(y) * exp(-y^2); квадрат раскладывается на две части,
+    # чтобы не терять точность exp(-y^2) при больших y
+    erfc = _rational(np.clip(y, 0.5, 4.0), _ERFC_C[:8], _ERFC_D, _ERFC_C[8])
+    t = np.maximum(y, 4.0)
+    z = 1 / (t * t)
+    far = (1 / np.sqrt(np.pi) - z * _rational(z, _ERFC_P[:5], _ERFC_Q, _ERFC_P[5])) / t
+    erfc = np.where(y <= 4.0, erfc, far)
+    square = np.trunc(y * 16) / 16
+    rest = y - square
+    rest *= y + square
+    square *= square
+    square += rest
+    erfc *= np.exp(-square)
+    erfc *= 0.5
+    return np.where(y <= 0.5, central, np.where(x < 0, erfc, 1 - erfc))
+
+
+def normal_cdf(x):
+    """
+    Функция распределения стандартного нормального закона без scipy:
+    Ф(x) = erfc(-x / sqrt(2)) / 2, точность совпадает с scipy.stats.norm.cdf.
+    :param x: Скаляр или массив
+    :return: Ф(x) того же вида (скаляр для скалярного аргумента)
+    """
+    x = np.asarray(x, dtype=float)
+    # Для x > 8.3 результат равен 1, для x < -38.5 - 0 с точностью float64: приближение
+    # считается только для остальных элементов (в сети большинство связей обычно насыщено)
+    flat = x.ravel()
+    result = (flat > 0).astype(float)
+    active = np.flatnonzero(~((flat > 8.3) | (flat < -38.5)))
+    if active.size == flat.size:
+        result = _normal_cdf_unsaturated(flat)
+    elif active.size:
+        result[active] = _normal_cdf_unsaturated(flat[active])
+    result = result.reshape(x.shape)
+    return result[()] if result.ndim == 0 else result
+
+
+def visible_pairs(arrays):
+    """
+    Находит пары объектов в зоне прямой радиовидимости с помощью пространственного индекса.
+    :param arrays: Словарь массивов объектов (см. objects_to_arrays)
+    :return: Кортеж массивов (i, j, distance), i < j, расстояние в км
+    """
+    radius = horizon_radius(arrays['height'])
+    x, y = arrays['x'], arrays['y']
+    with stage('spatial_index'):
+        i, j = candidate_pairs(x, y, radius * 1000)  # Координаты в метрах, радиус в км
+    with stage('distance'):
+        distance = np.sqrt((x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2) / 1000  # в км
+        visible = distance <= radius[i] + radius[j]
+        i_visible, j_visible, distance = i[visible], j[visible], distance[visible]
+    count('pairs_candidates', i.size)
+    count('pairs_pruned', i.size - i_visible.size)  # Отброшены проверкой прямой видимости
+    return i_visible, j_visible, distance
+
+
+def emd_pairs(arrays, src, dst, distance, frequency, required_snr, weather_loss=0.0, with_noise=True,
+              obstruction=None):
+    """
+    Рассчитывает ЭМД для заданного набора направленных пар (передатчик src, приемник dst).
+    :param arrays: Словарь массивов объектов (см. objects_to_arrays)
+    :param src: Индексы передающих объектов
+    :param dst: Индексы приемных объектов
+    :param distance: Расстояния между объектами пар (км)
+    :param frequency: Частота сигнала (МГц); может быть массивом-столбцом (S, 1) для серии сценариев
+    :param required_snr: Требуемый SNR (дБ); скаляр или столбец (S, 1)
+    :param weather_loss: Потери из-за погоды (%); скаляр или столбец (S, 1)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :param obstruction: Параметры препятствия рельефа для пар (terrain.Terrain.obstruction) или None -
+                        без учета рельефа; потери дифракции добавляются к затуханию
+    :return: Массив вероятностей ЭМД формы (P,) или (S, P)
+    """
+    with stage('path_loss_snr'):
+        loss = path_loss(frequency, distance)
+        if obstruction is not None:
+            loss = loss + diffraction_loss(obstruction, frequency)
+        noise = arrays['noise_power'][src] if with_noise else 0.0
+        with np.errstate(invalid='ignore'):
+            snr = signal_to_noise(arrays['power'][src], arrays['gain'][src], arrays['gain'][dst],
+                                  loss, noise, weather_loss)
+    with stage('norm_cdf'):
+        emd = np.asarray(emd_probability(snr, required_snr), dtype=float)
+    emd[..., distance == 0] = 1.0  # Совпадающие объекты: затухание стремится к -inf
+    count('pairs_evaluated', emd.size)
+    return emd
+
+
+def emd_pairs_blocked(arrays, src, dst, distance, frequency, required_snr, weather_loss=0.0, with_noise=True,
+                      progress=None, obstruction=None):
+    """
+    То же, что emd_pairs, но по частям: ограничивает временные массивы и после каждой части
+    сообщает о ходе расчета. Через progress расчет можно прервать, выбросив из него исключение.
+    :param progress: Функция progress(done, total) или None
+    :return: Массив вероятностей ЭМД формы (P,) или (S, P)
+    """
+    size = src.size
+    scenarios = np.broadcast(np.asarray(frequency), np.asarray(required_snr), np.asarray(weather_loss)).size
+    step = max(1, PAIRS_BLOCK // scenarios)
+    emd = None
+    for start in range(0, max(size, 1), step):
+        stop = min(start + step, size)
+        part = emd_pairs(arrays, src[start:stop], dst[start:stop], distance[start:stop],
+                         frequency, required_snr, weather_loss, with_noise,
+                         None if obstruction is None else obstruction[start:stop])
+        if emd is None:
+            emd = np.empty(part.shape[:-1] + (size,))
+        emd[..., start:stop] = part
+        if progress is not None:
+            progress(stop, size)
+    return emd
+
+
+def emd_block(arrays, rows, cols, frequency, required_snr, weather_loss=0.0, with_noise=True):
+    """
+    Рассчитывает блок матрицы ЭМД для пар (передатчик rows[i], приемник cols[j]).
+    Пары вне прямой радиовидимости и диагональ (i == j) получают 0.
+    :param arrays: Словарь массивов объектов (см. objects_to_arrays)
+    :param rows: Индексы передающих объектов
+    :param cols: Индексы приемных объектов
+    :param frequency: Частота сигнала (МГц)
+    :param required_snr: Требуемый SNR (дБ)
+    :param weather_loss: Потери из-за погоды (%)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :return: Блок матрицы ЭМД размером len(rows) x len(cols)
+    """
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+    x, y, height = arrays['x'], arrays['y'], arrays['height']
+
+    with stage('distance'):
+        dx = x[rows, None] - x[None, cols]
+        dy = y[rows, None] - y[None, cols]
+        distance = np.sqrt(dx ** 2 + dy ** 2) / 1000  # в км
+        visibility = horizon_radius(height[rows])[:, None] + horizon_radius(height[cols])[None, :]
+        visible = (distance <= visibility) & (rows[:, None] != cols[None, :])
+
+    block = np.zeros(distance.shape)
+    i, j = np.nonzero(visible)
+    count('pairs_candidates', distance.size)
+    count('pairs_pruned', distance.size - i.size)
+    if i.size == 0:
+        return block
+
+    block[i, j] = emd_pairs(arrays, rows[i], cols[j], distance[i, j],
+                            frequency, required_snr, weather_loss, with_noise)
+    return block
+
+
+def emd_links(objects, frequency, required_snr, weather_loss=0.0, with_noise=True, progress=None, terrain=None):
+    """
+    Рассчитывает разреженную матрицу ЭМД; расчет ведется только для пар в зоне видимости.
+    :param objects: Список объектов с их параметрами
+    :param frequency: Частота сигнала (МГц)
+    :param required_snr: Требуемый SNR (дБ)
+    :param weather_loss: Потери из-за погоды (%)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :param progress: Функция progress(done, total) для отчета о ходе расчета (см. emd_pairs_blocked)
+    :param terrain: Рельеф (terrain.Terrain) или None - расчет для гладкой Земли
+    :return: LinkMatrix n x n (без округления)
+    """
+    arrays = objects_to_arrays(objects)
+    i, j, distance = visible_pairs(arrays)
+    obstruction = None
+    if terrain is not None:
+        obstruction = np.tile(terrain.obstruction(arrays, i, j, distance), 2)
+    # Видимость симметрична, а ЭМД - нет: считаем оба направления
+    src = np.concatenate((i, j))
+    dst = np.concatenate((j, i))
+    emd = emd_pairs_blocked(arrays, src, dst, np.concatenate((distance, distance)),
+                            frequency, required_snr, weather_loss, with_noise, progress, obstruction)
+    return LinkMatrix.from_pairs(len(objects), src, dst, emd)
+
+
+def _tile_bounds(arrays, index, radius):
+    """Границы тайла: (xmin, xmax, ymin, ymax) в метрах и максимальный радиус горизонта (км)."""
+    x, y = arrays['x'][index], arrays['y'][index]
+    return x.min(), x.max(), y.min(), y.max(), radius[index].max()
+
+
+def _tiles_may_link(bounds_a, bounds_b):
+    """Проверяет, может ли хотя бы одна пара из двух тайлов оказаться в зоне видимости."""
+    ax0, ax1, ay0, ay1, ar = bounds_a
+    bx0, bx1, by0, by1, br = bounds_b
+    gap_x = max(0.0, bx0 - ax1, ax0 - bx1)
+    gap_y = max(0.0, by0 - ay1, ay0 - by1)
+    return np.sqrt(gap_x ** 2 + gap_y ** 2) / 1000 <= ar + br
+
+
+def emd_matrix_tiled(objects, path, frequency, required_snr, weather_loss=0.0, with_noise=True,
+                     tile_size=DEFAULT_TILE_SIZE, decimals=None, progress=None):
+    """
+    Рассчитывает матрицу ЭМД по тайлам и записывает ее в отображаемый в память файл .npy.
+    Пиковое потребление памяти определяется размером тайла, а не n^2.
+    Тайлы, которые заведомо не содержат пар в зоне видимости, пропускаются (в файле остаются нули).
+    :param objects: Список объектов с их параметрами
+    :param path: Путь к файлу .npy для результата
+    :param frequency: Частота сигнала (МГц)
+    :param required_snr: Требуемый SNR (дБ)
+    :param weather_loss: Потери из-за погоды (%)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :param tile_size: Размер стороны тайла (число объектов)
+    :param decimals: Число знаков для округления значений (None - без округления)
+    :param progress: Функция progress(done, total), вызывается после каждой полосы тайлов
+    :return: Матрица ЭМД, открытая через np.memmap только для чтения
+    """
+    arrays = objects_to_arrays(objects)
+    n = len(objects)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(n, n))
+    bounds = tile_bounds(arrays, tile_size)
+    for row_tile in range(len(bounds)):
+        fill_row_tile(matrix, arrays, bounds, row_tile, tile_size,
+                      frequency, required_snr, weather_loss, with_noise, decimals)
+        if progress is not None:
+            progress(row_tile + 1, len(bounds))
+    del matrix
+    return load_matrix(path)
+
+
+def tile_bounds(arrays, tile_size):
+    """
+    Рассчитывает границы всех тайлов по индексам объектов.
+    :return: Список границ (см. _tile_bounds) для каждого тайла
+    """
+    n = arrays['x'].size
+    radius = horizon_radius(arrays['height'])
+    return [_tile_bounds(arrays, slice(start, start + tile_size), radius) for start in range(0, n, tile_size)]
+
+
+def fill_row_tile(matrix, arrays, bounds, row_tile, tile_size, frequency, required_snr,
+                  weather_loss=0.0, with_noise=True, decimals=None):
+    """
+    Рассчитывает одну полосу тайлов (строки row_tile) и записывает ее в матрицу на диске.
+    :param matrix: Матрица n x n (np.memmap), в которую пишется результат
+    :param arrays: Словарь массивов объектов
+    :param bounds: Границы тайлов (см. tile_bounds)
+    :param row_tile: Номер полосы тайлов
+    :param tile_size: Размер стороны тайла
+    """
+    n = arrays['x'].size
+    row_start = row_tile * tile_size
+    rows = np.arange(row_start, min(row_start + tile_size, n))
+    for col_tile, col_bounds in enumerate(bounds):
+        if not _tiles_may_link(bounds[row_tile], col_bounds):
+            continue
+        col_start = col_tile * tile_size
+        cols = np.arange(col_start, min(col_start + tile_size, n))
+        block = emd_block(arrays, rows, cols, frequency, required_snr, weather_loss, with_noise)
+        if decimals is not None:
+            block = np.round(block, decimals)
+        matrix[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = block
+    matrix.flush()  # Готовые строки сбрасываем на диск, чтобы не копить грязные страницы
+
+
+def load_matrix(path):
+    """
+    Открывает сохраненную матрицу .npy без загрузки в память.
+    :param path: Путь к файлу .npy
+    :return: np.memmap только для чтения
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def emd_matrix(objects, frequency, required_snr, weather_loss=0.0, with_noise=True):
+    """
+    Рассчитывает полную плотную матрицу ЭМД (см. emd_links).
+    :return: Матрица ЭМД n x n (без округления)
+    """
+    return emd_links(objects, frequency, required_snr, weather_loss, with_noise).toarray()
+
+
+def graph_edges(objects, frequency, required_snr, weather_loss=0.0, with_noise=True, threshold=EDGE_THRESHOLD,
+                progress=None, terrain=None):
+    """
+    Рассчитывает рёбра графа ЭМД (пары i < j, передатчик i) с вероятностью выше порога.
+    :param objects: Список объектов с их параметрами
+    :param frequency: Частота сигнала (МГц)
+    :param required_snr: Требуемый SNR (дБ)
+    :param weather_loss: Потери из-за погоды (%)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :param threshold: Порог ЭМД для добавления ребра
+    :param progress: Функция progress(done, total) для отчета о ходе расчета (см. emd_pairs_blocked)
+    :param terrain: Рельеф (terrain.Terrain) или None - расчет для гладкой Земли
+    :return: Кортеж массивов (i, j, emd)
+    """
+    arrays = objects_to_arrays(objects)
+    i, j, distance = visible_pairs(arrays)
+    obstruction = terrain.obstruction(arrays, i, j, distance) if terrain is not None else None
+    emd = emd_pairs_blocked(arrays, i, j, distance, frequency, required_snr, weather_loss, with_noise, progress,
+                            obstruction)
+    keep = emd > threshold
+    return i[keep], j[keep], emd[keep]
+
+
+def sweep_scenarios(frequencies, required_snrs, weather_losses):
+    """
+    Формирует все сочетания параметров серии расчетов.
+    :return: Список кортежей (частота, требуемый SNR, потери из-за погоды)
+    """
+    return list(itertools.product(frequencies, required_snrs, weather_losses))
+
+
+def directed_pairs(arrays):
+    """
+    Направленные пары объектов в зоне видимости (оба направления), упорядоченные по (строка, столбец)
+    как связи CSR. Геометрию можно рассчитать один раз и использовать для любого числа сценариев.
+    :param arrays: Словарь массивов объектов (см. objects_to_arrays)
+    :return: Кортеж массивов (src, dst, distance)
+    """
+    i, j, distance = visible_pairs(arrays)
+    src = np.concatenate((i, j))
+    dst = np.concatenate((j, i))
+    distance = np.concatenate((distance, distance))
+    order = np.lexsort((dst, src))
+    return src[order], dst[order], distance[order]
+
+
+def scenario_links(arrays, src, dst, distance, scenarios, with_noise=True, progress=None, obstruction=None):
+    """
+    Рассчитывает матрицы ЭМД для списка сценариев по готовой геометрии за один векторный проход.
+    :param arrays: Словарь массивов объектов (см. objects_to_arrays)
+    :param src: Индексы передатчиков (см. directed_pairs)
+    :param dst: Индексы приемников
+    :param distance: Расстояния (км)
+    :param scenarios: Список кортежей (частота, требуемый SNR, потери из-за погоды)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :param progress: Функция progress(done, total) для отчета о ходе расчета (см. emd_pairs_blocked)
+    :param obstruction: Параметры препятствия рельефа для пар (terrain.Terrain.directed_obstruction) или None
+    :return: Список LinkMatrix с общей структурой связей
+    """
+    if not len(scenarios):
+        return []
+    n = arrays['x'].size
+    params = np.array(scenarios, dtype=float).reshape(-1, 3)
+    frequency, required_snr, weather_loss = (params[:, [k]] for k in range(3))
+    values = emd_pairs_blocked(arrays, src, dst, distance, frequency, required_snr, weather_loss, with_noise,
+                               progress, obstruction)
+    indptr = csr_indptr(n, src)
+    return [LinkMatrix(n, indptr, dst, row) for row in values]
+
+
+def iter_scenario_links(arrays, src, dst, distance, scenarios, with_noise=True, obstruction=None):
+    """
+    Генератор матриц ЭМД для последовательности сценариев (например, временных шагов) по готовой геометрии.
+    Сценарии считаются векторно группами, объем которых ограничен SCENARIO_ELEMENTS, поэтому
+    последовательность может быть сколь угодно длинной (в том числе генератором).
+    :param scenarios: Итерируемая последовательность кортежей (частота, требуемый SNR, потери из-за погоды)
+    :return: Генератор пар (сценарий, LinkMatrix)
+    """
+    size = max(1, SCENARIO_ELEMENTS // max(src.size, 1))
+    iterator = iter(scenarios)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield from zip(batch, scenario_links(arrays, src, dst, distance, batch, with_noise, obstruction=obstruction))
+
+
+def emd_sweep(objects, frequencies, required_snrs, weather_losses, with_noise=True, progress=None):
+    """
+    Рассчитывает серию матриц ЭМД для всех сочетаний параметров за один векторный проход.
+    Пары в зоне видимости и расстояния находятся один раз. Затухание считается по блокам пар
+    emd_pairs_blocked: 20*log10(d) пары вычисляется в своем блоке один раз для всех сценариев.
+    :param objects: Список объектов с их параметрами
+    :param frequencies: Список частот (МГц)
+    :param required_snrs: Список требуемых SNR (дБ)
+    :param weather_losses: Список потерь из-за погоды (%)
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :param progress: Функция progress(done, total) для отчета о ходе расчета (см. emd_pairs_blocked)
+    :return: Кортеж (список сценариев, список LinkMatrix с общей структурой связей)
+    """
+    scenarios = sweep_scenarios(frequencies, required_snrs, weather_losses)
+    if not scenarios:
+        return scenarios, []
+    arrays = objects_to_arrays(objects)
+    src, dst, distance = directed_pairs(arrays)
+    return scenarios, scenario_links(arrays, src, dst, distance, scenarios, with_noise, progress)
+
+
+def emd_sweep_tensor(objects, frequencies, required_snrs, weather_losses, with_noise=True):
+    """
+    Серия матриц ЭМД в виде плотного тензора (см. emd_sweep).
+    :return: Кортеж (список сценариев, массив формы сценарии x n x n)
+    """
+    scenarios, matrices = emd_sweep(objects, frequencies, required_snrs, weather_losses, with_noise)
+    tensor = np.zeros((len(scenarios), len(objects), len(objects)))
+    for k, matrix in enumerate(matrices):
+        rows, cols, values = matrix.to_coo()
+        tensor[k, rows, cols] = values
+    return scenarios, tensor
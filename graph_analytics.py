@@ -0,0 +1,278 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra, maximum_flow
+from instrumentation import stage
+
+# Минимальный вес ребра. При ЭМД = 1 вес -log(ЭМД) равен нулю; с минимальным весом из равнонадежных
+# путей выбирается путь с меньшим числом ретрансляций, а ребро не теряется как явный ноль матрицы
+HOP_WEIGHT = 1e-9
+BETWEENNESS_SAMPLES = 64  # Число опорных вершин для оценки посредничества на больших графах
+PIVOTS_BLOCK = 16  # Сколько опорных вершин обрабатывать за один вызов dijkstra (память k x n)
+
+
+class EmdGraph:
+    """
+    Неориентированный граф ЭМД в разреженном виде (CSR scipy) для анализа сети ретрансляции.
+    Вес ребра -log(ЭМД): кратчайший путь по сумме весов - путь с наибольшим произведением ЭМД,
+    то есть самый надежный путь ретрансляции. Не требует NetworkX.
+    """
+
+    def __init__(self, size, i, j, emd):
+        """
+        :param size: Число объектов n (вершины 0..n-1)
+        :param i: Первые вершины рёбер (пары i < j, как в emd_engine.graph_edges)
+        :param j: Вторые вершины рёбер
+        :param emd: ЭМД рёбер
+        """
+        self.size = size
+        i, j = np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp)
+        i, j = np.minimum(i, j), np.maximum(i, j)
+        order = np.lexsort((j, i))  # Рёбра упорядочены по (i, j) для поиска ЭМД ребра
+        self.i, self.j = i[order], j[order]
+        self.emd = np.asarray(emd, dtype=float)[order]
+        weight = np.maximum(-np.log(self.emd), HOP_WEIGHT)
+        with stage('csgraph_build'):
+            # Каждое ребро хранится в обоих направлениях: симметричную матрицу алгоритмы обходят
+            # как ориентированный граф, это быстрее обработки directed=False
+            self.matrix = csr_matrix((np.concatenate((weight, weight)),
+                                      (np.concatenate((self.i, self.j)), np.concatenate((self.j, self.i)))),
+                                     shape=(size, size))
+
+    @classmethod
+    def from_links(cls, matrix, threshold):
+        """
+        :param matrix: Матрица ЭМД (LinkMatrix)
+        :param threshold: Порог ЭМД для рёбер графа
+        :return: EmdGraph
+        """
+        return cls(len(matrix), *matrix.edges(threshold))
+
+    @classmethod
+    def from_networkx(cls, G, size=None):
+        """
+        :param G: Граф (NetworkX) с весами рёбер 1 - ЭМД, как строит build_graph
+        :param size: Число объектов (по умолчанию - наибольший номер вершины + 1)
+        :return: EmdGraph
+        """
+        edges = np.array([(u, v, w) for u, v, w in G.edges(data='weight')], dtype=float).reshape(-1, 3)
+        if size is None:
+            size = max(G.nodes(), default=-1) + 1
+        return cls(size, edges[:, 0].astype(np.intp), edges[:, 1].astype(np.intp), 1 - edges[:, 2])
+
+    def __len__(self):
+        return self.size
+
+    def number_of_edges(self):
+        return self.i.size
+
+    def degree(self):
+        """
+        :return: Массив степеней вершин
+        """
+        return np.diff(self.matrix.indptr)
+
+    def nodes(self):
+        """
+        Вершины, у которых есть хотя бы одно ребро (как в графе NetworkX из build_graph).
+        :return: Массив номеров вершин
+        """
+        return np.flatnonzero(self.degree())
+
+    def most_reliable_path(self, source, target):
+        """
+        Самый надежный путь ретрансляции: максимум произведения ЭМД рёбер пути.
+        :param source: Начальная вершина
+        :param target: Конечная вершина
+        :return: Кортеж (список вершин пути, надежность пути); ([], 0.0), если пути нет
+        """
+        with stage('reliable_path'):
+            distance, predecessors = dijkstra(self.matrix, indices=source,
+                                              return_predecessors=True)
+        if not np.isfinite(distance[target]):
+            return [], 0.0
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessors[path[-1]]))
+        path.reverse()
+        return path, float(np.prod(self.path_emd(path)))
+
+    def path_emd(self, path):
+        """
+        :param path: Список вершин пути
+        :return: Массив ЭМД рёбер пути
+        """
+        return np.array([self._edge_emd(a, b) for a, b in zip(path[:-1], path[1:])])
+
+    def _edge_emd(self, a, b):
+        lo, hi = min(a, b), max(a, b)
+        start, stop = np.searchsorted(self.i, lo), np.searchsorted(self.i, lo, side='right')
+        return float(self.emd[start + np.searchsorted(self.j[start:stop], hi)])
+
+    def reliability_from(self, source):
+        """
+        Надежность самого надежного пути от source до каждой вершины.
+        :param source: Начальная вершина
+        :return: Массив длины n (0 для недостижимых вершин)
+        """
+        with stage('reliable_path'):
+            distance = dijkstra(self.matrix, indices=source)
+        return np.exp(-distance)
+
+    def components(self):
+        """
+        Компоненты связности.
+        :return: Кортеж (число компонент, номер компоненты каждой вершины)
+        """
+        with stage('components'):
+            return connected_components(self.matrix, directed=False)
+
+    def articulation_points(self):
+        """
+        Точки сочленения: вершины, при отказе которых сеть распадается на большее число компонент.
+        Граф 2-связен, если он связен и точек сочленения нет.
+        :return: Отсортированный массив номеров вершин
+        """
+        with stage('articulation_points'):
+            return _articulation_points(self.size, self.matrix.indptr.tolist(), self.matrix.indices.tolist())
+
+    def node_connectivity(self, source, target):
+        """
+        Локальная вершинная связность: сколько вершин (ретрансляторов) нужно вывести из строя,
+        чтобы разорвать связь source и target; равна числу путей без общих промежуточных вершин.
+        Для соседних вершин прямое ребро считается одним из путей.
+        :return: Целое число
+        """
+        if source == target:
+            raise ValueError("начальная и конечная вершины совпадают")
+        # Каждая вершина v делится на вход v и выход v + n с пропускной способностью 1 между ними,
+        # ребро u-v превращается в дуги выход u -> вход v и выход v -> вход u
+        n = self.size
+        nodes = np.arange(n)
+        rows = np.concatenate((nodes, self.i + n, self.j + n))
+        cols = np.concatenate((nodes + n, self.j, self.i))
+        network = csr_matrix((np.ones(rows.size, dtype=np.int32), (rows, cols)), shape=(2 * n, 2 * n))
+        with stage('max_flow'):
+            # Поток идет от выхода source ко входу target, поэтому концы пути не ограничены
+            return int(maximum_flow(network, source + n, target).flow_value)
+
+    def edge_connectivity(self, source, target):
+        """
+        Локальная реберная связность: сколько связей нужно потерять, чтобы разорвать связь
+        source и target; равна числу путей без общих рёбер.
+        :return: Целое число
+        """
+        if source == target:
+            raise ValueError("начальная и конечная вершины совпадают")
+        network = csr_matrix((np.ones(2 * self.i.size, dtype=np.int32),
+                              (np.concatenate((self.i, self.j)), np.concatenate((self.j, self.i)))),
+                             shape=self.matrix.shape)
+        with stage('max_flow'):
+            return int(maximum_flow(network, source, target).flow_value)
+
+    def betweenness(self, samples=BETWEENNESS_SAMPLES, normalized=True, seed=None):
+        """
+        Посредничество вершин по самым надежным путям (алгоритм Брандеса).
+        Если samples меньше числа вершин, оценка строится по случайным опорным вершинам,
+        как betweenness_centrality(k=...) в NetworkX; равнонадежные пути не делятся между собой,
+        учитывается один из них.
+        :param samples: Число опорных вершин (None - все вершины, точный расчет)
+        :param normalized: Нормировать на (n - 1)(n - 2), как NetworkX
+        :param seed: Начальное значение генератора случайных чисел
+        :return: Массив длины n
+        """
+        n = self.size
+        if samples is None or samples >= n:
+            pivots = np.arange(n)
+        else:
+            pivots = np.random.default_rng(seed).choice(n, samples, replace=False)
+        result = np.zeros(n)
+        with stage('betweenness'):
+            for start in range(0, pivots.size, PIVOTS_BLOCK):
+                block = pivots[start:start + PIVOTS_BLOCK]
+                distance, predecessors = dijkstra(self.matrix, indices=block,
+                                                  return_predecessors=True)
+                result += _tree_dependencies(distance, predecessors).sum(axis=0)
+        if normalized:
+            scale = 1 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+        else:
+            scale = 0.5  # Каждый путь неориентированного графа учтен с обоих концов
+        return result * scale * (n / max(pivots.size, 1))
+
+
+def _tree_dependencies(distance, predecessors):
+    """
+    Накопление Брандеса по деревьям кратчайших путей: вклад вершины v для опорной вершины s
+    равен числу вершин, самый надежный путь к которым из s проходит через v.
+    Деревья всех опорных вершин обрабатываются вместе как один лес, по уровням от листьев к корню.
+    :param distance: Расстояния от опорных вершин (k x n)
+    :param predecessors: Предшественники в деревьях (k x n), -9999 для корня и недостижимых вершин
+    :return: Массив вкладов (k x n)
+    """
+    k, n = predecessors.shape
+    offset = (np.arange(k) * n)[:, None]
+    parent = np.where(predecessors >= 0, predecessors + offset, -1).ravel()
+    # Глубина вершины в дереве (число переходов до корня) удвоением указателей: за log(глубины) шагов
+    depth = (parent >= 0).astype(np.intp)
+    jump = parent.copy()
+    active = np.flatnonzero(jump >= 0)
+    while active.size:
+        depth[active] += depth[jump[active]]
+        jump[active] = jump[jump[active]]
+        active = active[jump[active] >= 0]
+
+    dependency = np.zeros(parent.size)
+    order = np.argsort(depth, kind='stable')[::-1]
+    bounds = np.flatnonzero(np.diff(depth[order])) + 1
+    for level in np.split(order, bounds):
+        level = level[parent[level] >= 0]
+        if level.size:
+            np.add.at(dependency, parent[level], 1 + dependency[level])
+    dependency[depth == 0] = 0  # Опорная вершина (корень) не посредник на путях из себя
+    return dependency.reshape(k, n)
+
+
+def _articulation_points(n, indptr, indices):
+    """
+    Поиск точек сочленения (алгоритм Тарьяна) без рекурсии: стек хранит вершину и позицию
+    в ее списке соседей.
+    :param n: Число вершин
+    :param indptr: Границы строк симметричной матрицы смежности (список)
+    :param indices: Соседи вершин (список)
+    :return: Отсортированный массив номеров вершин
+    """
+    order = [-1] * n  # Время входа в вершину
+    low = [0] * n
+    parent = [-1] * n
+    children = [0] * n
+    is_point = [False] * n
+    timer = 0
+    for root in range(n):
+        if order[root] >= 0 or indptr[root] == indptr[root + 1]:
+            continue
+        order[root] = low[root] = timer
+        timer += 1
+        stack = [(root, indptr[root])]
+        while stack:
+            v, pos = stack[-1]
+            if pos < indptr[v + 1]:
+                stack[-1] = (v, pos + 1)
+                u = indices[pos]
+                if order[u] < 0:
+                    parent[u] = v
+                    children[v] += 1
+                    order[u] = low[u] = timer
+                    timer += 1
+                    stack.append((u, indptr[u]))
+                elif u != parent[v] and order[u] < low[v]:
+                    low[v] = order[u]
+            else:
+                stack.pop()
+                p = parent[v]
+                if p >= 0:
+                    if low[v] < low[p]:
+                        low[p] = low[v]
+                    if parent[p] >= 0 and low[v] >= order[p]:
+                        is_point[p] = True
+        if children[root] > 1:
+            is_point[root] = True
+    return np.flatnonzero(is_point)
@@ -0,0 +1,154 @@
+import sys
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
+from emd_engine import objects_to_arrays
+from instrumentation import stage, count
+
+MAX_LABELS = 200  # Подписи рёбер и вершин выводятся, только если их в видимой области не больше
+EMD_CMAP = 'RdYlGn'  # Красный - низкая ЭМД, зеленый - высокая
+DENSE_EDGES = 20000  # При большем числе рёбер линии рисуются тоньше и без сглаживания
+MAX_EDGES = DENSE_EDGES  # Для плотного графа рисуется не больше стольких рёбер видимой области
+
+
+class GraphPlot:
+    """
+    Постоянное изображение графа ЭМД на осях matplotlib, обновляемое на месте.
+    Все рёбра рисуются одной коллекцией линий с цветом по ЭМД, вершины - одним scatter.
+    Подписи (уровень детализации) создаются только для видимой области и только когда
+    их число не превышает max_labels - при приближении подписи появляются.
+    Для плотного графа (больше DENSE_EDGES рёбер) так же прореживаются и рёбра: рисуются только
+    рёбра, пересекающие видимую область, и из них не больше max_edges с наибольшей ЭМД.
+    """
+
+    def __init__(self, ax, max_labels=MAX_LABELS, max_edges=MAX_EDGES):
+        """
+        :param ax: Оси matplotlib
+        :param max_labels: Максимальное число подписей рёбер (и вершин) в видимой области
+        :param max_edges: Максимальное число рисуемых рёбер плотного графа
+        """
+        self.ax = ax
+        self.max_labels = max_labels
+        self.max_edges = max_edges
+        self.edges = LineCollection([], cmap=EMD_CMAP, norm=Normalize(0, 1), linewidths=1.5, zorder=1)
+        ax.add_collection(self.edges)
+        self.nodes = ax.scatter([], [], s=200, c='skyblue', edgecolors='steelblue', zorder=2)
+        self._xy = np.empty((0, 2))
+        self._node_ids = np.empty(0, dtype=np.intp)
+        self._midpoints = np.empty((0, 2))
+        self._emd = np.empty(0)
+        self._segments = np.empty((0, 2, 2))
+        self._by_emd = None  # Порядок рёбер по убыванию ЭМД (только для плотного графа)
+        self._bounds = None  # Границы рёбер (x min, x max, y min, y max) в порядке _by_emd
+        self._labels = []
+        self._updating = False
+        ax.callbacks.connect('xlim_changed', self._on_limits)
+        ax.callbacks.connect('ylim_changed', self._on_limits)
+
+    def update(self, G, objects):
+        """
+        Заменяет данные графа, не создавая новых фигур и коллекций.
+        :param G: Граф (NetworkX) с весами рёбер 1 - ЭМД или разреженный граф (graph_analytics.EmdGraph)
+        :param objects: Объекты (координаты вершин)
+        """
+        arrays = objects_to_arrays(objects)
+        xy = np.column_stack((arrays['x'], arrays['y']))
+        edges, emd, self._node_ids = _graph_arrays(G)
+
+        segments = xy[edges]
+        dense = len(edges) > DENSE_EDGES
+        self.edges.set_linewidth(0.5 if dense else 1.5)
+        self.edges.set_antialiased(not dense)
+        self.edges.set_rasterized(dense)
+        self._segments = segments
+        if dense:
+            self._by_emd = np.argsort(-emd, kind='stable')
+            ordered = segments[self._by_emd]
+            self._bounds = (ordered[:, :, 0].min(axis=1), ordered[:, :, 0].max(axis=1),
+                            ordered[:, :, 1].min(axis=1), ordered[:, :, 1].max(axis=1))
+        else:
+            self._by_emd = self._bounds = None
+            self.edges.set_segments(segments)
+            self.edges.set_array(emd)
+            count('edges_drawn', len(edges))
+        self.nodes.set_offsets(xy[self._node_ids] if self._node_ids.size else np.empty((0, 2)))
+        self._xy = xy
+        self._midpoints = segments.mean(axis=1) if len(edges) else np.empty((0, 2))
+        self._emd = emd
+
+        self._updating = True
+        points = xy[self._node_ids] if self._node_ids.size else xy
+        if len(points):
+            low, high = points.min(axis=0), points.max(axis=0)
+            margin = np.maximum((high - low) * 0.05, 1.0)
+            self.ax.set_xlim(low[0] - margin[0], high[0] + margin[0])
+            self.ax.set_ylim(low[1] - margin[1], high[1] + margin[1])
+        self._updating = False
+        self.update_edges()
+        self.update_labels()
+
+    def _on_limits(self, ax):
+        if not self._updating:
+            self.update_edges()
+            self.update_labels()
+
+    def update_edges(self):
+        """Для плотного графа оставляет в коллекции только рёбра видимой области (не больше max_edges)."""
+        if self._by_emd is None:
+            return
+        with stage('graph_edges_lod'):
+            (x0, x1), (y0, y1) = sorted(self.ax.get_xlim()), sorted(self.ax.get_ylim())
+            xmin, xmax, ymin, ymax = self._bounds
+            # Пересечение прямоугольников ребра и области: ребро, проходящее через угол области
+            # мимо нее, тоже рисуется, но отбрасывается почти все невидимое
+            visible = (xmax >= x0) & (xmin <= x1) & (ymax >= y0) & (ymin <= y1)
+            shown = self._by_emd[np.flatnonzero(visible)[:self.max_edges]]
+            self.edges.set_segments(self._segments[shown])
+            self.edges.set_array(self._emd[shown])
+        count('edges_drawn', shown.size)
+
+    def update_labels(self):
+        """Пересоздает подписи для видимой области с учетом уровня детализации."""
+        with stage('graph_labels'):
+            self._update_labels()
+        count('labels_drawn', len(self._labels))
+
+    def _update_labels(self):
+        for label in self._labels:
+            label.remove()
+        self._labels = []
+        (x0, x1), (y0, y1) = sorted(self.ax.get_xlim()), sorted(self.ax.get_ylim())
+
+        def in_view(points):
+            return (points[:, 0] >= x0) & (points[:, 0] <= x1) & (points[:, 1] >= y0) & (points[:, 1] <= y1)
+
+        visible_edges = np.flatnonzero(in_view(self._midpoints))
+        if visible_edges.size <= self.max_labels:
+            for k in visible_edges.tolist():
+                x, y = self._midpoints[k]
+                self._labels.append(self.ax.text(x, y, f"ЭМД: {self._emd[k]:.2f}", horizontalalignment='center',
+                                                 verticalalignment='center', fontsize=8, zorder=3,
+                                                 bbox=dict(facecolor='white', edgecolor='none',
+                                                           boxstyle="round,pad=0.3")))
+
+        node_xy = self._xy[self._node_ids] if self._node_ids.size else np.empty((0, 2))
+        visible_nodes = np.flatnonzero(in_view(node_xy))
+        if visible_nodes.size <= self.max_labels:
+            for k in visible_nodes.tolist():
+                x, y = node_xy[k]
+                self._labels.append(self.ax.text(x, y, str(self._node_ids[k]), horizontalalignment='center',
+                                                 verticalalignment='center', fontsize=9, zorder=4))
+
+
+def _graph_arrays(G):
+    """
+    :param G: Граф NetworkX или EmdGraph
+    :return: Кортеж (рёбра n x 2, ЭМД рёбер, номера вершин)
+    """
+    # graph_analytics (и scipy) не импортируется ради проверки: если модуль не загружен, G - граф NetworkX
+    analytics = sys.modules.get('graph_analytics')
+    if analytics is not None and isinstance(G, analytics.EmdGraph):
+        return np.column_stack((G.i, G.j)), G.emd, G.nodes()
+    edges = np.array([(u, v) for u, v in G.edges()], dtype=np.intp).reshape(-1, 2)
+    emd = 1 - np.fromiter((w for _, _, w in G.edges(data='weight')), dtype=float, count=len(edges))
+    return edges, emd, np.fromiter(G.nodes(), dtype=np.intp, count=G.number_of_nodes())
@@ -0,0 +1,258 @@
+import numpy as np
+from emd_engine import (objects_to_arrays, horizon_radius, visible_pairs, emd_pairs, emd_pairs_blocked,
+                        EDGE_THRESHOLD, OBJECT_FIELDS)
+from link_matrix import LinkMatrix, csr_indptr
+from instrumentation import stage, count
+
+BLOCK_ELEMENTS = 4_000_000  # Сколько расстояний (изменившиеся объекты x все объекты) считать за раз
+FULL_REBUILD_SHARE = 4  # Если изменилась 1/4 объектов и больше, выгоднее пересчитать всё
+
+
+class LinkCache:
+    """
+    Кэш геометрии пар и последних результатов расчета ЭМД.
+    Хранит направленные пары объектов в зоне видимости, упорядоченные как строки CSR,
+    с расстояниями и значениями ЭМД для последних параметров связи. При добавлении,
+    изменении или удалении объектов пересчитываются только строка и столбец затронутых
+    объектов, а новые связи вклеиваются в уже упорядоченные массивы без полной сортировки.
+    """
+
+    def __init__(self, with_noise=True):
+        """
+        :param with_noise: Учитывать ли мощность помехи передающего объекта
+        """
+        self.with_noise = with_noise
+        self.arrays = objects_to_arrays([])
+        self.src = np.empty(0, dtype=np.intp)
+        self.dst = np.empty(0, dtype=np.intp)
+        self.distance = np.empty(0)
+        self.params = None  # (частота, требуемый SNR, потери из-за погоды), для которых рассчитан emd
+        self.emd = np.empty(0)
+        self._graph = None
+        self._graph_key = None
+        self._graph_dirty = None  # Объекты, рёбра которых в графе устарели (None - граф строится заново)
+
+    def __len__(self):
+        return self.arrays['x'].size
+
+    def sync(self, objects):
+        """
+        Приводит кэш в соответствие со списком объектов.
+        Объекты сравниваются по значениям: изменившиеся и новые пересчитываются инкрементно,
+        при уменьшении списка кэш строится заново (для удаления по индексу есть remove).
+        :param objects: Список объектов с их параметрами
+        """
+        # Копия нужна, так как столбцы ObjectStore изменяются на месте
+        arrays = {field: np.array(values) for field, values in objects_to_arrays(objects).items()}
+        n_old, n = len(self), len(objects)
+        if n < n_old:
+            self._rebuild(arrays)
+            return
+        differs = np.zeros(n_old, dtype=bool)
+        for field in OBJECT_FIELDS:
+            differs |= arrays[field][:n_old] != self.arrays[field]
+        changed = np.concatenate((np.flatnonzero(differs), np.arange(n_old, n)))
+        if changed.size:
+            self._update(arrays, changed)
+
+    def append(self, objects):
+        """
+        Добавляет новые объекты в конец набора.
+        :param objects: Список новых объектов
+        """
+        new = objects_to_arrays(objects)
+        n_old = len(self)
+        arrays = {field: np.concatenate((self.arrays[field], new[field])) for field in OBJECT_FIELDS}
+        self._update(arrays, np.arange(n_old, n_old + len(objects)))
+
+    def update(self, index, obj):
+        """
+        Изменяет параметры одного объекта.
+        :param index: Номер объекта
+        :param obj: Новые параметры объекта
+        """
+        arrays = {field: self.arrays[field].copy() for field in OBJECT_FIELDS}
+        for field in OBJECT_FIELDS:
+            arrays[field][index] = obj.get(field, 0.0)
+        self._update(arrays, np.array([index]))
+
+    def move(self, indices, x, y):
+        """
+        Перемещает объекты; пересчитываются только их строки и столбцы.
+        :param indices: Номера перемещаемых объектов
+        :param x: Новые координаты x (м) для indices
+        :param y: Новые координаты y (м) для indices
+        """
+        indices, first = np.unique(indices, return_index=True)
+        if indices.size == 0:
+            return
+        arrays = dict(self.arrays)
+        arrays['x'] = self.arrays['x'].copy()
+        arrays['y'] = self.arrays['y'].copy()
+        arrays['x'][indices] = np.asarray(x, dtype=float)[first]
+        arrays['y'][indices] = np.asarray(y, dtype=float)[first]
+        self._update(arrays, indices)
+
+    def remove(self, index):
+        """
+        Удаляет объект; номера следующих объектов уменьшаются на 1, как в списке объектов.
+        :param index: Номер удаляемого объекта
+        """
+        self._keep((self.src != index) & (self.dst != index))
+        # Сдвиг номеров не нарушает порядок строк CSR
+        self.src = self.src - (self.src > index)
+        self.dst = self.dst - (self.dst > index)
+        self.arrays = {field: np.delete(values, index) for field, values in self.arrays.items()}
+        self._graph_dirty = None  # Номера вершин сдвинулись
+
+    def links(self, frequency, required_snr, weather_loss=0.0, progress=None):
+        """
+        Матрица ЭМД для текущих объектов (см. emd_engine.emd_links).
+        :param progress: Функция progress(done, total) для отчета о ходе расчета
+        :return: LinkMatrix n x n (без округления)
+        """
+        self._ensure_emd(frequency, required_snr, weather_loss, progress)
+        return LinkMatrix(len(self), csr_indptr(len(self), self.src), self.dst, self.emd)
+
+    def edges(self, frequency, required_snr, weather_loss=0.0, threshold=EDGE_THRESHOLD, progress=None):
+        """
+        Рёбра графа ЭМД (пары i < j, передатчик i) выше порога (см. emd_engine.graph_edges).
+        :return: Кортеж массивов (i, j, emd), упорядоченный по (i, j)
+        """
+        self._ensure_emd(frequency, required_snr, weather_loss, progress)
+        keep = (self.src < self.dst) & (self.emd > threshold)
+        return self.src[keep], self.dst[keep], self.emd[keep]
+
+    def graph(self, frequency, required_snr, weather_loss=0.0, threshold=EDGE_THRESHOLD, progress=None):
+        """
+        Граф ЭМД (NetworkX), обновляемый на месте: при изменении объектов перестраиваются
+        только рёбра затронутых вершин.
+        :return: Граф (NetworkX) с весами рёбер 1 - ЭМД
+        """
+        import networkx as nx
+
+        key = (frequency, required_snr, weather_loss, threshold)
+        i, j, emd = self.edges(frequency, required_snr, weather_loss, threshold, progress)
+        if self._graph is None or self._graph_key != key or self._graph_dirty is None:
+            self._graph = nx.Graph()
+            with stage('networkx_edges'):
+                self._graph.add_weighted_edges_from(zip(i.tolist(), j.tolist(), (1 - emd).tolist()))
+            count('edges_added', i.size)
+        elif self._graph_dirty.size:
+            dirty = np.zeros(len(self), dtype=bool)
+            dirty[self._graph_dirty] = True
+            stale_edges = list(self._graph.edges(self._graph_dirty.tolist()))
+            self._graph.remove_edges_from(stale_edges)
+            touched = dirty[i] | dirty[j]
+            with stage('networkx_edges'):
+                self._graph.add_weighted_edges_from(zip(i[touched].tolist(), j[touched].tolist(),
+                                                        (1 - emd[touched]).tolist()))
+            count('edges_added', np.count_nonzero(touched))
+            # Как и при полном построении, вершины без рёбер в граф не входят
+            affected = {node for edge in stale_edges for node in edge}
+            self._graph.remove_nodes_from([node for node in affected if self._graph.degree(node) == 0])
+        self._graph_key = key
+        self._graph_dirty = np.empty(0, dtype=np.intp)
+        return self._graph
+
+    def _ensure_emd(self, frequency, required_snr, weather_loss, progress=None):
+        """
+        Пересчитывает ЭМД по кэшированной геометрии, если изменились параметры связи.
+        Параметры запоминаются только после расчета, поэтому прерванный через progress
+        расчет не оставляет кэш в несогласованном состоянии.
+        """
+        params = (frequency, required_snr, weather_loss)
+        if self.params != params:
+            self.emd = emd_pairs_blocked(self.arrays, self.src, self.dst, self.distance, frequency, required_snr,
+                                         weather_loss, self.with_noise, progress)
+            self.params = params
+
+    def _emd(self, src, dst, distance):
+        """ЭМД для направленных пар при текущих параметрах."""
+        frequency, required_snr, weather_loss = self.params
+        return emd_pairs(self.arrays, src, dst, distance, frequency, required_snr, weather_loss, self.with_noise)
+
+    def _keep(self, keep):
+        self.src, self.dst, self.distance = self.src[keep], self.dst[keep], self.distance[keep]
+        if self.params is not None:
+            self.emd = self.emd[keep]
+
+    def _rebuild(self, arrays):
+        """Полный пересчет геометрии; значения ЭМД будут рассчитаны при следующем запросе."""
+        self.arrays = arrays
+        i, j, distance = visible_pairs(arrays)
+        self.src, self.dst, self.distance = _directed_sorted(len(self), i, j, distance)
+        self.params = None
+        self._graph_dirty = None
+
+    def _update(self, arrays, changed):
+        """
+        Пересчитывает пары, в которых участвуют объекты changed, остальные берутся из кэша.
+        :param arrays: Новые массивы объектов
+        :param changed: Номера изменившихся или добавленных объектов
+        """
+        n = arrays['x'].size
+        count('objects_recomputed', changed.size)
+        if changed.size * FULL_REBUILD_SHARE >= n:
+            self._rebuild(arrays)
+            return
+
+        is_changed = np.zeros(n, dtype=bool)
+        is_changed[changed] = True
+        if changed.min() < len(self):
+            # Новые объекты в кэше еще не встречаются; устаревшие связи есть только у измененных
+            self._keep(~(is_changed[self.src] | is_changed[self.dst]))
+        self.arrays = arrays
+
+        src, dst, distance = _directed_sorted(n, *self._pairs_of(changed, is_changed))
+        # Новые связи вклеиваются в упорядоченные массивы по ключу (строка, столбец)
+        position = np.searchsorted(self.src * n + self.dst, src * n + dst)
+        self.src = np.insert(self.src, position, src)
+        self.dst = np.insert(self.dst, position, dst)
+        self.distance = np.insert(self.distance, position, distance)
+        if self.params is not None:
+            self.emd = np.insert(self.emd, position, self._emd(src, dst, distance))
+        if self._graph_dirty is not None:
+            self._graph_dirty = np.union1d(self._graph_dirty, changed)
+
+    def _pairs_of(self, changed, is_changed):
+        """
+        Находит пары в зоне видимости, в которых участвует хотя бы один объект из changed.
+        Расстояния считаются блоками строк, чтобы ограничить память.
+        :return: Кортеж массивов (i, j, distance), i < j
+        """
+        x, y = self.arrays['x'], self.arrays['y']
+        n = x.size
+        radius = horizon_radius(self.arrays['height'])
+        cols = np.arange(n)
+        step = max(1, BLOCK_ELEMENTS // max(n, 1))
+        parts_i, parts_j, parts_distance = [], [], []
+        for start in range(0, changed.size, step):
+            rows = changed[start:start + step]
+            with stage('distance'):
+                distance = np.sqrt((x[rows, None] - x[None, :]) ** 2 + (y[rows, None] - y[None, :]) ** 2) / 1000
+                visible = distance <= radius[rows, None] + radius[None, :]
+            # Пара двух изменившихся объектов учитывается один раз (со стороны меньшего номера)
+            visible &= ~is_changed[None, :] | (cols[None, :] > rows[:, None])
+            visible[np.arange(rows.size), rows] = False
+            a, b = np.nonzero(visible)
+            count('pairs_candidates', visible.size)
+            count('pairs_pruned', visible.size - a.size)
+            parts_i.append(np.minimum(rows[a], b))
+            parts_j.append(np.maximum(rows[a], b))
+            parts_distance.append(distance[a, b])
+        if not parts_i:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        return np.concatenate(parts_i), np.concatenate(parts_j), np.concatenate(parts_distance)
+
+
+def _directed_sorted(n, i, j, distance):
+    """
+    Разворачивает неориентированные пары в оба направления и упорядочивает их по (строка, столбец).
+    :return: Кортеж массивов (src, dst, distance)
+    """
+    src = np.concatenate((i, j))
+    dst = np.concatenate((j, i))
+    distance = np.concatenate((distance, distance))
+    order = np.argsort(src * n + dst, kind='stable')
+    return src[order], dst[order], distance[order]
@@ -0,0 +1,115 @@
+import json
+import time
+from collections import defaultdict
+
+enabled = False  # Пока выключено, stage() и count() почти ничего не стоят
+timers = defaultdict(lambda: [0.0, 0])  # Этап -> [суммарное время (с), число вызовов]
+counters = defaultdict(int)  # Счетчик -> значение
+
+
+class _Stage:
+    """Замер одного этапа: время добавляется к таймеру с тем же именем."""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timer = timers[self.name]
+        timer[0] += time.perf_counter() - self.start
+        timer[1] += 1
+        return False
+
+
+class _NullStage:
+    """Заглушка для выключенного режима: ничего не замеряет."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable():
+    """Включает сбор таймеров и счетчиков."""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Выключает сбор; накопленные значения сохраняются."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Обнуляет таймеры и счетчики (например, перед очередным расчетом)."""
+    timers.clear()
+    counters.clear()
+
+
+def stage(name):
+    """
+    Контекстный менеджер для замера этапа: with stage('norm_cdf'): ...
+    Вложенные этапы учитываются и в своем таймере, и в таймере внешнего этапа.
+    :param name: Имя этапа
+    """
+    if not enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def count(name, value=1):
+    """
+    Увеличивает счетчик.
+    :param name: Имя счетчика (например, 'pairs_evaluated')
+    :param value: Приращение
+    """
+    if enabled:
+        counters[name] += int(value)
+
+
+def snapshot():
+    """
+    :return: Словарь {'timers': {этап: {'seconds', 'calls'}}, 'counters': {счетчик: значение}}
+    """
+    return {
+        'timers': {name: {'seconds': round(seconds, 6), 'calls': calls}
+                   for name, (seconds, calls) in list(timers.items())},
+        'counters': dict(list(counters.items())),
+    }
+
+
+def summary(limit=6):
+    """
+    Краткая строка для строки состояния: самые долгие этапы и все счетчики.
+    :param limit: Сколько этапов показать
+    """
+    # Копии словарей: расчет в фоновом потоке может добавлять этапы во время чтения
+    longest = sorted(list(timers.items()), key=lambda item: item[1][0], reverse=True)[:limit]
+    parts = [f"{name} {seconds:.3f} с" for name, (seconds, _) in longest]
+    parts += [f"{name}: {value}" for name, value in list(counters.items())]
+    return " | ".join(parts) if parts else "Нет данных замеров"
+
+
+def write_json_line(file, label, **extra):
+    """
+    Дописывает замеры одной строкой JSON (формат JSON Lines) для обработки вне программы.
+    :param file: Открытый текстовый файл
+    :param label: Название запуска (например, операция и параметры)
+    :param extra: Дополнительные поля записи
+    """
+    record = {'time': time.time(), 'label': label, **extra, **snapshot()}
+    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    file.flush()
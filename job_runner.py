@@ -0,0 +1,137 @@
+import queue
+import threading
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+POLL_INTERVAL = 100  # Как часто (мс) окно забирает сообщения фонового потока
+
+
+class JobCancelled(Exception):
+    """Расчет остановлен пользователем."""
+
+
+class JobRunner:
+    """
+    Выполнение долгих расчетов в фоновом потоке с индикатором хода, отменой и очередью.
+    Функция расчета не должна обращаться к виджетам: она получает функцию progress(done, total),
+    а результат, ход расчета и ошибки передаются в окно через очередь, которую Tk опрашивает
+    через after(). Поэтому окно отвечает на действия пользователя во время расчета.
+    Новые задания, поставленные во время расчета, выполняются по очереди.
+    """
+
+    def __init__(self, master):
+        """
+        :param master: Родительский виджет
+        """
+        self._events = queue.Queue()
+        self._pending = deque()
+        self._current = None  # (название, признак отмены, on_done, on_error)
+
+        self.frame = tk.Frame(master)
+        self.label = tk.Label(self.frame, text="Готово", anchor="w")
+        self.progressbar = ttk.Progressbar(self.frame, orient=tk.HORIZONTAL, maximum=1.0)
+        self.cancel_button = tk.Button(self.frame, text="Отменить", command=self.cancel, state=tk.DISABLED)
+        self.label.pack(fill=tk.X)
+        self.progressbar.pack(fill=tk.X)
+        self.cancel_button.pack(pady=5)
+        self.frame.after(POLL_INTERVAL, self._poll)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    @property
+    def busy(self):
+        """Выполняется ли сейчас расчет."""
+        return self._current is not None
+
+    def submit(self, name, work, on_done, on_error=None):
+        """
+        Ставит расчет в очередь.
+        :param name: Название для строки состояния
+        :param work: Функция work(progress), выполняется в фоновом потоке и возвращает результат
+        :param on_done: Функция on_done(result), вызывается в потоке Tk после успешного расчета
+        :param on_error: Функция on_error(exception), вызывается в потоке Tk при ошибке расчета
+        """
+        self._pending.append((name, work, on_done, on_error))
+        if self._current is None:
+            self._start_next()
+        else:
+            self._show_status()
+
+    def cancel(self):
+        """Останавливает текущий расчет (в ближайшей точке отчета о ходе); очередь сохраняется."""
+        if self._current is not None:
+            self._current[1].set()
+            self.label.config(text=f"{self._current[0]}: остановка...")
+
+    def _show_status(self, fraction=None):
+        name = self._current[0]
+        queued = f" (в очереди: {len(self._pending)})" if self._pending else ""
+        percent = f" {fraction:.0%}" if fraction is not None else ""
+        self.label.config(text=f"{name}...{percent}{queued}")
+
+    def _start_next(self):
+        if not self._pending:
+            self._current = None
+            self.cancel_button.config(state=tk.DISABLED)
+            return
+        name, work, on_done, on_error = self._pending.popleft()
+        cancelled = threading.Event()
+        self._current = (name, cancelled, on_done, on_error)
+        self.progressbar.config(value=0)
+        self.cancel_button.config(state=tk.NORMAL)
+        self._show_status()
+
+        def progress(done, total):
+            if cancelled.is_set():
+                raise JobCancelled()
+            self._events.put(('progress', done / total if total else 1.0))
+
+        def run():
+            try:
+                self._events.put(('done', work(progress)))
+            except JobCancelled:
+                self._events.put(('cancelled', None))
+            except Exception as e:
+                self._events.put(('error', e))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _poll(self):
+        """Обрабатывает сообщения фонового потока в потоке Tk."""
+        try:
+            while True:
+                kind, value = self._events.get_nowait()
+                if kind == 'progress':
+                    self.progressbar.config(value=value)
+                    if not self._current[1].is_set():
+                        self._show_status(value)
+                    continue
+                self._finish(kind, value)
+        except queue.Empty:
+            pass
+        finally:
+            # Опрос продолжается при любой ошибке, иначе следующие расчеты не будут обработаны
+            self.frame.after(POLL_INTERVAL, self._poll)
+
+    def _finish(self, kind, value):
+        name, cancelled, on_done, on_error = self._current
+        try:
+            if kind == 'done':
+                self.label.config(text=f"{name}: готово")
+                self.progressbar.config(value=1.0)
+                on_done(value)
+            elif kind == 'cancelled':
+                self.label.config(text=f"{name}: отменено")
+                self.progressbar.config(value=0)
+            else:
+                self.label.config(text=f"{name}: ошибка ({value})")
+                if on_error is not None:
+                    on_error(value)
+        except Exception as e:
+            # Ошибка обработки результата (например, при выводе) не останавливает очередь
+            self.label.config(text=f"{name}: ошибка при выводе результата ({e})")
+        finally:
+            # Следующий расчет начинается только после обработки результата предыдущего
+            self._start_next()
@@ -0,0 +1,248 @@
+import numpy as np
+from instrumentation import stage
+
+EMD_LEVELS = 100  # Уровни 8-битного хранения: ЭМД в сотых долях (0-100), как после округления до 2 знаков
+QUANTIZED_DTYPES = (np.uint8, np.float16)
+
+
+def csr_indptr(size, rows):
+    """
+    Рассчитывает границы строк CSR для отсортированного по строкам набора связей.
+    :param size: Число строк
+    :param rows: Индексы строк связей
+    :return: Массив indptr длины size + 1
+    """
+    indptr = np.zeros(size + 1, dtype=np.intp)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr
+
+
+class LinkMatrix:
+    """
+    Разреженная матрица ЭМД в формате CSR: хранятся только существующие связи.
+    Отсутствующие элементы (объекты вне прямой видимости, диагональ) равны 0.
+    Поддерживает len() и построчную итерацию, поэтому может использоваться там же,
+    где и плотная матрица numpy.
+    """
+
+    def __init__(self, size, indptr, indices, data):
+        """
+        :param size: Число объектов n (матрица n x n)
+        :param indptr: Границы строк в indices/data (длина n + 1)
+        :param indices: Номера столбцов (приемников) для каждой связи
+        :param data: Значения ЭМД для каждой связи
+        """
+        self.size = size
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_pairs(cls, size, src, dst, values):
+        """
+        Строит матрицу из набора направленных пар; нулевые значения не сохраняются.
+        :param size: Число объектов n
+        :param src: Индексы строк (передатчиков)
+        :param dst: Индексы столбцов (приемников)
+        :param values: Значения ЭМД
+        :return: LinkMatrix
+        """
+        src = np.asarray(src, dtype=np.intp)
+        dst = np.asarray(dst, dtype=np.intp)
+        values = np.asarray(values, dtype=float)
+        with stage('csr_sort'):
+            keep = values != 0
+            src, dst, values = src[keep], dst[keep], values[keep]
+            order = np.lexsort((dst, src))
+            return cls(size, csr_indptr(size, src), dst[order], values[order])
+
+    @classmethod
+    def from_dense(cls, matrix):
+        """
+        Строит разреженную матрицу из плотной.
+        :param matrix: Квадратная матрица numpy
+        :return: LinkMatrix
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        src, dst = np.nonzero(matrix)
+        return cls.from_pairs(len(matrix), src, dst, matrix[src, dst])
+
+    @property
+    def shape(self):
+        return self.size, self.size
+
+    @property
+    def nnz(self):
+        """Число хранимых связей."""
+        return self.data.size
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self.row(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            indices, values = self.row_links(i)
+            pos = np.searchsorted(indices, j)
+            if pos < indices.size and indices[pos] == j:
+                return values[pos]
+            return 0.0
+        return self.row(key)
+
+    def row_links(self, i):
+        """
+        Возвращает существующие связи одной строки.
+        :param i: Номер строки (передатчика)
+        :return: Кортеж (номера приемников, значения ЭМД)
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data_slice(start, end)
+
+    def data_slice(self, first, last):
+        """
+        Значения связей с номерами first..last-1 (то же, что data[first:last]).
+        Для блоков строк: indptr[start]..indptr[stop].
+        """
+        return self.data[first:last]
+
+    def row(self, i):
+        """
+        Возвращает строку матрицы в плотном виде.
+        :param i: Номер строки
+        :return: Массив длины n
+        """
+        dense = np.zeros(self.size)
+        indices, values = self.row_links(i)
+        dense[indices] = values
+        return dense
+
+    def row_means(self):
+        """
+        Средние значения по строкам без разворачивания матрицы.
+        :return: Массив длины n
+        """
+        rows, _, values = self.to_coo()
+        sums = np.bincount(rows, weights=values, minlength=self.size)
+        return sums / max(self.size, 1)
+
+    def to_coo(self):
+        """
+        :return: Кортеж массивов (строки, столбцы, значения)
+        """
+        rows = np.repeat(np.arange(self.size), np.diff(self.indptr))
+        return rows, self.indices, self.data
+
+    def toarray(self):
+        """
+        :return: Плотная матрица numpy n x n
+        """
+        dense = np.zeros(self.shape)
+        rows, cols, values = self.to_coo()
+        dense[rows, cols] = values
+        return dense
+
+    def rounded(self, decimals=2):
+        """
+        Округляет значения ЭМД; связи, округлившиеся до нуля, удаляются.
+        :param decimals: Число знаков после запятой
+        :return: Новая LinkMatrix
+        """
+        rows, cols, values = self.to_coo()
+        return LinkMatrix.from_pairs(self.size, rows, cols, np.round(values, decimals))
+
+    @property
+    def nbytes(self):
+        """Объем памяти массивов матрицы (байт)."""
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def quantized(self, dtype=np.uint8):
+        """
+        Компактная копия матрицы с ЭМД, округленной до сотых (см. QuantizedLinkMatrix).
+        :param dtype: np.uint8 (сотые доли, 1 байт) или np.float16 (2 байта)
+        :return: QuantizedLinkMatrix
+        """
+        return QuantizedLinkMatrix.from_matrix(self, dtype)
+
+    def edges(self, threshold=0.0):
+        """
+        Рёбра неориентированного графа: пары i < j (передатчик i) со значением выше порога.
+        :param threshold: Порог ЭМД
+        :return: Кортеж массивов (i, j, emd)
+        """
+        rows, cols, values = self.to_coo()
+        keep = (rows < cols) & (values > threshold)
+        return rows[keep], cols[keep], values[keep]
+
+
+class QuantizedLinkMatrix(LinkMatrix):
+    """
+    Разреженная матрица ЭМД в компактном виде: значения хранятся как uint8 (сотые доли, 0-100)
+    или float16, номера столбцов - как int32. Значения округлены до сотых, и обратное
+    преобразование дает в точности те же значения, что и LinkMatrix.rounded(2).
+    Свойство data и строки возвращают float64, поэтому матрицу можно передавать туда же,
+    где используется LinkMatrix (отображение, экспорт, временные ряды).
+    """
+
+    def __init__(self, size, indptr, indices, codes):
+        """
+        :param size: Число объектов n
+        :param indptr: Границы строк
+        :param indices: Номера столбцов
+        :param codes: Значения ЭМД: uint8 (сотые доли) или float16
+        """
+        if codes.dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"неподдерживаемый тип значений: {codes.dtype}")
+        self.size = size
+        self.indptr = indptr
+        self.indices = indices
+        self.codes = codes
+
+    @classmethod
+    def from_matrix(cls, matrix, dtype=np.uint8):
+        """
+        :param matrix: LinkMatrix (значения округляются до сотых; связи, округлившиеся до нуля, удаляются)
+        :param dtype: np.uint8 или np.float16
+        :return: QuantizedLinkMatrix
+        """
+        if isinstance(matrix, QuantizedLinkMatrix) and matrix.codes.dtype == dtype:
+            return matrix
+        rounded = matrix.rounded(2)
+        index_dtype = np.int32 if matrix.size < 2 ** 31 else np.int64
+        if np.dtype(dtype) == np.uint8:
+            codes = np.rint(rounded.data * EMD_LEVELS).astype(np.uint8)
+        else:
+            codes = rounded.data.astype(dtype)
+        return cls(matrix.size, rounded.indptr, rounded.indices.astype(index_dtype), codes)
+
+    def _decode(self, codes):
+        if codes.dtype == np.uint8:
+            return codes / EMD_LEVELS
+        # float16 не представляет сотые доли точно; округление восстанавливает исходные значения
+        return np.round(codes.astype(float), 2)
+
+    @property
+    def data(self):
+        return self._decode(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.codes.nbytes
+
+    def data_slice(self, first, last):
+        # Раскодируется только нужная часть, а не весь массив, как в data
+        return self._decode(self.codes[first:last])
+
+    def rounded(self, decimals=2):
+        if decimals >= 2:
+            return self  # Значения уже округлены до сотых
+        return super().rounded(decimals)
+
+    def dequantized(self):
+        """
+        :return: LinkMatrix с значениями float64
+        """
+        return LinkMatrix(self.size, self.indptr, self.indices.astype(np.intp), self.data)
@@ -1,27 +1,132 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 import tkinter as tk
 from tkinter import ttk
+from emd_engine import objects_to_arrays, directed_pairs, iter_scenario_links
+from result_io import export_matrix, import_matrix, write_results_npz, iter_results_npz
+
+CHUNK_STEPS = 256  # Сколько временных шагов накапливать перед записью в файл
+
+def emd_time_steps(objects, steps, with_noise=True):
+    """
+    Генератор матриц ЭМД по временным шагам, рассчитываемых основным движком (как в EmdMatricesGui).
+    Геометрия пар считается один раз, шаги - векторно группами; в памяти одновременно
+    находится только ограниченная группа шагов.
+    :param objects: объекты (ObjectStore или список словарей).
+    :param steps: последовательность параметров шагов (частота, требуемый SNR, потери из-за погоды),
+                  может быть генератором.
+    :param with_noise: учитывать ли мощность помехи передающего объекта.
+    :return: генератор разреженных матриц ЭМД (LinkMatrix).
+    """
+    arrays = objects_to_arrays(objects)
+    src, dst, distance = directed_pairs(arrays)
+    for _, matrix in iter_scenario_links(arrays, src, dst, distance, steps, with_noise):
+        yield matrix
+
+def matrix_row_means(matrix, chunk_rows=1024):
+    """
+    Средние значения по строкам матрицы ЭМД.
+    Матрица может быть плотной, разреженной (LinkMatrix) или отображенной в память (np.memmap):
+    в последнем случае строки читаются блоками, и файл не загружается целиком.
+    :param matrix: матрица ЭМД n x n.
+    :param chunk_rows: число строк, читаемых за один раз.
+    :return: массив средних длины n.
+    """
+    if hasattr(matrix, 'row_means'):
+        return matrix.row_means()
+    result = np.empty(len(matrix))
+    for start in range(0, len(matrix), chunk_rows):
+        result[start:start + chunk_rows] = np.mean(np.asarray(matrix[start:start + chunk_rows]), axis=1)
+    return result
+
+def time_series_columns(matrices):
+    """
+    Генератор столбцов временной матрицы: средние по строкам для каждого шага.
+    :param matrices: последовательность (или генератор) матриц ЭМД.
+    :return: генератор массивов длины n (каналы).
+    """
+    for matrix in matrices:
+        yield matrix_row_means(matrix)
 
 def create_time_series_matrix(matrices, num_time_intervals=100):
     """
     Создает временную матрицу ЭМД (каналы x временные интервалы).
-    :param matrices: список матриц вероятностей ЭМД.
+    :param matrices: список или генератор матриц вероятностей ЭМД (из генератора берется не больше
+                     num_time_intervals матриц).
     :param num_time_intervals: количество временных шагов.
     :return: итоговая матрица (каналы x время).
     """
-    num_channels = len(matrices[0])  # Определяем число каналов
-    result_matrix = np.zeros((num_channels, num_time_intervals))  # Создаем матрицу
-
-    # Заполняем матрицу значениями
-    for t in range(min(num_time_intervals, len(matrices))):
-        for channel in range(num_channels):
-            result_matrix[channel, t] = np.mean(matrices[t][channel])  # Усредняем по строке
-
+    result_matrix = None
+    for t, column in zip(range(num_time_intervals), time_series_columns(matrices)):
+        if result_matrix is None:
+            result_matrix = np.zeros((len(column), num_time_intervals))  # Число каналов - по первой матрице
+        result_matrix[:, t] = column
+    if result_matrix is None:
+        return np.zeros((0, num_time_intervals))
     return result_matrix
 
+def _step_chunks(matrices, chunk_steps):
+    """
+    Группирует средние по строкам в блоки шагов.
+    :return: генератор массивов (шаги x каналы), не длиннее chunk_steps.
+    """
+    chunk = None
+    filled = 0
+    for column in time_series_columns(matrices):
+        if chunk is None:
+            chunk = np.empty((chunk_steps, len(column)))
+        chunk[filled] = column
+        filled += 1
+        if filled == chunk_steps:
+            yield chunk.copy()
+            filled = 0
+    if filled:
+        yield chunk[:filled].copy()
+
+def stream_time_series(matrices, filename="emd_time_series.csv", chunk_steps=CHUNK_STEPS):
+    """
+    Записывает временной ряд ЭМД по мере расчета: строка - временной шаг, столбец - канал.
+    В памяти находится только chunk_steps шагов, поэтому число шагов не ограничено объемом памяти.
+    Файл .npz пишется как сжатый двоичный архив блоков шагов, иначе - CSV.
+    :param matrices: последовательность (или генератор) матриц ЭМД.
+    :param filename: имя файла (.csv или .npz).
+    :param chunk_steps: число шагов, записываемых за один раз.
+    :return: число записанных шагов.
+    """
+    steps = 0
+    if filename.endswith(".npz"):
+        def counted():
+            nonlocal steps
+            for chunk in _step_chunks(matrices, chunk_steps):
+                steps += len(chunk)
+                yield None, chunk
+
+        write_results_npz(filename, 'dense', 0, counted())
+        return steps
+    with open(filename, mode="w", newline="", encoding="utf-8-sig") as file:
+        for chunk in _step_chunks(matrices, chunk_steps):
+            if steps == 0:
+                file.write(",".join(["t"] + [f"channel{i + 1}" for i in range(chunk.shape[1])]) + "\n")
+            _write_steps(file, chunk, steps)
+            steps += len(chunk)
+    return steps
+
+def _write_steps(file, chunk, first_step):
+    """Дописывает блок шагов в CSV; шаги нумеруются с 1, как столбцы t1, t2, ... в save_matrix_to_file."""
+    numbers = np.arange(first_step + 1, first_step + len(chunk) + 1)[:, None]
+    np.savetxt(file, np.hstack((numbers, chunk)), fmt=["%d"] + ["%.6g"] * chunk.shape[1], delimiter=",")
+
+def read_time_series(filename):
+    """
+    Читает временной ряд, записанный stream_time_series (CSV или двоичный архив .npz).
+    :return: матрица (каналы x время), как у create_time_series_matrix.
+    """
+    if filename.endswith(".npz"):
+        _, _, chunks = iter_results_npz(filename)
+        blocks = [chunk for _, chunk in chunks]
+        return np.concatenate(blocks).T if blocks else np.zeros((0, 0))
+    data = np.loadtxt(filename, delimiter=",", skiprows=1, ndmin=2, encoding="utf-8-sig")
+    return data[:, 1:].T
+
 def plot_matrix_with_scroll(matrix):
     """
     Отображает матрицу в виде таблицы с прокруткой.
@@ -49,14 +154,14 @@ def plot_matrix_with_scroll(matrix):
     canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
     scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
 
-    df = pd.DataFrame(matrix, columns=[f"t{i+1}" for i in range(matrix.shape[1])])
-    table = ttk.Treeview(scrollable_frame, columns=list(df.columns), show="headings")
+    columns = [f"t{i+1}" for i in range(matrix.shape[1])]
+    table = ttk.Treeview(scrollable_frame, columns=columns, show="headings")
 
-    for col in df.columns:
+    for col in columns:
         table.heading(col, text=col)
         table.column(col, width=50)
 
-    for row in df.itertuples(index=False):
+    for row in np.asarray(matrix).tolist():
         table.insert("", "end", values=row)
 
     table.pack()
@@ -64,16 +169,27 @@ def plot_matrix_with_scroll(matrix):
 
 def save_matrix_to_file(matrix, filename="emd_matrix.csv"):
     """
-    Сохраняет матрицу в CSV-файл.
+    Сохраняет матрицу в CSV-файл (по частям, без промежуточного DataFrame) или, для имени .npz,
+    в сжатый двоичный архив (см. result_io.export_matrix).
     """
-    df = pd.DataFrame(matrix, columns=[f"t{i+1}" for i in range(matrix.shape[1])])
-    df.to_csv(filename, index=False, encoding="utf-8-sig")
+    export_matrix(filename, matrix, fmt="%.6g", header=[f"t{i+1}" for i in range(matrix.shape[1])],
+                  encoding="utf-8-sig")
     print(f"Матрица сохранена в {filename}")
 
+def load_matrix_from_file(filename):
+    """
+    Загружает матрицу, сохраненную save_matrix_to_file.
+    :return: матрица (каналы x время).
+    """
+    return import_matrix(filename, encoding="utf-8-sig")
+
 def plot_heatmap(matrix):
     """
     Визуализация матрицы в виде heatmap.
     """
+    # Библиотеки графиков загружаются только при построении тепловой карты
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(max(15, 0.2 * matrix.shape[1]), max(8, 0.5 * matrix.shape[0])))
     sns.heatmap(matrix, cmap="coolwarm", annot=False)
     plt.xlabel("Временные промежутки")
@@ -81,21 +197,25 @@ def plot_heatmap(matrix):
     plt.title("Тепловая карта ЭМД")
     plt.show()
 
-# Пример генерации 100 интервалов времени
-num_channels = 5  # Можно менять
-num_time_intervals = 100  # Количество временных интервалов
+if __name__ == "__main__":
+    # Пример генерации 100 интервалов времени
+    num_channels = 5  # Можно менять
+    num_time_intervals = 100  # Количество временных интервалов
 
-# Пример случайных данных (замените на реальные матрицы ЭМД)
-matrices = [np.random.rand(num_channels, num_channels) for _ in range(num_time_intervals)]
+    # Пример случайных объектов; на каждом шаге меняются потери из-за погоды
+    rng = np.random.default_rng()
+    objects = [{'x': x, 'y': y, 'height': 30, 'power': 30, 'gain': 15, 'noise_power': -90}
+               for x, y in rng.uniform(0, 50000, (num_channels, 2)).tolist()]
+    steps = ((400, 10, weather_loss) for weather_loss in rng.uniform(0, 50, num_time_intervals).tolist())
 
-# Создаем матрицу
-emd_time_matrix = create_time_series_matrix(matrices, num_time_intervals)
+    # Создаем матрицу: матрицы ЭМД рассчитываются по одному шагу и сразу усредняются
+    emd_time_matrix = create_time_series_matrix(emd_time_steps(objects, steps), num_time_intervals)
 
-# Отображаем матрицу в виде таблицы с прокруткой
-plot_matrix_with_scroll(emd_time_matrix)
+    # Отображаем матрицу в виде таблицы с прокруткой
+    plot_matrix_with_scroll(emd_time_matrix)
 
-# Сохраняем в CSV
-save_matrix_to_file(emd_time_matrix)
+    # Сохраняем в CSV
+    save_matrix_to_file(emd_time_matrix)
 
-# Визуализируем heatmap
-plot_heatmap(emd_time_matrix)
+    # Визуализируем heatmap
+    plot_heatmap(emd_time_matrix)
@@ -0,0 +1,248 @@
+import tkinter as tk
+import numpy as np
+from instrumentation import stage, count
+
+TILE = 128  # Размер тайла изображения (пиксели)
+MIN_TEXT_ZOOM = 32  # Начиная с этого размера ячейки (пиксели) в ячейках выводятся значения
+MAX_ZOOM = 64
+ZOOM_STEP = 1.25
+MAX_CACHED_TILES = 256
+
+# Цвета ячеек с теми же порогами, что и в табличном отображении
+CELL_COLORS = ("#f08080", "#ffff00", "#90ee90")  # lightcoral (<= 0.1), yellow (<= 0.5), lightgreen
+BACKGROUND = "#ffffff"
+
+
+def color_classes(values):
+    """
+    Классы цвета ячеек: 0 - lightcoral (<= 0.1), 1 - yellow (<= 0.5), 2 - lightgreen (> 0.5).
+    :param values: Массив значений ЭМД
+    :return: Массив классов uint8
+    """
+    values = np.asarray(values)
+    return (values > 0.1).astype(np.uint8) + (values > 0.5)
+
+
+def sample_matrix(matrix, rows, cols):
+    """
+    Читает значения матрицы в узлах сетки rows x cols, не разворачивая матрицу целиком.
+    Поддерживает плотные матрицы, np.memmap и LinkMatrix.
+    :param matrix: Матрица ЭМД
+    :param rows: Номера строк (возрастающие, с повторами)
+    :param cols: Номера столбцов (возрастающие, с повторами)
+    :return: Массив значений len(rows) x len(cols)
+    """
+    unique_rows, row_index = np.unique(rows, return_inverse=True)
+    if hasattr(matrix, 'row_links'):
+        block = np.stack([matrix.row(r)[cols] for r in unique_rows.tolist()])
+    else:
+        # Читаются только нужные строки (для np.memmap - только соответствующие участки файла)
+        block = np.asarray(matrix[unique_rows])[:, cols]
+    return block[row_index]
+
+
+def tile_cells(tile_index, zoom, size):
+    """
+    Номера ячеек матрицы, попадающих в пиксели тайла по одной оси.
+    :param tile_index: Номер тайла по оси
+    :param zoom: Размер ячейки в пикселях (может быть меньше 1)
+    :param size: Размер матрицы n
+    :return: Массив номеров ячеек для пикселей тайла (-1 - вне матрицы)
+    """
+    pixels = tile_index * TILE + np.arange(TILE)
+    cells = np.floor((pixels + 0.5) / zoom).astype(np.int64)
+    cells[cells >= size] = -1
+    return cells
+
+
+def tile_image_data(matrix, size, zoom, tx, ty):
+    """
+    Готовит пиксели тайла в формате PhotoImage.put (без обращения к Tk).
+    :param matrix: Матрица ЭМД
+    :param size: Размер матрицы n
+    :param zoom: Размер ячейки в пикселях
+    :param tx: Номер тайла по горизонтали
+    :param ty: Номер тайла по вертикали
+    :return: Строка данных изображения TILE x TILE
+    """
+    cols = tile_cells(tx, zoom, size)
+    rows = tile_cells(ty, zoom, size)
+    inside_cols, inside_rows = cols >= 0, rows >= 0
+    colors = np.full((TILE, TILE), len(CELL_COLORS), dtype=np.uint8)
+    if inside_rows.any() and inside_cols.any():
+        values = sample_matrix(matrix, rows[inside_rows], cols[inside_cols])
+        colors[np.ix_(inside_rows, inside_cols)] = color_classes(values)
+    palette = np.array(CELL_COLORS + (BACKGROUND,))
+    return " ".join("{" + " ".join(row) + "}" for row in palette[colors].tolist())
+
+
+class MatrixView:
+    """
+    Отображение матрицы ЭМД в виде одного цветного изображения на Canvas.
+    Изображение рисуется тайлами только для видимой области, поэтому время перерисовки
+    зависит от размера окна, а не от числа ячеек. Поддерживаются масштаб (Ctrl + колесо,
+    клавиши +/-), перемещение (перетаскивание, колесо, полосы прокрутки) и подсказка
+    с точным значением ячейки под курсором.
+    """
+
+    def __init__(self, master, matrix, zoom=None):
+        """
+        :param master: Родительский виджет
+        :param matrix: Матрица ЭМД (плотная, np.memmap или LinkMatrix)
+        :param zoom: Начальный размер ячейки в пикселях (None - вписать матрицу в 600 пикселей)
+        """
+        self.matrix = matrix
+        self.size = len(matrix)
+        self.zoom = zoom or min(MAX_ZOOM, max(600 / max(self.size, 1), 1 / TILE))
+        self._tiles = {}  # (tx, ty) -> (PhotoImage, id элементов canvas)
+
+        self.frame = tk.Frame(master)
+        self.canvas = tk.Canvas(self.frame, background=BACKGROUND, highlightthickness=0)
+        x_scroll = tk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=self._xview)
+        y_scroll = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._yview)
+        self.canvas.configure(xscrollcommand=x_scroll.set, yscrollcommand=y_scroll.set)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        y_scroll.grid(row=0, column=1, sticky="ns")
+        x_scroll.grid(row=1, column=0, sticky="ew")
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", lambda event: self.canvas.scan_mark(event.x, event.y))
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<Motion>", self._on_motion)
+        self.canvas.bind("<Leave>", lambda event: self.canvas.delete("tooltip"))
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Control-MouseWheel>", lambda event: self.zoom_by(
+            ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP, event.x, event.y))
+        self.canvas.bind("<Button-4>", lambda event: self._yview("scroll", -1, "units"))  # Прокрутка в Linux
+        self.canvas.bind("<Button-5>", lambda event: self._yview("scroll", 1, "units"))
+        self.canvas.bind("<Control-Button-4>", lambda event: self.zoom_by(ZOOM_STEP, event.x, event.y))
+        self.canvas.bind("<Control-Button-5>", lambda event: self.zoom_by(1 / ZOOM_STEP, event.x, event.y))
+        self.canvas.bind("<Enter>", lambda event: self.canvas.focus_set())
+        self.canvas.bind("<plus>", lambda event: self.zoom_by(ZOOM_STEP))
+        self.canvas.bind("<equal>", lambda event: self.zoom_by(ZOOM_STEP))
+        self.canvas.bind("<minus>", lambda event: self.zoom_by(1 / ZOOM_STEP))
+        self._update_scrollregion()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def _extent(self):
+        return self.size * self.zoom
+
+    def _update_scrollregion(self):
+        extent = self._extent()
+        self.canvas.configure(scrollregion=(0, 0, extent, extent))
+
+    def zoom_by(self, factor, x=None, y=None):
+        """
+        Изменяет масштаб, сохраняя под курсором (или в центре окна) ту же ячейку.
+        :param factor: Множитель масштаба
+        :param x: Координата курсора в окне
+        :param y: Координата курсора в окне
+        """
+        min_zoom = min(1.0, 200 / max(self.size, 1))
+        zoom = min(MAX_ZOOM, max(min_zoom, self.zoom * factor))
+        if zoom == self.zoom:
+            return
+        if x is None:
+            x, y = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+        cell_x = self.canvas.canvasx(x) / self.zoom
+        cell_y = self.canvas.canvasy(y) / self.zoom
+        self.zoom = zoom
+        self._clear_tiles()
+        self._update_scrollregion()
+        extent = max(self._extent(), 1)
+        self.canvas.xview_moveto(max(0.0, (cell_x * zoom - x) / extent))
+        self.canvas.yview_moveto(max(0.0, (cell_y * zoom - y) / extent))
+        self.redraw()
+
+    def _xview(self, *args):
+        self.canvas.xview(*args)
+        self.redraw()
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def _on_drag(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.redraw()
+
+    def _on_wheel(self, event):
+        steps = int(event.delta / 120) or (1 if event.delta > 0 else -1)
+        self._yview("scroll", -steps, "units")
+
+    def _clear_tiles(self):
+        for image, items in self._tiles.values():
+            self.canvas.delete(*items)
+        self._tiles.clear()
+
+    def redraw(self):
+        """Дорисовывает недостающие тайлы видимой области и освобождает далекие."""
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        right = self.canvas.canvasx(self.canvas.winfo_width())
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        last = int(np.ceil(self._extent() / TILE))
+        visible = {(tx, ty)
+                   for tx in range(max(0, int(left // TILE)), min(last, int(right // TILE) + 1))
+                   for ty in range(max(0, int(top // TILE)), min(last, int(bottom // TILE) + 1))}
+        for key in visible - self._tiles.keys():
+            self._tiles[key] = self._draw_tile(*key)
+        if len(self._tiles) > MAX_CACHED_TILES:
+            for key in [key for key in self._tiles if key not in visible]:
+                image, items = self._tiles.pop(key)
+                self.canvas.delete(*items)
+        # Рамки и подписи ячеек заходят на соседние тайлы - держим их поверх изображений
+        self.canvas.tag_raise("cells")
+        self.canvas.tag_raise("tooltip")
+
+    def _draw_tile(self, tx, ty):
+        """Рисует один тайл: изображение с цветами ячеек и, при крупном масштабе, значения."""
+        with stage('tile_data'):
+            data = tile_image_data(self.matrix, self.size, self.zoom, tx, ty)
+        count('tiles_drawn')
+        with stage('tk_tiles'):
+            image = tk.PhotoImage(width=TILE, height=TILE)
+            image.put(data)
+        x0, y0 = tx * TILE, ty * TILE
+        items = [self.canvas.create_image(x0, y0, image=image, anchor="nw")]
+
+        if self.zoom >= MIN_TEXT_ZOOM:
+            with stage('tk_cells'):
+                first_row, last_row = y0 / self.zoom, (y0 + TILE) / self.zoom
+                first_col, last_col = x0 / self.zoom, (x0 + TILE) / self.zoom
+                for i in range(int(first_row), min(self.size, int(np.ceil(last_row)))):
+                    row = self._row_values(i)
+                    for j in range(int(first_col), min(self.size, int(np.ceil(last_col)))):
+                        cx, cy = (j + 0.5) * self.zoom, (i + 0.5) * self.zoom
+                        if x0 <= cx < x0 + TILE and y0 <= cy < y0 + TILE:
+                            items.append(self.canvas.create_rectangle(j * self.zoom, i * self.zoom,
+                                                                      (j + 1) * self.zoom, (i + 1) * self.zoom,
+                                                                      outline="gray", tags="cells"))
+                            items.append(self.canvas.create_text(cx, cy, text=f"{row[j]:.2f}", font=("Arial", 8),
+                                                                 tags="cells"))
+        return image, items
+
+    def _row_values(self, i):
+        return self.matrix.row(i) if hasattr(self.matrix, 'row_links') else np.asarray(self.matrix[i])
+
+    def value_at(self, i, j):
+        """
+        :return: Значение ячейки (i, j)
+        """
+        if hasattr(self.matrix, 'row_links'):
+            return float(self.matrix[i, j])
+        return float(self.matrix[i][j])
+
+    def _on_motion(self, event):
+        self.canvas.delete("tooltip")
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        i, j = int(y // self.zoom), int(x // self.zoom)
+        if not (0 <= i < self.size and 0 <= j < self.size):
+            return
+        text = self.canvas.create_text(x + 12, y + 12, text=f"[{i}, {j}] = {self.value_at(i, j):.2f}",
+                                       anchor="nw", font=("Arial", 9), tags="tooltip")
+        self.canvas.create_rectangle(self.canvas.bbox(text), fill="lightyellow", outline="gray", tags="tooltip")
+        self.canvas.tag_raise(text)
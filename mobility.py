@@ -0,0 +1,189 @@
+import numpy as np
+from emd_engine import objects_to_arrays, horizon_radius, EMD_SIGMA
+from incremental import LinkCache
+from link_matrix import csr_indptr
+from spatial_index import candidate_pairs
+
+EMD_TOLERANCE = 0.01  # Допустимая погрешность ЭМД из-за того, что смещение объекта еще не учтено
+MAX_SHIFT = 100.0  # Смещение (м), после которого связи объекта пересчитываются в любом случае
+HORIZON_SLACK = 10  # Запас (в max_shift) списка пар у радиогоризонта: список обновляется после таких смещений
+
+
+def random_walk(objects, steps, speed, moving_share=1.0, seed=None):
+    """
+    Генератор траекторий: часть объектов на каждом шаге сдвигается на speed метров
+    в случайном направлении, остальные стоят на месте.
+    :param objects: Объекты (начальные положения)
+    :param steps: Число временных шагов
+    :param speed: Смещение за шаг (м)
+    :param moving_share: Доля движущихся объектов
+    :param seed: Начальное значение генератора случайных чисел
+    :return: Генератор кортежей (x, y) - координаты всех объектов на шаге
+    """
+    arrays = objects_to_arrays(objects)
+    x, y = arrays['x'].copy(), arrays['y'].copy()
+    rng = np.random.default_rng(seed)
+    moving = np.flatnonzero(rng.random(x.size) < moving_share)
+    for _ in range(steps):
+        angle = rng.uniform(0, 2 * np.pi, moving.size)
+        x[moving] += speed * np.cos(angle)
+        y[moving] += speed * np.sin(angle)
+        yield x.copy(), y.copy()
+
+
+def load_trajectories(path, objects):
+    """
+    Читает траектории из CSV со столбцами step,id,x,y. Объект, отсутствующий в строках шага,
+    остается на прежнем месте, поэтому в файле достаточно перечислить только перемещения.
+    :param path: Путь к CSV-файлу
+    :param objects: Объекты (начальные положения)
+    :return: Генератор кортежей (x, y) по шагам в порядке возрастания step
+    """
+    with open(path, mode='r', newline='', encoding='utf-8-sig') as file:
+        header = [name.strip() for name in file.readline().rstrip('\r\n').split(',')]
+    missing = [name for name in ('step', 'id', 'x', 'y') if name not in header]
+    if missing:
+        raise ValueError(f"{path}: нет столбцов: {', '.join(missing)}")
+    data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2, encoding='utf-8-sig')
+    step, index, new_x, new_y = (data[:, header.index(name)] for name in ('step', 'id', 'x', 'y'))
+    order = np.argsort(step, kind='stable')
+    step, index, new_x, new_y = step[order], index[order].astype(np.intp), new_x[order], new_y[order]
+
+    arrays = objects_to_arrays(objects)
+    x, y = arrays['x'].copy(), arrays['y'].copy()
+    if index.size and (index.min() < 0 or index.max() >= x.size):
+        raise ValueError(f"{path}: номер объекта вне диапазона 0..{x.size - 1}")
+    bounds = np.flatnonzero(np.diff(step)) + 1
+    for rows in np.split(np.arange(step.size), bounds) if step.size else []:
+        x[index[rows]] = new_x[rows]
+        y[index[rows]] = new_y[rows]
+        yield x.copy(), y.copy()
+
+
+class MobilitySimulation:
+    """
+    Расчет ЭМД по временным шагам для движущихся объектов.
+    Связи объекта пересчитываются, только когда его смещение от последнего учтенного положения
+    может изменить ЭМД какой-либо из его связей больше чем на tolerance, вывести связь за
+    радиогоризонт или ввести в зону видимости новый объект (или превышает max_shift).
+    Неподвижные объекты не пересчитываются, поэтому шаг стоит O(n + связи + k * n), где k - число
+    пересчитанных объектов, а не O(n^2).
+    """
+
+    def __init__(self, objects, frequency, required_snr, weather_loss=0.0, tolerance=EMD_TOLERANCE,
+                 max_shift=MAX_SHIFT, with_noise=True):
+        """
+        :param objects: Объекты (начальные положения)
+        :param frequency: Частота сигнала (МГц)
+        :param required_snr: Требуемый SNR (дБ)
+        :param weather_loss: Потери из-за погоды (%)
+        :param tolerance: Допустимая погрешность ЭМД
+        :param max_shift: Смещение (м), после которого объект пересчитывается в любом случае
+                          (конечное: в его пределах ищутся объекты за радиогоризонтом)
+        :param with_noise: Учитывать ли мощность помехи передающего объекта
+        """
+        if not (np.isfinite(max_shift) and max_shift > 0):
+            raise ValueError("max_shift должно быть положительным числом")
+        self.params = (frequency, required_snr, weather_loss)
+        self.max_shift = max_shift
+        self.cache = LinkCache(with_noise)
+        self.cache.sync(objects)
+        self.recomputed = 0  # Сколько раз пересчитывались связи объектов (для оценки выигрыша)
+        # |dЭМД| <= |dSNR| * max(плотность N(0, 1)) / sigma, а dSNR = (1 + w/100) * 20 * log10(d / d').
+        # Если каждый конец связи сместился не больше чем на d * (1 - ratio) / 2, то погрешность ЭМД
+        # не превышает tolerance
+        snr_tolerance = tolerance * EMD_SIGMA * np.sqrt(2 * np.pi) / (1 + weather_loss / 100)
+        self._shift_share = (1 - 10 ** (-snr_tolerance / 20)) / 2
+        self._horizon = None  # Пары у радиогоризонта (i, j) и положения объектов при их поиске
+
+    def allowed_shift(self):
+        """
+        Допустимое смещение каждого объекта от последнего учтенного положения.
+        :return: Массив длины n (м)
+        """
+        n = len(self.cache)
+        arrays = self.cache.arrays
+        src, dst, distance = self.cache.src, self.cache.dst, self.cache.distance * 1000
+        nearest = np.full(n, np.inf)
+        indptr = csr_indptr(n, src)
+        linked = np.flatnonzero(np.diff(indptr))
+        if linked.size:
+            # Кратчайшая связь объекта определяет, насколько сильно смещение меняет затухание
+            nearest[linked] = np.minimum.reduceat(distance, indptr[linked])
+        allowed = np.minimum(nearest * self._shift_share, self.max_shift)
+
+        # На радиогоризонте ЭМД меняется скачком (связь появляется или пропадает), поэтому смещение
+        # ограничено и запасом до горизонта. Оба конца пары могут сместиться, и каждому достается
+        # половина запаса: для связи - (видимость - d) / 2
+        radius = horizon_radius(arrays['height']) * 1000
+        np.minimum.at(allowed, src, (radius[src] + radius[dst] - distance) / 2)
+        # Для пар без связи - (d - видимость) / 2; пары дальше видимости + 2 * max_shift смещение не ограничивают
+        i, j = self._horizon_pairs(radius)
+        gap = np.hypot(arrays['x'][i] - arrays['x'][j], arrays['y'][i] - arrays['y'][j]) - radius[i] - radius[j]
+        outside = gap > 0
+        i, j, gap = i[outside], j[outside], gap[outside] / 2
+        np.minimum.at(allowed, i, gap)
+        np.minimum.at(allowed, j, gap)
+        return allowed
+
+    def _horizon_pairs(self, radius):
+        """
+        Пары, расстояние которых отличается от видимости не больше чем на 2 * max_shift.
+        Пространственный индекс строится с запасом slack = HORIZON_SLACK * max_shift и заново - только
+        когда какой-либо объект сместился от положения при построении больше чем на slack: до этого
+        расстояние пары изменилось не больше чем на 2 * slack, и нужные пары уже есть в списке.
+        :param radius: Радиусы радиогоризонта объектов (м)
+        :return: Кортеж массивов (i, j)
+        """
+        x, y = self.cache.arrays['x'], self.cache.arrays['y']
+        slack = HORIZON_SLACK * self.max_shift
+        if self._horizon is not None:
+            i, j, x0, y0 = self._horizon
+            if x0.size == x.size and np.hypot(x - x0, y - y0).max(initial=0) <= slack:
+                return i, j
+        i, j = candidate_pairs(x, y, radius + self.max_shift + slack)
+        gap = np.hypot(x[i] - x[j], y[i] - y[j]) - radius[i] - radius[j]
+        near = (gap >= -2 * slack) & (gap <= 2 * (self.max_shift + slack))
+        self._horizon = (i[near], j[near], x.copy(), y.copy())
+        return i[near], j[near]
+
+    def step(self, x, y):
+        """
+        Переходит к следующему временному шагу.
+        :param x: Координаты x всех объектов (м)
+        :param y: Координаты y всех объектов (м)
+        :return: Матрица ЭМД шага (LinkMatrix)
+        """
+        while True:
+            # После пересчета запасы соседей перемещенных объектов меняются, поэтому проверка
+            # повторяется; объект пересчитывается за шаг не больше одного раза (его смещение становится 0)
+            shift = np.hypot(x - self.cache.arrays['x'], y - self.cache.arrays['y'])
+            moved = np.flatnonzero(shift > self.allowed_shift())
+            if not moved.size:
+                break
+            self.cache.move(moved, x[moved], y[moved])
+            self.recomputed += moved.size
+        return self.cache.links(*self.params)
+
+    def run(self, trajectory):
+        """
+        :param trajectory: Последовательность (или генератор) координат (x, y) по шагам
+        :return: Генератор матриц ЭМД по шагам; подходит для create_time_series_matrix
+        """
+        for x, y in trajectory:
+            yield self.step(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+
+if __name__ == "__main__":
+    from markovitz_with_file_io import create_time_series_matrix, plot_heatmap
+
+    # Пример: 20 объектов, четверть из них движется со скоростью 30 м за шаг
+    num_time_intervals = 100
+    rng = np.random.default_rng()
+    objects = [{'x': x, 'y': y, 'height': 30, 'power': 30, 'gain': 15, 'noise_power': -90}
+               for x, y in rng.uniform(0, 50000, (20, 2)).tolist()]
+    simulation = MobilitySimulation(objects, 400, 10)
+    trajectory = random_walk(objects, num_time_intervals, speed=30, moving_share=0.25)
+    emd_time_matrix = create_time_series_matrix(simulation.run(trajectory), num_time_intervals)
+    print(f"Пересчетов связей объектов: {simulation.recomputed} из {len(objects) * num_time_intervals}")
+    plot_heatmap(emd_time_matrix)
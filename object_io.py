@@ -0,0 +1,156 @@
+import csv
+import os
+import warnings
+import zipfile
+import zlib
+import numpy as np
+from object_store import OBJECT_FIELDS
+from instrumentation import stage, count
+
+CACHE_SUFFIX = '.cache.npz'  # Бинарный кэш рядом с исходным CSV-файлом
+MAX_REPORTED_ERRORS = 20  # Сколько ошибочных строк перечислять в сообщении
+
+
+class ObjectFileError(ValueError):
+    """Ошибка разбора файла объектов со списком ошибочных строк (номер строки, описание)."""
+
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors
+        lines = [f"строка {line}: {message}" for line, message in errors[:MAX_REPORTED_ERRORS]]
+        if len(errors) > MAX_REPORTED_ERRORS:
+            lines.append(f"... и еще {len(errors) - MAX_REPORTED_ERRORS}")
+        super().__init__(f"{path}:\n" + "\n".join(lines))
+
+
+def _read_header(path):
+    """
+    Читает заголовок CSV и сопоставляет поля объекта номерам столбцов.
+    :return: Кортеж (номера столбцов в порядке OBJECT_FIELDS, число столбцов)
+    """
+    with open(path, mode='r', newline='', encoding='utf-8-sig') as file:
+        header = [name.strip() for name in next(csv.reader(file), [])]
+    missing = [field for field in OBJECT_FIELDS if field not in header]
+    if missing:
+        raise ObjectFileError(path, [(1, f"нет столбцов: {', '.join(missing)}")])
+    return [header.index(field) for field in OBJECT_FIELDS], len(header)
+
+
+def _read_rows(path, usecols, width):
+    """
+    Медленный построчный разбор модулем csv: числа в кавычках (так пишут Excel и csv.writer)
+    и диагностика ошибок - номера всех строк, которые не удалось разобрать.
+    :return: Кортеж (массив значений строк x поля, список (номер строки в файле, описание ошибки))
+    """
+    rows, errors = [], []
+    with open(path, mode='r', newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for values in reader:
+            line_number = reader.line_num
+            if not any(value.strip() for value in values):
+                continue
+            if len(values) != width:
+                errors.append((line_number, f"ожидалось столбцов: {width}, найдено: {len(values)}"))
+                continue
+            row = []
+            for field, column in zip(OBJECT_FIELDS, usecols):
+                try:
+                    row.append(float(values[column]))
+                except ValueError:
+                    errors.append((line_number, f"{field}: некорректное число '{values[column].strip()}'"))
+                    break
+            else:
+                rows.append(row)
+    return np.array(rows, dtype=float).reshape(-1, len(OBJECT_FIELDS)), errors
+
+
+def read_objects_csv(path):
+    """
+    Разбирает CSV-файл объектов целиком по столбцам (без построчного создания словарей).
+    Пробелы вокруг чисел допускаются (например, '100000 ,200000'). Если быстрый разбор не удался
+    (например, числа в кавычках), файл разбирается построчно модулем csv.
+    :param path: Путь к CSV-файлу с заголовком x,y,height,power,gain,noise_power
+    :return: Словарь {поле: np.ndarray}
+    :raises ObjectFileError: если есть ошибочные строки (с их номерами)
+    """
+    usecols, width = _read_header(path)
+    try:
+        with stage('csv_parse'), warnings.catch_warnings():
+            # Файл только с заголовком - пустой набор объектов, а не предупреждение numpy
+            warnings.simplefilter('ignore', UserWarning)
+            data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=usecols, ndmin=2, encoding='utf-8-sig')
+    except ValueError:
+        with stage('csv_parse_rows'):
+            data, errors = _read_rows(path, usecols, width)
+        if errors:
+            raise ObjectFileError(path, errors) from None
+    data = data.reshape(-1, len(OBJECT_FIELDS))
+    return {field: np.ascontiguousarray(data[:, k]) for k, field in enumerate(OBJECT_FIELDS)}
+
+
+def cache_path(path):
+    """
+    :return: Путь к бинарному кэшу для CSV-файла
+    """
+    return path + CACHE_SUFFIX
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def _read_cache(path):
+    """
+    Возвращает столбцы из кэша или None, если кэша нет, исходный файл изменился
+    или кэш не читается (например, обрезан) - тогда файл разбирается заново и кэш перезаписывается.
+    """
+    try:
+        with np.load(cache_path(path)) as cache:
+            if not np.array_equal(cache['source'], _source_stamp(path)):
+                return None
+            return {field: cache[field] for field in OBJECT_FIELDS}
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile, zlib.error):
+        return None
+
+
+def _write_cache(path, columns):
+    """
+    Сохраняет столбцы в бинарный кэш; ошибки записи (например, нет прав) не мешают загрузке.
+    Кэш сначала пишется во временный файл рядом и затем заменяет старый, поэтому прерванная
+    запись не оставляет обрезанного кэша.
+    """
+    target = cache_path(path)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            np.savez(file, source=_source_stamp(path), **columns)
+        os.replace(temp_path, target)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def load_objects(path, use_cache=True):
+    """
+    Загружает объекты из CSV-файла. Рядом с файлом сохраняется бинарный кэш, и повторное
+    открытие неизменного файла не требует разбора текста.
+    :param path: Путь к CSV-файлу
+    :param use_cache: Использовать ли бинарный кэш
+    :return: Словарь {поле: np.ndarray}
+    """
+    if use_cache:
+        with stage('csv_cache_read'):
+            columns = _read_cache(path)
+        if columns is not None:
+            count('objects_loaded', len(columns['x']))
+            return columns
+    columns = read_objects_csv(path)
+    count('objects_loaded', len(columns['x']))
+    if use_cache:
+        with stage('csv_cache_write'):
+            _write_cache(path, columns)
+    return columns
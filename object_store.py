@@ -0,0 +1,141 @@
+import numpy as np
+
+OBJECT_FIELDS = ('x', 'y', 'height', 'power', 'gain', 'noise_power')
+
+MIN_CAPACITY = 16  # Начальная емкость массивов хранилища
+
+
+class ObjectStore:
+    """
+    Хранилище объектов в виде столбцов: по одному массиву numpy на каждое поле.
+    Заменяет список словарей: объект занимает 6 чисел float64 (48 байт), а расчетные
+    функции получают готовые массивы без обхода словарей.
+    Для совместимости поддерживает len(), индексацию и итерацию, возвращающие словари.
+    """
+
+    def __init__(self, capacity=0):
+        """
+        :param capacity: Начальная емкость (число объектов)
+        """
+        self._size = 0
+        self._columns = {field: np.empty(max(capacity, MIN_CAPACITY)) for field in OBJECT_FIELDS}
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Создает хранилище из готовых столбцов.
+        :param columns: Словарь {поле: массив}; отсутствующие поля заполняются нулями
+        :return: ObjectStore
+        """
+        store = cls()
+        store.extend_columns(columns)
+        return store
+
+    @classmethod
+    def from_objects(cls, objects):
+        """
+        Создает хранилище из списка объектов (словарей).
+        :return: ObjectStore
+        """
+        store = cls(len(objects))
+        store.extend(objects)
+        return store
+
+    def __len__(self):
+        return self._size
+
+    def _check_index(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("индекс объекта вне диапазона")
+        return index
+
+    def __getitem__(self, index):
+        index = self._check_index(index)
+        return {field: float(values[index]) for field, values in self._columns.items()}
+
+    def __iter__(self):
+        columns = [self.column(field).tolist() for field in OBJECT_FIELDS]
+        for values in zip(*columns):
+            yield dict(zip(OBJECT_FIELDS, values))
+
+    def column(self, field):
+        """
+        :param field: Имя поля
+        :return: Массив значений поля (представление, без копирования)
+        """
+        return self._columns[field][:self._size]
+
+    def arrays(self):
+        """
+        :return: Словарь {поле: массив} - представления без копирования
+        """
+        return {field: self.column(field) for field in OBJECT_FIELDS}
+
+    def copy(self):
+        """
+        :return: Независимая копия хранилища (например, для расчета в фоновом потоке)
+        """
+        return ObjectStore.from_columns(self.arrays())
+
+    def _reserve(self, size):
+        """Увеличивает емкость с запасом, чтобы добавление было амортизированно O(1)."""
+        capacity = self._columns['x'].size
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for field, values in self._columns.items():
+            grown = np.empty(capacity)
+            grown[:self._size] = values[:self._size]
+            self._columns[field] = grown
+
+    def append(self, obj):
+        """
+        Добавляет один объект.
+        :param obj: Словарь с параметрами объекта
+        """
+        self._reserve(self._size + 1)
+        for field, values in self._columns.items():
+            values[self._size] = obj.get(field, 0.0)
+        self._size += 1
+
+    def extend(self, objects):
+        """
+        Добавляет список объектов (словарей).
+        """
+        self.extend_columns({field: [obj.get(field, 0.0) for obj in objects] for field in OBJECT_FIELDS})
+
+    def extend_columns(self, columns):
+        """
+        Добавляет объекты сразу столбцами.
+        :param columns: Словарь {поле: массив}; все массивы одной длины, отсутствующие поля - нули
+        """
+        count = len(next(iter(columns.values()))) if columns else 0
+        self._reserve(self._size + count)
+        for field, values in self._columns.items():
+            values[self._size:self._size + count] = columns.get(field, 0.0)
+        self._size += count
+
+    def update(self, index, obj):
+        """
+        Изменяет параметры объекта; отсутствующие в obj поля не меняются.
+        """
+        index = self._check_index(index)
+        for field in OBJECT_FIELDS:
+            if field in obj:
+                self.column(field)[index] = obj[field]
+
+    def remove(self, index):
+        """
+        Удаляет объект; номера следующих объектов уменьшаются на 1.
+        """
+        index = self._check_index(index)
+        for field in OBJECT_FIELDS:
+            values = self._columns[field]
+            values[index:self._size - 1] = values[index + 1:self._size]
+        self._size -= 1
+
+    def clear(self):
+        """Удаляет все объекты."""
+        self._size = 0
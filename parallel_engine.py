@@ -0,0 +1,189 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from emd_engine import (objects_to_arrays, visible_pairs, emd_pairs, emd_pairs_blocked, tile_bounds, fill_row_tile,
+                        load_matrix, EDGE_THRESHOLD, DEFAULT_TILE_SIZE, OBJECT_FIELDS)
+from link_matrix import LinkMatrix
+from instrumentation import stage
+
+TASKS_PER_WORKER = 4  # Число частей на процесс для выравнивания нагрузки
+
+
+def resolve_workers(workers):
+    """
+    Определяет число процессов: None или 0 - по числу ядер.
+    """
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _share(arrays):
+    """
+    Копирует массивы в разделяемую память.
+    :return: Кортеж (блоки SharedMemory, представления массивов, описание для процессов)
+    """
+    blocks, views, spec = [], {}, {}
+    for name, array in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        view[...] = array
+        blocks.append(shm)
+        views[name] = view
+        spec[name] = (shm.name, array.shape, array.dtype.str)
+    return blocks, views, spec
+
+
+def _attach(spec):
+    """
+    Подключается к разделяемой памяти по описанию из _share.
+    :return: Кортеж (блоки SharedMemory, словарь массивов)
+    """
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return blocks, arrays
+
+
+def _release(blocks, views, unlink=False):
+    """Закрывает блоки разделяемой памяти (представления должны быть освобождены раньше)."""
+    views.clear()
+    for shm in blocks:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def _wait_all(futures, progress=None):
+    """
+    Дожидается завершения задач пула, сообщая о ходе расчета по мере их готовности.
+    Если расчет прерван (ошибка в задаче или исключение из progress), еще не начатые задачи отменяются.
+    :param futures: Список задач
+    :param progress: Функция progress(done, total) или None
+    """
+    try:
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            if progress is not None:
+                progress(done, len(futures))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def _pairs_worker(spec, start, stop, frequency, required_snr, weather_loss, with_noise):
+    """Процесс-обработчик: считает ЭМД для пар [start, stop) и пишет результат в разделяемую память."""
+    blocks, arrays = _attach(spec)
+    try:
+        arrays['emd'][start:stop] = emd_pairs(arrays, arrays['src'][start:stop], arrays['dst'][start:stop],
+                                              arrays['distance'][start:stop],
+                                              frequency, required_snr, weather_loss, with_noise)
+    finally:
+        _release(blocks, arrays)
+
+
+def _tile_worker(spec, path, bounds, row_tile, tile_size, frequency, required_snr,
+                 weather_loss, with_noise, decimals):
+    """Процесс-обработчик: считает полосу тайлов и пишет ее прямо в общий файл .npy."""
+    blocks, arrays = _attach(spec)
+    try:
+        matrix = np.load(path, mmap_mode='r+')
+        fill_row_tile(matrix, arrays, bounds, row_tile, tile_size,
+                      frequency, required_snr, weather_loss, with_noise, decimals)
+        del matrix
+    finally:
+        _release(blocks, arrays)
+
+
+def _parallel_emd_pairs(arrays, src, dst, distance, frequency, required_snr, weather_loss, with_noise, workers,
+                        progress=None):
+    """
+    Распределяет расчет ЭМД для набора пар между процессами пула.
+    Входные и выходные массивы передаются через разделяемую память, а не сериализацией.
+    :return: Массив вероятностей ЭМД для каждой пары
+    """
+    size = src.size
+    if workers == 1 or size == 0:
+        return emd_pairs_blocked(arrays, src, dst, distance, frequency, required_snr, weather_loss, with_noise,
+                                 progress)
+
+    shared = {field: arrays[field] for field in OBJECT_FIELDS}
+    shared.update(src=src, dst=dst, distance=distance, emd=np.empty(size))
+    blocks, views, spec = _share(shared)
+    try:
+        chunk = -(-size // (workers * TASKS_PER_WORKER))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_pairs_worker, spec, start, min(start + chunk, size),
+                                   frequency, required_snr, weather_loss, with_noise)
+                       for start in range(0, size, chunk)]
+            # Этапы внутри процессов пула не видны в замерах основного процесса - учитывается общее время
+            with stage('parallel_pairs'):
+                _wait_all(futures, progress)
+        return views['emd'].copy()
+    finally:
+        _release(blocks, views, unlink=True)
+
+
+def parallel_emd_links(objects, frequency, required_snr, weather_loss=0.0, with_noise=True, workers=None,
+                       progress=None):
+    """
+    Параллельный расчет разреженной матрицы ЭМД (см. emd_engine.emd_links).
+    :param workers: Число процессов (None - по числу ядер)
+    :param progress: Функция progress(done, total), вызывается по мере готовности частей
+    :return: LinkMatrix n x n (без округления)
+    """
+    arrays = objects_to_arrays(objects)
+    i, j, distance = visible_pairs(arrays)
+    src = np.concatenate((i, j))
+    dst = np.concatenate((j, i))
+    emd = _parallel_emd_pairs(arrays, src, dst, np.concatenate((distance, distance)),
+                              frequency, required_snr, weather_loss, with_noise, resolve_workers(workers), progress)
+    return LinkMatrix.from_pairs(len(objects), src, dst, emd)
+
+
+def parallel_graph_edges(objects, frequency, required_snr, weather_loss=0.0, with_noise=True,
+                         threshold=EDGE_THRESHOLD, workers=None, progress=None):
+    """
+    Параллельный расчет рёбер графа ЭМД (см. emd_engine.graph_edges).
+    Части собираются в исходном порядке пар, поэтому рёбра совпадают с последовательным расчетом.
+    :param workers: Число процессов (None - по числу ядер)
+    :param progress: Функция progress(done, total), вызывается по мере готовности частей
+    :return: Кортеж массивов (i, j, emd)
+    """
+    arrays = objects_to_arrays(objects)
+    i, j, distance = visible_pairs(arrays)
+    emd = _parallel_emd_pairs(arrays, i, j, distance, frequency, required_snr, weather_loss, with_noise,
+                              resolve_workers(workers), progress)
+    keep = emd > threshold
+    return i[keep], j[keep], emd[keep]
+
+
+def parallel_emd_matrix_tiled(objects, path, frequency, required_snr, weather_loss=0.0, with_noise=True,
+                              tile_size=DEFAULT_TILE_SIZE, decimals=None, workers=None, progress=None):
+    """
+    Параллельный расчет матрицы ЭМД по тайлам в файл .npy (см. emd_engine.emd_matrix_tiled).
+    Каждый процесс считает свои полосы тайлов и пишет их прямо в общий отображаемый в память файл.
+    :param workers: Число процессов (None - по числу ядер)
+    :param progress: Функция progress(done, total), вызывается после каждой готовой полосы тайлов
+    :return: Матрица ЭМД, открытая через np.memmap только для чтения
+    """
+    arrays = objects_to_arrays(objects)
+    n = len(objects)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(n, n))
+    del matrix  # Файл создан; дальше в него пишут процессы пула
+    bounds = tile_bounds(arrays, tile_size)
+    blocks, views, spec = _share(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=resolve_workers(workers)) as pool:
+            futures = [pool.submit(_tile_worker, spec, path, bounds, row_tile, tile_size,
+                                   frequency, required_snr, weather_loss, with_noise, decimals)
+                       for row_tile in range(len(bounds))]
+            with stage('parallel_tiles'):
+                _wait_all(futures, progress)
+    finally:
+        _release(blocks, views, unlink=True)
+    return load_matrix(path)
@@ -0,0 +1,175 @@
+"""
+Надежность сети ретрансляции методом Монте-Карло. ЭМД связи - вероятность того, что замирание
+(нормальная случайная величина, sigma = EMD_SIGMA дБ) не опустит SNR ниже требуемого, поэтому
+в каждом испытании связь работает с вероятностью, равной ее ЭМД, независимо от других связей.
+Испытания считаются пакетами: состояния связей всех испытаний пакета - один массив, а компоненты
+связности всех испытаний находятся одним вызовом scipy для блочно-диагонального графа.
+"""
+import math
+from statistics import NormalDist
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from instrumentation import stage, count
+
+MAX_TRIALS = 10000  # Наибольшее число испытаний
+MIN_TRIALS = 1000  # Раньше этого числа испытаний расчет не останавливается
+PRECISION = 0.005  # Полуширина доверительного интервала, при которой расчет останавливается досрочно
+CONFIDENCE = 0.95  # Доверительная вероятность интервалов
+BATCH_TRIALS = 1000  # Испытаний в пакете (после каждого пакета проверяется точность)
+TRIAL_ELEMENTS = 1 << 24  # Наибольшее число состояний связей (испытания x связи) в пакете
+
+
+class Estimate:
+    """Оценка вероятности по числу успешных испытаний с доверительным интервалом Уилсона."""
+
+    def __init__(self, successes, trials, confidence=CONFIDENCE):
+        self.successes = int(successes)
+        self.trials = int(trials)
+        self.confidence = confidence
+        self.low, self.high = wilson_interval(self.successes, self.trials, confidence)
+
+    @property
+    def probability(self):
+        return self.successes / self.trials if self.trials else 0.0
+
+    @property
+    def half_width(self):
+        return (self.high - self.low) / 2
+
+    def __str__(self):
+        return f"{self.probability:.3f} [{self.low:.3f}; {self.high:.3f}]"
+
+    def __repr__(self):
+        return f"Estimate({self.successes}, {self.trials}, {self.confidence})"
+
+
+def wilson_interval(successes, trials, confidence=CONFIDENCE):
+    """
+    Доверительный интервал Уилсона для вероятности (точнее нормального приближения у 0 и 1).
+    :return: Кортеж (нижняя граница, верхняя граница); (0, 1) при нуле испытаний
+    """
+    if trials == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class ReliabilityResult:
+    """
+    Результат расчета надежности.
+    network - оценка вероятности связности всей сети (все вершины со связями в одной компоненте);
+    pairs - словарь {(источник, приемник): оценка вероятности связи между ними}.
+    """
+
+    def __init__(self, network, pairs, trials):
+        self.network = network
+        self.pairs = pairs
+        self.trials = trials
+
+    def __str__(self):
+        lines = [f"Связность сети: {self.network} ({self.trials} испытаний)"]
+        lines += [f"Связь {s} - {t}: {estimate}" for (s, t), estimate in self.pairs.items()]
+        return "\n".join(lines)
+
+
+def network_reliability(graph, pairs=(), max_trials=MAX_TRIALS, precision=PRECISION, confidence=CONFIDENCE,
+                        min_trials=MIN_TRIALS, seed=None, progress=None):
+    """
+    Оценивает вероятность связности сети и пар вершин при случайных замираниях на связях.
+    Связи с ЭМД = 1 работают всегда: их концы заранее объединяются, и случайными остаются только
+    остальные связи (на практике большинство связей насыщено, поэтому граф испытаний намного меньше).
+    Расчет останавливается, когда полуширина всех доверительных интервалов не больше precision
+    (но не раньше min_trials испытаний), или после max_trials испытаний.
+    :param graph: Граф EmdGraph (graph_analytics), например EmdGraph.from_links(матрица, порог)
+    :param pairs: Список пар вершин (источник, приемник) для оценки достижимости
+    :param max_trials: Наибольшее число испытаний
+    :param precision: Требуемая полуширина доверительного интервала (None - всегда max_trials испытаний)
+    :param confidence: Доверительная вероятность
+    :param min_trials: Наименьшее число испытаний перед досрочной остановкой
+    :param seed: Начальное значение генератора случайных чисел
+    :param progress: Функция progress(done, total) или None; исключение из нее прерывает расчет
+    :return: ReliabilityResult
+    """
+    n = graph.size
+    pairs = [(int(s), int(t)) for s, t in pairs]
+    for s, t in pairs:
+        if not (0 <= s < n and 0 <= t < n):
+            raise ValueError(f"вершины пары ({s}, {t}) должны быть от 0 до {n - 1}")
+    rng = np.random.default_rng(seed)
+
+    # Сжатие надежных связей: вершины, соединенные связями с ЭМД = 1, становятся одной вершиной
+    with stage('monte_carlo_prepare'):
+        certain = graph.emd >= 1.0
+        _, base = connected_components(csr_matrix((np.ones(np.count_nonzero(certain)),
+                                                   (graph.i[certain], graph.j[certain])), shape=(n, n)),
+                                       directed=False)
+        size = int(base.max()) + 1 if n else 0
+        a, b = base[graph.i], base[graph.j]
+        random_edges = (graph.emd > 0) & ~certain & (a != b)
+        a, b, p = a[random_edges], b[random_edges], graph.emd[random_edges]
+        # Связи упорядочены по первой вершине: тогда строки графа испытаний идут по возрастанию
+        # и матрица CSR собирается без сортировки
+        order = np.argsort(a, kind='stable')
+        a, b, p = a[order], b[order], p[order].astype(np.float32)
+        terminals = np.unique(base[graph.nodes()])
+        sources = base[np.array([s for s, _ in pairs], dtype=np.intp)]
+        targets = base[np.array([t for _, t in pairs], dtype=np.intp)]
+    count('monte_carlo_random_links', p.size)
+
+    network_successes = 0
+    pair_successes = np.zeros(len(pairs), dtype=np.int64)
+    trials = 0
+    batch_limit = max(1, min(BATCH_TRIALS, TRIAL_ELEMENTS // max(p.size, 1)))
+    while trials < max_trials:
+        batch = min(batch_limit, max_trials - trials)
+        with stage('monte_carlo'):
+            labels = _trial_components(size, a, b, p, batch, rng)
+            if terminals.size > 1:
+                network_successes += int(np.count_nonzero((labels[:, terminals] == labels[:, terminals[:1]])
+                                                          .all(axis=1)))
+            else:
+                network_successes += batch
+            pair_successes += np.count_nonzero(labels[:, sources] == labels[:, targets], axis=0)
+        trials += batch
+        count('monte_carlo_trials', batch)
+        if progress is not None:
+            progress(trials, max_trials)
+        if precision is not None and trials >= min_trials:
+            widths = [Estimate(k, trials, confidence).half_width
+                      for k in [network_successes] + pair_successes.tolist()]
+            if max(widths) <= precision:
+                break
+
+    return ReliabilityResult(Estimate(network_successes, trials, confidence),
+                             {pair: Estimate(k, trials, confidence)
+                              for pair, k in zip(pairs, pair_successes.tolist())},
+                             trials)
+
+
+def _trial_components(size, a, b, p, batch, rng):
+    """
+    Компоненты связности для пакета испытаний.
+    Испытание r занимает вершины r * size .. (r + 1) * size - 1 общего блочно-диагонального графа.
+    :param size: Число вершин (после сжатия надежных связей)
+    :param a: Первые вершины случайных связей
+    :param b: Вторые вершины
+    :param p: Вероятности работы связей (ЭМД), float32; связи упорядочены по a
+    :param batch: Число испытаний
+    :param rng: Генератор случайных чисел
+    :return: Номера компонент (batch x size); вершины одной компоненты в испытании имеют равные номера
+    """
+    # Точности float32 достаточно для сравнения с ЭМД, а случайные числа получаются вдвое быстрее
+    trial, edge = np.nonzero(rng.random((batch, p.size), dtype=np.float32) < p)
+    offset = trial * size
+    rows = offset + a[edge]
+    indptr = np.zeros(batch * size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=batch * size), out=indptr[1:])
+    graph = csr_matrix((np.ones(edge.size, dtype=np.int8), offset + b[edge], indptr),
+                       shape=(batch * size, batch * size))
+    _, labels = connected_components(graph, directed=False)
+    return labels.reshape(batch, size)
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import zipfile
+import zlib
+import numpy as np
+from emd_engine import objects_to_arrays
+from link_matrix import LinkMatrix
+from object_store import OBJECT_FIELDS
+from instrumentation import stage, count
+
+CACHE_DIR_ENV = 'EMD_CACHE_DIR'  # Переменная окружения с каталогом кэша результатов
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'emd_results')
+MAX_BYTES = 1 << 30  # Предельный размер кэша на диске; при превышении удаляются давно не использованные
+ENTRY_SUFFIX = '.npz'
+FORMAT_VERSION = 1  # Меняется при изменении модели расчета, чтобы старые результаты не использовались
+
+
+def objects_digest(objects, terrain=None):
+    """
+    Хэш данных объектов: любое изменение объектов дает другой ключ, поэтому устаревшие
+    результаты никогда не читаются (они вытесняются из кэша как давно не использованные).
+    :param objects: Объекты (список словарей, ObjectStore или словарь столбцов)
+    :param terrain: Рельеф (terrain.Terrain), с которым рассчитываются результаты, или None
+    :return: Шестнадцатеричная строка SHA-256
+    """
+    arrays = objects if isinstance(objects, dict) else objects_to_arrays(objects)
+    digest = hashlib.sha256()
+    with stage('result_cache_hash'):
+        for field in OBJECT_FIELDS:
+            column = np.ascontiguousarray(arrays[field], dtype=np.float64)
+            digest.update(field.encode())
+            digest.update(column.size.to_bytes(8, 'little'))
+            digest.update(column.tobytes())
+    if terrain is not None:
+        digest.update(b'terrain' + terrain.digest().encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш результатов расчета на диске, адресуемый по содержимому: ключ - хэш данных объектов
+    и параметров сценария. Каждая запись - отдельный файл .npz; время изменения файла
+    обновляется при чтении, и при превышении max_bytes удаляются записи, которые дольше
+    всего не использовались (LRU).
+    """
+
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        """
+        :param directory: Каталог кэша (по умолчанию - из EMD_CACHE_DIR или ~/.cache/emd_results)
+        :param max_bytes: Предельный размер кэша (байт)
+        """
+        self.directory = directory or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(digest, kind, *params):
+        """
+        :param digest: Хэш объектов (objects_digest)
+        :param kind: Вид результата ('links', 'edges')
+        :param params: Параметры сценария (частота, требуемый SNR, потери из-за погоды, учет помехи...)
+        :return: Ключ записи
+        """
+        text = f"{FORMAT_VERSION}|{digest}|{kind}|" + "|".join(repr(float(value)) for value in params)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """
+        :param key: Ключ записи
+        :return: Словарь {имя: np.ndarray} или None, если записи нет (или она повреждена - тогда она удаляется)
+        """
+        path = self._path(key)
+        try:
+            with stage('result_cache_read'), np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except FileNotFoundError:
+            count('result_cache_misses')
+            return None
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile, zlib.error):
+            count('result_cache_misses')
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # Отметка использования для вытеснения LRU
+        except OSError:
+            pass
+        count('result_cache_hits')
+        return arrays
+
+    def put(self, key, **arrays):
+        """
+        Сохраняет запись; ошибки записи (нет места, нет прав) не мешают расчету.
+        Запись сначала пишется во временный файл, поэтому прерванная запись не оставляет
+        поврежденных файлов, а одновременные запуски не мешают друг другу.
+        :param key: Ключ записи
+        :param arrays: Сохраняемые массивы
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with stage('result_cache_write'):
+                with open(temp_path, 'wb') as file:
+                    np.savez(file, **arrays)
+                os.replace(temp_path, path)
+            self.evict()
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока размер кэша превышает max_bytes."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Удаляет все записи."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def get_links(self, key):
+        """
+        :return: LinkMatrix или None
+        """
+        arrays = self.get(key)
+        if arrays is None:
+            return None
+        return LinkMatrix(int(arrays['size']), arrays['indptr'], arrays['indices'], arrays['data'])
+
+    def put_links(self, key, matrix):
+        """
+        :param matrix: LinkMatrix
+        """
+        self.put(key, size=np.array(matrix.size), indptr=matrix.indptr, indices=matrix.indices, data=matrix.data)
+
+    def get_edges(self, key):
+        """
+        :return: Кортеж массивов (i, j, emd) или None
+        """
+        arrays = self.get(key)
+        if arrays is None:
+            return None
+        return arrays['i'], arrays['j'], arrays['emd']
+
+    def put_edges(self, key, i, j, emd):
+        self.put(key, i=i, j=j, emd=emd)
+
+
+def links_key(digest, frequency, required_snr, weather_loss=0.0, with_noise=True):
+    """Ключ матрицы ЭМД (LinkMatrix без округления) одного сценария."""
+    return ResultCache.key(digest, 'links', frequency, required_snr, weather_loss, with_noise)
+
+
+def edges_key(digest, frequency, required_snr, weather_loss=0.0, with_noise=True, threshold=0.0):
+    """Ключ рёбер графа ЭМД (i < j) одного сценария."""
+    return ResultCache.key(digest, 'edges', frequency, required_snr, weather_loss, with_noise, threshold)
+
+
+def iter_cached_links(cache, digest, scenarios, compute, with_noise=True):
+    """
+    Матрицы ЭМД сценариев в исходном порядке: найденные в кэше читаются с диска,
+    остальные рассчитываются одним вызовом compute и сохраняются.
+    :param cache: ResultCache
+    :param digest: Хэш объектов (objects_digest)
+    :param scenarios: Список кортежей (частота, требуемый SNR, потери из-за погоды)
+    :param compute: Функция compute(список сценариев) -> итератор (сценарий, LinkMatrix) в том же порядке
+    :param with_noise: Учитывать ли мощность помехи передающего объекта
+    :return: Генератор кортежей (сценарий, LinkMatrix)
+    """
+    keys = [links_key(digest, *scenario, with_noise) for scenario in scenarios]
+    cached = [key in cache for key in keys]
+    missing = [scenario for scenario, hit in zip(scenarios, cached) if not hit]
+    count('result_cache_misses', len(missing))
+    computed = iter(compute(missing)) if missing else iter(())
+    for scenario, key, hit in zip(scenarios, keys, cached):
+        matrix = cache.get_links(key) if hit else None
+        if matrix is None:
+            if hit:
+                # Запись вытеснена другим процессом между проверкой и чтением
+                _, matrix = next(iter(compute([scenario])))
+            else:
+                _, matrix = next(computed)
+            cache.put_links(key, matrix)
+        yield scenario, matrix
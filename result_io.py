@@ -0,0 +1,169 @@
+import zipfile
+import numpy as np
+from link_matrix import LinkMatrix, QuantizedLinkMatrix, QUANTIZED_DTYPES
+from instrumentation import stage
+
+MATRIX_ROWS = 256  # Сколько строк плотной матрицы разворачивать за раз при записи CSV
+EDGES_SUFFIX = '.edges.npz'  # Список рёбер (i, j, ЭМД) вместо матрицы CSR
+SCENARIO_FIELDS = ('frequency', 'required_snr', 'weather_loss')
+
+
+def write_matrix_csv(out, matrix, fmt='%.2f', header=None, chunk_rows=MATRIX_ROWS):
+    """
+    Записывает матрицу в CSV частями по chunk_rows строк: текст всей матрицы в памяти не создается.
+    :param out: Открытый текстовый файл
+    :param matrix: LinkMatrix, массив numpy или np.memmap
+    :param fmt: Формат чисел
+    :param header: Заголовок (список имен столбцов); по умолчанию Column 0, Column 1, ...
+    :param chunk_rows: Число строк в блоке
+    """
+    n_rows = len(matrix)
+    n_cols = matrix.shape[1] if n_rows else 0
+    if header is None:
+        header = [f"Column {i}" for i in range(n_cols)]
+    out.write(",".join(header) + "\n")
+    with stage('write_csv'):
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            if isinstance(matrix, LinkMatrix):
+                first, last = matrix.indptr[start], matrix.indptr[stop]
+                rows = np.repeat(np.arange(stop - start), np.diff(matrix.indptr[start:stop + 1]))
+                block = np.zeros((stop - start, n_cols))
+                block[rows, matrix.indices[first:last]] = matrix.data_slice(first, last)
+            else:
+                block = np.asarray(matrix[start:stop], dtype=float)
+            np.savetxt(out, block, fmt=fmt, delimiter=',')
+
+
+def _index_dtype(size):
+    return np.int32 if size < 2 ** 31 else np.int64
+
+
+class NpzWriter:
+    """
+    Потоковая запись архива .npz (сжатого): массивы добавляются по одному и сразу уходят на диск,
+    поэтому в памяти находится только текущий массив. Файл читается обычным np.load.
+    """
+
+    def __init__(self, path, compress=True):
+        self._zip = zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_DEFLATED if compress
+                                    else zipfile.ZIP_STORED, allowZip64=True)
+
+    def write(self, name, array):
+        """
+        :param name: Имя массива в архиве
+        :param array: Массив numpy
+        """
+        with self._zip.open(name + '.npy', mode='w', force_zip64=True) as member:
+            np.lib.format.write_array(member, np.asanyarray(array), allow_pickle=False)
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def write_results_npz(path, kind, size, results, compress=True):
+    """
+    Записывает результаты нескольких сценариев в один архив .npz по мере их расчета.
+    :param path: Путь к файлу
+    :param kind: 'links' - матрицы LinkMatrix (CSR); 'edges' - списки рёбер (i, j, ЭМД); 'dense' - массивы
+    :param size: Число объектов n
+    :param results: Итерируемая последовательность (сценарий или None, результат)
+    :param compress: Сжимать ли архив
+    :return: Число записанных сценариев
+    """
+    scenarios = []
+    index_dtype = _index_dtype(size)
+    with NpzWriter(path, compress) as writer:
+        for k, (scenario, result) in enumerate(results):
+            scenarios.append(scenario if scenario is not None else (np.nan,) * len(SCENARIO_FIELDS))
+            if kind == 'links':
+                writer.write(f'indptr_{k}', result.indptr.astype(_index_dtype(result.nnz), copy=False))
+                writer.write(f'indices_{k}', result.indices.astype(index_dtype, copy=False))
+                # Компактная матрица сохраняется без распаковки: uint8 (сотые доли) или float16
+                writer.write(f'data_{k}', result.codes if isinstance(result, QuantizedLinkMatrix) else result.data)
+            elif kind == 'edges':
+                i, j, emd = result
+                writer.write(f'i_{k}', i.astype(index_dtype, copy=False))
+                writer.write(f'j_{k}', j.astype(index_dtype, copy=False))
+                writer.write(f'emd_{k}', emd)
+            else:
+                writer.write(f'values_{k}', result)
+        writer.write('kind', np.array(kind))
+        writer.write('size', np.array(size))
+        writer.write('scenarios', np.array(scenarios, dtype=float).reshape(-1, len(SCENARIO_FIELDS)))
+    return len(scenarios)
+
+
+def iter_results_npz(path):
+    """
+    Читает архив write_results_npz по одному сценарию, без разбора текста.
+    :param path: Путь к файлу
+    :return: Кортеж (вид результата, число объектов, генератор пар (сценарий или None, результат))
+    """
+    with np.load(path) as archive:
+        kind = str(archive['kind'])
+        size = int(archive['size'])
+        scenarios = archive['scenarios']
+
+    def results():
+        # Архив открывается заново: массивы сценариев читаются только при переходе к ним
+        with np.load(path) as archive:
+            for k, scenario in enumerate(scenarios.tolist()):
+                scenario = None if np.isnan(scenario).all() else tuple(scenario)
+                if kind == 'links':
+                    indptr, indices, data = (archive[f'{name}_{k}'] for name in ('indptr', 'indices', 'data'))
+                    if data.dtype in QUANTIZED_DTYPES:
+                        yield scenario, QuantizedLinkMatrix(size, indptr.astype(np.intp), indices, data)
+                    else:
+                        yield scenario, LinkMatrix(size, indptr.astype(np.intp), indices.astype(np.intp), data)
+                elif kind == 'edges':
+                    yield scenario, (archive[f'i_{k}'].astype(np.intp), archive[f'j_{k}'].astype(np.intp),
+                                     archive[f'emd_{k}'])
+                else:
+                    yield scenario, archive[f'values_{k}']
+    return kind, size, results()
+
+
+def export_matrix(path, matrix, fmt='%.2f', header=None, encoding='utf-8'):
+    """
+    Сохраняет матрицу в формате по расширению файла:
+    .edges.npz - список связей (i, j, ЭМД); .npz - сжатая разреженная матрица (или массив);
+    иначе - CSV, записываемый по частям.
+    :param path: Путь к файлу
+    :param matrix: LinkMatrix или массив numpy (например, временная матрица)
+    :param fmt: Формат чисел в CSV
+    :param header: Заголовок CSV
+    :param encoding: Кодировка CSV
+    """
+    if path.endswith(EDGES_SUFFIX):
+        if not isinstance(matrix, LinkMatrix):
+            matrix = LinkMatrix.from_dense(matrix)
+        write_results_npz(path, 'edges', len(matrix), [(None, matrix.to_coo())])
+    elif path.endswith('.npz'):
+        kind = 'links' if isinstance(matrix, LinkMatrix) else 'dense'
+        write_results_npz(path, kind, len(matrix), [(None, matrix)])
+    else:
+        with open(path, mode='w', newline='', encoding=encoding) as file:
+            write_matrix_csv(file, matrix, fmt, header)
+
+
+def import_matrix(path, encoding='utf-8'):
+    """
+    Загружает матрицу, сохраненную export_matrix (для нескольких сценариев - первую).
+    :param path: Путь к файлу
+    :return: LinkMatrix (для .npz с матрицей или списком связей) или массив numpy
+    """
+    if path.endswith('.npz'):
+        kind, size, results = iter_results_npz(path)
+        for _, result in results:
+            results.close()
+            return LinkMatrix.from_pairs(size, *result) if kind == 'edges' else result
+        raise ValueError(f"{path}: нет данных")
+    return np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2, encoding=encoding)
@@ -0,0 +1,70 @@
+import numpy as np
+
+MAX_CELLS_PER_AXIS = 1_000_000  # Ограничение размера сетки, чтобы ключи ячеек не переполняли int64
+
+# Половина окрестности 3x3: каждая пара соседних ячеек просматривается ровно один раз
+_HALF_NEIGHBOURHOOD = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def _expand_ranges(lo, hi):
+    """
+    Разворачивает набор полуинтервалов [lo[k], hi[k]) в плоский массив позиций.
+    :return: Кортеж (номер интервала, позиция) для каждого элемента
+    """
+    counts = hi - lo
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(lo.size), counts)
+    starts = np.cumsum(counts) - counts
+    position = np.arange(total) - np.repeat(starts, counts) + np.repeat(lo, counts)
+    return owner, position
+
+
+def candidate_pairs(x, y, reach):
+    """
+    Возвращает пары объектов, которые могут находиться в зоне прямой видимости.
+    Объекты раскладываются по равномерной сетке с шагом 2 * max(reach), поэтому любая пара
+    с расстоянием не больше reach[i] + reach[j] гарантированно попадает в соседние ячейки.
+    Результат - надмножество видимых пар; точную проверку расстояния выполняет вызывающий код.
+    :param x: Координаты x объектов
+    :param y: Координаты y объектов (в тех же единицах, что и x)
+    :param reach: Максимальная дальность каждого объекта (в тех же единицах)
+    :return: Кортеж массивов (i, j), i < j, упорядоченный по (i, j)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if n < 2:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+
+    extent = max(np.ptp(x), np.ptp(y))
+    cell = max(2 * float(np.max(reach)), extent / MAX_CELLS_PER_AXIS)
+    if cell == 0:
+        cell = 1.0  # Все объекты в одной точке
+
+    # Сдвиг на 1 оставляет запас под соседние ячейки без наложения ключей
+    cx = np.floor((x - x.min()) / cell).astype(np.int64) + 1
+    cy = np.floor((y - y.min()) / cell).astype(np.int64) + 1
+    rows = int(cy.max()) + 2
+    keys = cx * rows + cy
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs_i, pairs_j = [], []
+    for ox, oy in _HALF_NEIGHBOURHOOD:
+        target = (cx + ox) * rows + (cy + oy)
+        lo = np.searchsorted(sorted_keys, target, side='left')
+        hi = np.searchsorted(sorted_keys, target, side='right')
+        src, position = _expand_ranges(lo, hi)
+        dst = order[position]
+        if (ox, oy) == (0, 0):
+            keep = src < dst
+            src, dst = src[keep], dst[keep]
+        pairs_i.append(np.minimum(src, dst))
+        pairs_j.append(np.maximum(src, dst))
+
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    order = np.lexsort((j, i))
+    return i[order], j[order]
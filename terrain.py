@@ -0,0 +1,231 @@
+"""
+Учет рельефа по цифровой модели высот (DEM) в формате ESRI BIL: двоичный растр высот (.bil)
+с текстовым заголовком (.hdr) рядом. Растр открывается через np.memmap и не загружается в память
+целиком: при расчете читаются только страницы файла, через которые проходят трассы связей.
+Координаты растра - в тех же метрах, что и координаты объектов (x, y), высоты - в метрах.
+"""
+import hashlib
+import os
+import numpy as np
+from emd_engine import EARTH_RADIUS
+from instrumentation import stage, count
+
+HEADER_SUFFIX = '.hdr'
+MAX_PROFILE_SAMPLES = 512  # Наибольшее число точек профиля трассы; для длинных трасс шаг больше ячейки растра
+PROFILE_ELEMENTS = 1 << 20  # Сколько точек профилей (трассы x точки) обрабатывать за один шаг
+FRESNEL_CLEARANCE = 0.6  # Доля первой зоны Френеля, которая должна быть свободна от препятствий
+
+# Тип значений растра по (NBITS, PIXELTYPE) заголовка
+_PIXEL_TYPES = {
+    (8, 'UNSIGNEDINT'): 'u1', (8, 'SIGNEDINT'): 'i1',
+    (16, 'UNSIGNEDINT'): 'u2', (16, 'SIGNEDINT'): 'i2',
+    (32, 'UNSIGNEDINT'): 'u4', (32, 'SIGNEDINT'): 'i4',
+    (32, 'FLOAT'): 'f4', (64, 'FLOAT'): 'f8',
+}
+
+
+def read_header(path):
+    """
+    Читает заголовок ESRI BIL (строки "КЛЮЧ значение").
+    :param path: Путь к файлу .hdr
+    :return: Словарь {ключ в верхнем регистре: строка значения}
+    """
+    header = {}
+    with open(path, mode='r', encoding='utf-8') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) >= 2:
+                header[parts[0].upper()] = parts[1]
+    return header
+
+
+class Terrain:
+    """
+    Растр высот, отображенный в память. Строка 0 - северный край растра (наибольший y).
+    """
+
+    def __init__(self, path, rows, cols, x0, y0, cell_size, dtype=np.int16, nodata=None):
+        """
+        :param path: Путь к двоичному файлу растра (строки подряд, без заголовка)
+        :param rows: Число строк
+        :param cols: Число столбцов
+        :param x0: Координата x центра левой верхней ячейки (м)
+        :param y0: Координата y центра левой верхней ячейки (м)
+        :param cell_size: Размер ячейки (м): число или пара (по x, по y)
+        :param dtype: Тип значений (с порядком байтов)
+        :param nodata: Значение "нет данных" (считается нулевой высотой)
+        """
+        if rows < 2 or cols < 2:
+            raise ValueError(f"{path}: растр должен быть не меньше 2 x 2")
+        self.path = path
+        self.rows, self.cols = rows, cols
+        self.x0, self.y0 = float(x0), float(y0)
+        if np.isscalar(cell_size):
+            cell_size = (cell_size, cell_size)
+        self.cell_x, self.cell_y = float(cell_size[0]), float(cell_size[1])
+        self.nodata = nodata
+        self.heights = np.memmap(path, dtype=np.dtype(dtype), mode='r', shape=(rows, cols))
+        self._flat = self.heights.reshape(-1)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Открывает растр ESRI BIL по заголовку .hdr с тем же именем.
+        :param path: Путь к файлу .bil
+        :return: Terrain
+        """
+        header = read_header(os.path.splitext(path)[0] + HEADER_SUFFIX)
+        try:
+            bits = int(header.get('NBITS', 8))
+            pixel_type = header.get('PIXELTYPE', 'FLOAT' if bits == 64 else 'SIGNEDINT').upper()
+            dtype = np.dtype(_PIXEL_TYPES[bits, pixel_type])
+            if int(header.get('NBANDS', 1)) != 1:
+                raise ValueError("поддерживается только один канал")
+            if header.get('BYTEORDER', 'I').upper() in ('M', 'MSBFIRST'):
+                dtype = dtype.newbyteorder('>')
+            else:
+                dtype = dtype.newbyteorder('<')
+            nodata = float(header['NODATA']) if 'NODATA' in header else None
+            return cls(path, int(header['NROWS']), int(header['NCOLS']), float(header['ULXMAP']),
+                       float(header['ULYMAP']), (float(header['XDIM']), float(header['YDIM'])), dtype, nodata)
+        except KeyError as e:
+            raise ValueError(f"{path}: в заголовке нет поля или неподдерживаемый тип: {e}") from None
+
+    def digest(self):
+        """
+        Отпечаток растра для ключей кэша результатов: параметры растра, размер и время изменения файла
+        (содержимое большого растра не хэшируется).
+        """
+        stat = os.stat(self.path)
+        text = (f"{os.path.abspath(self.path)}|{self.rows}|{self.cols}|{self.x0!r}|{self.y0!r}|{self.cell_x!r}|"
+                f"{self.cell_y!r}|{self.heights.dtype.str}|{self.nodata!r}|{stat.st_size}|{stat.st_mtime_ns}")
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def elevation(self, x, y):
+        """
+        Высота рельефа в точках (билинейная интерполяция). Вне растра и в ячейках без данных - 0.
+        :param x: Координаты x (м), массив
+        :param y: Координаты y (м), массив той же формы
+        :return: Массив высот (м)
+        """
+        col = (np.asarray(x, dtype=float) - self.x0) / self.cell_x
+        row = (self.y0 - np.asarray(y, dtype=float)) / self.cell_y
+        inside = (col >= 0) & (col <= self.cols - 1) & (row >= 0) & (row <= self.rows - 1)
+        c0 = np.clip(np.floor(col), 0, self.cols - 2).astype(np.intp)
+        r0 = np.clip(np.floor(row), 0, self.rows - 2).astype(np.intp)
+        fc = col - c0
+        fr = row - r0
+        base = r0 * self.cols + c0
+        # Из файла читаются только нужные значения (страницы отображения), а не весь растр
+        corners = [self._read(base + offset) for offset in (0, 1, self.cols, self.cols + 1)]
+        top = corners[0] + (corners[1] - corners[0]) * fc
+        bottom = corners[2] + (corners[3] - corners[2]) * fc
+        return np.where(inside, top + (bottom - top) * fr, 0.0)
+
+    def _read(self, index):
+        values = np.asarray(self._flat[index], dtype=float)
+        if self.nodata is not None:
+            values[values == self.nodata] = 0.0
+        return values
+
+    def obstruction(self, arrays, i, j, distance):
+        """
+        Наибольший параметр препятствия на трассах пар (i, j): для каждой точки профиля -
+        превышение рельефа (с учетом кривизны Земли) над прямой между антеннами h, умноженное
+        на sqrt(2 d / (d1 d2)). Параметр дифракции Френеля-Кирхгофа v = obstruction / sqrt(длина волны),
+        поэтому величина не зависит от частоты и считается один раз для всех сценариев.
+        Значение симметрично: для пар (i, j) и (j, i) оно одинаково.
+        :param arrays: Словарь массивов объектов (см. emd_engine.objects_to_arrays)
+        :param i: Индексы первых объектов пар
+        :param j: Индексы вторых объектов пар
+        :param distance: Расстояния (км)
+        :return: Массив параметров препятствия (м^0.5); отрицательный - трасса открыта
+        """
+        x, y = arrays['x'], arrays['y']
+        d = np.asarray(distance, dtype=float) * 1000
+        result = np.full(d.size, -np.inf)
+        if not d.size:
+            return result
+        with stage('terrain_profiles'):
+            # Высота антенн над уровнем моря: рельеф в точке объекта плюс высота антенны
+            z = self.elevation(x, y) + arrays['height']
+            step = min(self.cell_x, self.cell_y)
+            needed = np.clip(np.ceil(d / step) - 1, 1, MAX_PROFILE_SAMPLES)
+            # Трассы группируются по числу точек (степени двойки), чтобы считать их одним массивом
+            levels = 2 ** np.ceil(np.log2(needed)).astype(np.intp)
+            order = np.argsort(levels, kind='stable')
+            bounds = np.flatnonzero(np.diff(levels[order])) + 1
+            for group in np.split(order, bounds):
+                samples = int(levels[group[0]])
+                chunk = max(1, PROFILE_ELEMENTS // samples)
+                for start in range(0, group.size, chunk):
+                    k = group[start:start + chunk]
+                    result[k] = self._profile_obstruction(x[i[k]], y[i[k]], z[i[k]], x[j[k]], y[j[k]], z[j[k]],
+                                                          d[k], samples)
+                    count('terrain_samples', k.size * samples)
+        result[d == 0] = -np.inf
+        return result
+
+    def _profile_obstruction(self, xa, ya, za, xb, yb, zb, d, samples):
+        """Параметр препятствия для группы трасс с одинаковым числом точек профиля."""
+        t = np.arange(1, samples + 1) / (samples + 1)
+        ground = self.elevation(xa[:, None] + (xb - xa)[:, None] * t, ya[:, None] + (yb - ya)[:, None] * t)
+        d1 = d[:, None] * t
+        d2 = d[:, None] - d1
+        # Кривизна Земли (эквивалентный радиус): рельеф в середине трассы "поднимается"
+        ground += d1 * d2 / (2 * EARTH_RADIUS * 1000)
+        ground -= za[:, None] + (zb - za)[:, None] * t
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ground *= np.sqrt(2 * d[:, None] / (d1 * d2))
+        return ground.max(axis=1)
+
+    def directed_obstruction(self, arrays, src, dst, distance):
+        """
+        Параметры препятствия для направленных пар (см. emd_engine.directed_pairs): профиль каждой
+        трассы строится один раз, значение для обратного направления берется от прямого.
+        :return: Массив той же длины, что src
+        """
+        src, dst = np.asarray(src), np.asarray(dst)
+        # Набор пар симметричен: после сортировки по (dst, src) на месте m оказывается пара,
+        # обратная паре m в порядке (src, dst)
+        reverse = np.lexsort((src, dst))
+        forward = src < dst
+        result = np.empty(src.size)
+        result[forward] = self.obstruction(arrays, src[forward], dst[forward], np.asarray(distance)[forward])
+        result[~forward] = result[reverse[~forward]]
+        return result
+
+
+def fresnel_clearance(obstruction, frequency):
+    """
+    Запас просвета на трассе в долях радиуса первой зоны Френеля в самой закрытой точке.
+    Трасса считается открытой, если запас не меньше FRESNEL_CLEARANCE.
+    :param obstruction: Параметры препятствия (Terrain.obstruction)
+    :param frequency: Частота (МГц)
+    :return: Массив долей (отрицательные - препятствие выше прямой видимости)
+    """
+    wavelength = 300 / np.asarray(frequency, dtype=float)
+    return -np.asarray(obstruction) / np.sqrt(2 * wavelength)
+
+
+def write_dem(path, heights, x0, y0, cell_size, nodata=None):
+    """
+    Записывает растр высот в формате ESRI BIL (.bil и заголовок .hdr), например для подготовки
+    фрагмента карты или проверки расчета на синтетическом рельефе.
+    :param path: Путь к файлу .bil
+    :param heights: Двумерный массив высот (м), строка 0 - северный край
+    :param x0: Координата x центра левой верхней ячейки (м)
+    :param y0: Координата y центра левой верхней ячейки (м)
+    :param cell_size: Размер ячейки (м)
+    :param nodata: Значение "нет данных"
+    """
+    heights = np.asarray(heights)
+    pixel_type = {'i': 'SIGNEDINT', 'u': 'UNSIGNEDINT', 'f': 'FLOAT'}[heights.dtype.kind]
+    heights.astype(heights.dtype.newbyteorder('<'), copy=False).tofile(path)
+    lines = ["BYTEORDER I", "LAYOUT BIL", f"NROWS {heights.shape[0]}", f"NCOLS {heights.shape[1]}", "NBANDS 1",
+             f"NBITS {heights.dtype.itemsize * 8}", f"PIXELTYPE {pixel_type}", f"ULXMAP {x0!r}", f"ULYMAP {y0!r}",
+             f"XDIM {cell_size!r}", f"YDIM {cell_size!r}"]
+    if nodata is not None:
+        lines.append(f"NODATA {nodata!r}")
+    with open(os.path.splitext(path)[0] + HEADER_SUFFIX, mode='w', encoding='utf-8') as file:
+        file.write("\n".join(lines) + "\n")
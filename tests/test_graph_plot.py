@@ -0,0 +1,46 @@
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from graph_analytics import EmdGraph
+from graph_plot import GraphPlot, DENSE_EDGES
+
+
+def _objects(n, rng):
+    return [{'x': float(x), 'y': float(y), 'height': 10.0, 'power': 1.0, 'gain': 1.0, 'noise_power': 0.0}
+            for x, y in rng.random((n, 2)) * 10000]
+
+
+def test_dense_graph_edges_are_capped():
+    rng = np.random.default_rng(0)
+    n = 300
+    i, j = np.triu_indices(n, 1)
+    emd = rng.random(i.size)
+    assert i.size > DENSE_EDGES
+    ax = Figure().add_subplot()
+    plot = GraphPlot(ax, max_edges=1000)
+    plot.update(EmdGraph(n, i, j, emd), _objects(n, rng))
+
+    segments = plot.edges.get_segments()
+    assert len(segments) == 1000
+    # Рисуются рёбра с наибольшей ЭМД
+    assert np.min(plot.edges.get_array()) >= np.sort(emd)[-1000]
+
+    # После приближения - только рёбра, задевающие видимую область, и не больше max_edges
+    ax.set_xlim(4000, 4500)
+    ax.set_ylim(4000, 4500)
+    segments = plot.edges.get_segments()
+    assert 0 < len(segments) <= 1000
+    for segment in segments:
+        assert segment[:, 0].max() >= 4000 and segment[:, 0].min() <= 4500
+        assert segment[:, 1].max() >= 4000 and segment[:, 1].min() <= 4500
+
+
+def test_sparse_graph_draws_all_edges():
+    rng = np.random.default_rng(1)
+    n = 50
+    i, j = np.triu_indices(n, 1)
+    plot = GraphPlot(Figure().add_subplot())
+    plot.update(EmdGraph(n, i, j, rng.random(i.size)), _objects(n, rng))
+    assert len(plot.edges.get_segments()) == i.size
@@ -0,0 +1,38 @@
+import csv
+import warnings
+import numpy as np
+import pytest
+from object_io import read_objects_csv, load_objects, ObjectFileError
+from object_store import OBJECT_FIELDS
+
+ROWS = [[100000, 200000, 30, 10, 3, -90], [150000.5, 250000, 25, 12, 5, -95]]
+
+
+def test_quoted_numbers(tmp_path):
+    path = tmp_path / "objects.csv"
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+        writer.writerow(OBJECT_FIELDS)
+        writer.writerows(ROWS)
+
+    columns = read_objects_csv(str(path))
+    for k, field in enumerate(OBJECT_FIELDS):
+        np.testing.assert_array_equal(columns[field], [row[k] for row in ROWS])
+
+
+def test_quoted_bad_number_is_reported(tmp_path):
+    path = tmp_path / "objects.csv"
+    path.write_text(",".join(OBJECT_FIELDS) + '\n"1","2","3","4","5","6"\n"1","abc","3","4","5","6"\n',
+                    encoding='utf-8')
+    with pytest.raises(ObjectFileError) as error:
+        read_objects_csv(str(path))
+    assert error.value.errors == [(3, "y: некорректное число 'abc'")]
+
+
+def test_header_only_file(tmp_path):
+    path = tmp_path / "objects.csv"
+    path.write_text(",".join(OBJECT_FIELDS) + "\n", encoding='utf-8')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        columns = load_objects(str(path))
+    assert all(columns[field].shape == (0,) for field in OBJECT_FIELDS)
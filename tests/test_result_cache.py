@@ -0,0 +1,19 @@
+import os
+import numpy as np
+from result_cache import ResultCache
+
+
+def test_truncated_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.key('digest', 'edges', 400.0, 10.0)
+    cache.put(key, emd=np.linspace(0, 1, 10000))
+    assert cache.get(key) is not None
+
+    path = cache._path(key)
+    with open(path, 'rb') as file:
+        data = file.read()
+    with open(path, 'wb') as file:
+        file.write(data[:len(data) // 2])
+
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
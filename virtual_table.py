@@ -0,0 +1,88 @@
+import tkinter as tk
+from tkinter import ttk
+from emd_engine import objects_to_arrays
+from object_store import OBJECT_FIELDS
+
+TABLE_COLUMNS = ("ID", "x", "y", "Height", "Power", "Gain", "Noise Power")
+
+
+class VirtualTable:
+    """
+    Виртуализированная таблица объектов: строки Treeview создаются только для видимой
+    области, а при прокрутке в них подставляются значения из хранилища объектов.
+    Число виджетов не зависит от числа объектов, поэтому таблица не тормозит и при 1 млн строк.
+    """
+
+    def __init__(self, master, objects, height=10):
+        """
+        :param master: Родительский виджет
+        :param objects: Хранилище объектов (ObjectStore или список словарей)
+        :param height: Число видимых строк
+        """
+        self.objects = objects
+        self.height = height
+        self.first = 0  # Номер первого видимого объекта
+        self._items = []
+
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=TABLE_COLUMNS, show="headings", height=height)
+        for column in TABLE_COLUMNS:
+            self.tree.heading(column, text=column)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.first - 3))  # Прокрутка в Linux
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.first + 3))
+        self.refresh()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def refresh(self):
+        """Перерисовывает видимые строки (после загрузки или изменения объектов)."""
+        self.scroll_to(self.first)
+
+    def show_last(self):
+        """Прокручивает таблицу к последнему объекту (после добавления)."""
+        self.scroll_to(len(self.objects))
+
+    def scroll_to(self, first):
+        """
+        Показывает объекты начиная с номера first.
+        :param first: Номер первого видимого объекта
+        """
+        total = len(self.objects)
+        self.first = max(0, min(int(first), total - self.height))
+        count = min(self.height, total - self.first)
+
+        while len(self._items) > count:
+            self.tree.delete(self._items.pop())
+        while len(self._items) < count:
+            self._items.append(self.tree.insert("", "end"))
+
+        if count:
+            arrays = objects_to_arrays(self.objects)
+            end = self.first + count
+            columns = [arrays[field][self.first:end].tolist() for field in OBJECT_FIELDS]
+            for offset, (item, values) in enumerate(zip(self._items, zip(*columns))):
+                self.tree.item(item, values=(self.first + offset,) + values)
+
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        total = len(self.objects)
+        if action == "moveto":
+            self.scroll_to(float(value) * total)
+        elif action == "scroll":
+            step = self.height if unit == "pages" else 1
+            self.scroll_to(self.first + int(value) * step)
+
+    def _on_wheel(self, event):
+        # В Windows delta кратна 120, в macOS - небольшие значения
+        steps = int(event.delta / 120) or (1 if event.delta > 0 else -1)
+        self.scroll_to(self.first - steps * 3)